@@ -10,6 +10,8 @@ socketio = SocketIO(
     ping_timeout=60,
     ping_interval=25,
     max_http_buffer_size=1e8,
+    http_compression=True,
+    compression_threshold=Config.SOCKETIO_COMPRESSION_THRESHOLD,
     logger=True,
     engineio_logger=True
 )
@@ -28,6 +30,9 @@ def create_app(config_class=Config):
     app.register_blueprint(api, url_prefix='/api')
     app.register_blueprint(main)  # Main blueprint doesn't need a prefix
     
+    # Register Socket.IO event handlers
+    from .api import websocket  # noqa: F401
+    
     # Ensure static folder exists
     static_folder = os.path.join(app.root_path, 'static')
     if not os.path.exists(static_folder):
@@ -1,12 +1,22 @@
 # app/api/routes.py
 from flask import Blueprint, jsonify, request, render_template, current_app
+from werkzeug.local import LocalProxy
 import os
 import json
-from ..neonize_wrapper.client import WhatsAppClient
+from ..neonize_wrapper.automation import get_webhook_dispatcher
+from ..neonize_wrapper.client import get_whatsapp_client, message_to_dict
+from ..neonize_wrapper.events import get_event_exporter
 from ..models.automation import AutomationManager, AutomationRule
+from ..models.conversation import check_state, get_conversation_store
+from ..models.delivery import get_delivery_tracker
+from ..models.group_cache import get_group_cache
+from ..models.dry_run import dry_run_rule
+from ..models.message_store import get_message_store
+import re
 import uuid
 from app import socketio
 from app.config import Config
+from ..utils.metrics import metrics
 
 # Create blueprint for API routes
 api = Blueprint('api', __name__)
@@ -14,7 +24,8 @@ api = Blueprint('api', __name__)
 # Create blueprint for main routes
 main = Blueprint('main', __name__)
 
-whatsapp_client = WhatsAppClient(Config.NEONIZE_SESSION_DIR)
+# Constructed on first request rather than at import time
+whatsapp_client = LocalProxy(get_whatsapp_client)
 
 @main.route('/')
 def index():
@@ -24,9 +35,21 @@ def index():
 @api.route('/status', methods=['GET'])
 def get_status():
     """Get connection status"""
-    return jsonify({
-        'status': 'connected' if whatsapp_client.connected else 'disconnected'
-    })
+    if whatsapp_client.connected:
+        status = 'connected'
+    elif whatsapp_client.reconnecting:
+        status = 'reconnecting'
+    else:
+        status = 'disconnected'
+    return jsonify({'status': status})
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Get in-process metrics"""
+    # Queue depths are otherwise only refreshed when the ingest worker takes a batch
+    for lane, depth in whatsapp_client.ingest.depths().items():
+        metrics.set_gauge(f'ingest.queue_depth.{lane}', depth)
+    return jsonify(metrics.snapshot())
 
 @api.route('/connect', methods=['POST'])
 def connect():
@@ -57,31 +80,78 @@ def get_groups():
 
 @api.route('/messages', methods=['GET'])
 def get_message_history():
-    """Get message history"""
+    """Get message history.
+
+    With ``chat_id`` the archived history of that chat is paged newest first:
+    pass the returned ``next_cursor`` as ``before`` to get older messages.
+    """
+    chat_id = request.args.get('chat_id')
+    if chat_id:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        messages, cursor = get_message_store().page(chat_id, request.args.get('before', type=int), limit)
+        return jsonify({
+            'success': True,
+            'messages': messages,
+            'next_cursor': cursor
+        })
+    
     if not whatsapp_client.connected:
         return jsonify({'success': False, 'message': 'Not connected to WhatsApp'}), 400
     
     # Convert message objects to dictionaries
-    messages = []
-    for msg in whatsapp_client.message_history:
-        messages.append({
-            'id': msg.Info.ID,
-            'chat_id': msg.Info.MessageSource.Chat.id,
-            'sender': msg.Info.MessageSource.Sender.name if msg.Info.MessageSource.Sender else 'Unknown',
-            'sender_id': msg.Info.MessageSource.Sender.id if msg.Info.MessageSource.Sender else None,
-            'text': msg.Message.conversation if msg.Message.conversation else '',
-            'timestamp': msg.Info.Timestamp,
-            'is_group': msg.Info.MessageSource.IsGroup,
-            'group_name': msg.Info.MessageSource.Chat.name if msg.Info.MessageSource.IsGroup else None,
-            'type': msg.Info.Type,
-            'is_outgoing': msg.Info.MessageSource.IsFromMe
-        })
+    messages = [message_to_dict(msg) for msg in whatsapp_client.message_history]
     
     return jsonify({
         'success': True,
         'messages': messages
     })
 
+@api.route('/groups/<path:group_id>/participants', methods=['GET'])
+def get_group_participants(group_id):
+    """Get a group's cached participants and their roles"""
+    group = get_group_cache().get(group_id)
+    if group is None:
+        return jsonify({'success': False, 'message': 'Group not found'}), 404
+    return jsonify({'success': True, 'group': group})
+
+@api.route('/participants/<path:jid>/groups', methods=['GET'])
+def get_participant_groups(jid):
+    """Get the cached groups a JID participates in"""
+    cache = get_group_cache()
+    groups = [
+        {'id': group_id, 'is_admin': cache.is_admin(group_id, jid)}
+        for group_id in sorted(cache.groups_of(jid))
+    ]
+    return jsonify({'success': True, 'groups': groups})
+
+@api.route('/conversations/<path:chat_id>', methods=['GET'])
+def get_conversation(chat_id):
+    """Get the automation conversation state of a chat"""
+    conversation = get_conversation_store().describe(chat_id)
+    if conversation is None:
+        return jsonify({'success': False, 'message': 'No conversation in progress'}), 404
+    return jsonify({'success': True, 'conversation': conversation})
+
+@api.route('/conversations/<path:chat_id>', methods=['PUT'])
+def set_conversation(chat_id):
+    """Move a chat to a conversation state, e.g. to start or fix a flow by hand"""
+    data = request.get_json()
+    if not data or not data.get('state'):
+        return jsonify({'success': False, 'message': 'Missing state'}), 400
+    try:
+        check_state(data['state'], data.get('ttl'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    ttl = data.get('ttl')
+    get_conversation_store().set(chat_id, data['state'], None if ttl is None else float(ttl))
+    return jsonify({'success': True})
+
+@api.route('/conversations/<path:chat_id>', methods=['DELETE'])
+def clear_conversation(chat_id):
+    """End a chat's conversation"""
+    get_conversation_store().clear(chat_id)
+    return jsonify({'success': True})
+
 @api.route('/send', methods=['POST'])
 async def send_message():
     """Send a message"""
@@ -89,7 +159,7 @@ async def send_message():
     if not data or 'to' not in data or 'message' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    success, message = await whatsapp_client.send_message_async(data['to'], data['message'])
+    success, message = await whatsapp_client.send_message_async(data['to'], data['message'], data.get('campaign'))
     if success:
         return jsonify({'status': 'sent'})
     return jsonify({'error': message}), 500
@@ -121,14 +191,62 @@ def add_automation_rule():
         trigger_type=data.get('trigger_type'),
         trigger_pattern=data.get('trigger_pattern'),
         actions=data.get('actions', []),
-        is_active=data.get('is_active', True)
+        is_active=data.get('is_active', True),
+        conditions=data.get('conditions'),
+        cooldown=data.get('cooldown'),
+        rate_limits=data.get('rate_limits')
     )
     
+    # Compile the rule's conditions and limits once, rejecting invalid ones
+    try:
+        rule.validate()
+    except (re.error, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid rule: {e}'}), 400
+    
     # Add rule to manager
     automation_manager.add_rule(rule)
     
     return jsonify({'success': True, 'rule_id': rule_id})
 
+@api.route('/automation/rules/dry-run', methods=['POST'])
+def dry_run_automation_rule():
+    """Evaluate a candidate rule against the archived messages without activating it"""
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'message': 'Missing rule data'}), 400
+    
+    rule = AutomationRule(
+        rule_id=data.get('id', 'dry-run'),
+        name=data.get('name', 'Dry Run'),
+        trigger_type=data.get('trigger_type'),
+        trigger_pattern=data.get('trigger_pattern'),
+        actions=data.get('actions', []),
+        is_active=True,
+        conditions=data.get('conditions')
+    )
+    
+    try:
+        sample_size = int(data.get('sample_size', 20))
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'sample_size and limit must be integers'}), 400
+    if sample_size < 0 or (limit is not None and limit < 1):
+        return jsonify({'success': False, 'message': 'sample_size must be 0 or more and limit at least 1'}), 400
+    
+    try:
+        result = dry_run_rule(
+            rule,
+            get_message_store(),
+            sample_size=sample_size,
+            limit=limit,
+            workers=Config.DRY_RUN_WORKERS,
+            timeout=Config.DRY_RUN_TIMEOUT
+        )
+    except (re.error, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid rule: {e}'}), 400
+    
+    return jsonify({'success': True, **result})
+
 @api.route('/automation/rules/<rule_id>', methods=['PUT'])
 def update_automation_rule(rule_id):
     """Update an existing automation rule"""
@@ -145,9 +263,18 @@ def update_automation_rule(rule_id):
         trigger_type=data.get('trigger_type'),
         trigger_pattern=data.get('trigger_pattern'),
         actions=data.get('actions', []),
-        is_active=data.get('is_active', True)
+        is_active=data.get('is_active', True),
+        conditions=data.get('conditions'),
+        cooldown=data.get('cooldown'),
+        rate_limits=data.get('rate_limits')
     )
     
+    # Compile the rule's conditions and limits once, rejecting invalid ones
+    try:
+        updated_rule.validate()
+    except (re.error, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid rule: {e}'}), 400
+    
     # Update rule
     success = automation_manager.update_rule(rule_id, updated_rule)
     
@@ -167,4 +294,80 @@ def delete_automation_rule(rule_id):
     if success:
         return jsonify({'success': True})
     else:
-        return jsonify({'success': False, 'message': 'Rule not found'}), 404
\ No newline at end of file
+        return jsonify({'success': False, 'message': 'Rule not found'}), 404
+
+@api.route('/automation/outbox', methods=['GET'])
+def get_automation_outbox():
+    """Get outbox counts and the actions that need an operator (failed or ambiguous)"""
+    outbox = AutomationManager().get_outbox()
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'success': True,
+        'counts': outbox.counts(),
+        'failed': outbox.entries('failed', limit),
+        'ambiguous': outbox.entries('ambiguous', limit)
+    })
+
+@api.route('/automation/outbox/<path:key>/retry', methods=['POST'])
+def retry_automation_outbox_entry(key):
+    """Run a failed or ambiguous outbox action again"""
+    if AutomationManager().get_outbox().retry(key):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'message': 'No failed or ambiguous action with that key'}), 404
+
+# Webhook delivery routes
+@api.route('/webhooks/dead-letters', methods=['GET'])
+def get_webhook_dead_letters():
+    """Get webhook deliveries that exhausted their retries"""
+    dispatcher = get_webhook_dispatcher()
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'success': True,
+        'pending_retries': dispatcher.pending_retries(),
+        'dead_letters': dispatcher.dead_letters(limit)
+    })
+
+@api.route('/webhooks/dead-letters/<int:dead_letter_id>/retry', methods=['POST'])
+def retry_webhook_dead_letter(dead_letter_id):
+    """Move a dead-lettered webhook delivery back into the retry queue"""
+    if get_webhook_dispatcher().requeue_dead_letter(dead_letter_id):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'message': 'Dead letter not found'}), 404
+
+@api.route('/delivery/messages/<message_id>', methods=['GET'])
+def get_delivery_status(message_id):
+    """Get the delivery state of a sent message"""
+    status = get_delivery_tracker().status(message_id)
+    if status is None:
+        return jsonify({'success': False, 'message': 'Message not tracked'}), 404
+    return jsonify({'success': True, 'delivery': status})
+
+@api.route('/delivery/campaigns', methods=['GET'])
+def get_delivery_campaigns():
+    """Get delivery and read rates of every campaign"""
+    return jsonify({'success': True, 'campaigns': get_delivery_tracker().campaigns()})
+
+@api.route('/delivery/campaigns/<path:campaign>', methods=['GET'])
+def get_delivery_campaign(campaign):
+    """Get delivery and read rates of a single campaign"""
+    stats = get_delivery_tracker().campaign_stats(campaign)
+    if stats is None:
+        return jsonify({'success': False, 'message': 'Campaign not found'}), 404
+    return jsonify({'success': True, 'campaign': campaign, **stats})
+
+@api.route('/events', methods=['GET'])
+def get_events():
+    """Read exported client events from the segment log, starting at an offset"""
+    exporter = get_event_exporter()
+    if exporter is None or exporter.log is None:
+        return jsonify({'success': False, 'message': 'JSONL event export is not enabled'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    events = exporter.log.read(offset, limit)
+    return jsonify({
+        'success': True,
+        'events': events,
+        'next_offset': events[-1]['offset'] + 1 if events else max(offset, exporter.log.next_offset),
+        'head_offset': exporter.log.next_offset,
+        'dropped': exporter.dropped
+    })
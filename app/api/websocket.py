@@ -1,28 +1,71 @@
 from flask import request
-from flask_socketio import emit
+from flask_socketio import emit, join_room, leave_room
 from .. import socketio
-from ..neonize_wrapper.client import NeonizeClient
+from ..config import Config
+from ..utils.payloads import codec_room, negotiate_codec, register_client, unregister_client
+from ..utils.subscriptions import ALL_CHATS_ROOM, chat_room, subscriptions
+from .routes import whatsapp_client
 
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle new WebSocket connections"""
-    client = NeonizeClient()
-    emit('connection_status', {'status': client.connection_status})
+    # Negotiate the encoding used for large payloads with this browser
+    offered = auth.get('codecs') if isinstance(auth, dict) else None
+    codec = negotiate_codec(offered, Config.SOCKETIO_PAYLOAD_CODEC)
+    register_client(request.sid, codec)
+    join_room(codec_room(codec))
+    emit('payload_codec', {'codec': codec})
     
-    # If there's a QR code available and client is initializing, send it
-    if client.connection_status == 'initializing' and client.qr_code_data:
-        emit('qr_code', {'qr_data': client.qr_code_data})
+    emit('connection_status', {'status': 'connected' if whatsapp_client.connected else 'disconnected'})
+    
+    # If there's a QR code available and client is not connected yet, send it
+    if not whatsapp_client.connected and whatsapp_client.qr_code_data:
+        emit('qr_code', {'qr': whatsapp_client.qr_code_data})
 
 @socketio.on('request_qr')
 def handle_request_qr():
     """Handle request for QR code refresh"""
-    client = NeonizeClient()
-    if client.connection_status == 'initializing' and client.qr_code_data:
-        emit('qr_code', {'qr_data': client.qr_code_data})
+    if not whatsapp_client.connected and whatsapp_client.qr_code_data:
+        emit('qr_code', {'qr': whatsapp_client.qr_code_data})
+
+@socketio.on('subscribe_chat')
+def handle_subscribe_chat(data):
+    """Start receiving messages for a single chat"""
+    chat_id = (data or {}).get('chat_id')
+    if not chat_id:
+        emit('error', {'message': 'Missing chat_id'})
+        return
+    
+    if subscriptions.subscribe(request.sid, chat_id):
+        join_room(chat_room(chat_id))
+    emit('subscriptions', {'chats': sorted(subscriptions.chats_for(request.sid))})
+
+@socketio.on('unsubscribe_chat')
+def handle_unsubscribe_chat(data):
+    """Stop receiving messages for a single chat"""
+    chat_id = (data or {}).get('chat_id')
+    if not chat_id:
+        emit('error', {'message': 'Missing chat_id'})
+        return
+    
+    if subscriptions.unsubscribe(request.sid, chat_id):
+        leave_room(chat_room(chat_id))
+    emit('subscriptions', {'chats': sorted(subscriptions.chats_for(request.sid))})
+
+@socketio.on('subscribe_all')
+def handle_subscribe_all(data=None):
+    """Receive messages for every chat (pass {'enabled': false} to stop)"""
+    enabled = (data or {}).get('enabled', True)
+    subscriptions.subscribe_all(request.sid, enabled)
+    if enabled:
+        join_room(ALL_CHATS_ROOM)
+    else:
+        leave_room(ALL_CHATS_ROOM)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection"""
     # We don't disconnect from WhatsApp when a WebSocket client disconnects
     # as there could be multiple frontend clients connected
-    pass
\ No newline at end of file
+    unregister_client(request.sid)
+    subscriptions.remove_client(request.sid)
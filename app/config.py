@@ -5,8 +5,67 @@ class Config:
     NEONIZE_SESSION_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sessions')
     NEONIZE_DB_PATH = os.path.join(NEONIZE_SESSION_DIR, 'neonize.db')
     
-    # Ensure session directory exists
-    os.makedirs(NEONIZE_SESSION_DIR, exist_ok=True)
+    # Socket.IO payload encoding for large emits (contacts, groups)
+    SOCKETIO_PAYLOAD_CODEC = os.environ.get('SOCKETIO_PAYLOAD_CODEC', 'msgpack+deflate')
+    SOCKETIO_COMPRESSION_THRESHOLD = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024))
+    
+    # Reconnect supervisor backoff (seconds); 0 attempts means retry forever
+    NEONIZE_RECONNECT_BASE_DELAY = float(os.environ.get('NEONIZE_RECONNECT_BASE_DELAY', 1))
+    NEONIZE_RECONNECT_MAX_DELAY = float(os.environ.get('NEONIZE_RECONNECT_MAX_DELAY', 60))
+    NEONIZE_RECONNECT_MAX_ATTEMPTS = int(os.environ.get('NEONIZE_RECONNECT_MAX_ATTEMPTS', 0))
+    # Seconds a send or disconnect from another thread waits for the client's event loop
+    NEONIZE_SEND_TIMEOUT = float(os.environ.get('NEONIZE_SEND_TIMEOUT', 30))
+    # The session directory is created by WhatsAppClient on first use
+    
+    # Application data (automation rules, logs, message archive)
+    DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    MESSAGE_ARCHIVE_PATH = os.environ.get('MESSAGE_ARCHIVE_PATH') or os.path.join(DATA_DIR, 'messages.sqlite3')
+    
+    # Rule dry-run process pool (0 workers means one per CPU)
+    DRY_RUN_WORKERS = int(os.environ.get('DRY_RUN_WORKERS', 0))
+    DRY_RUN_TIMEOUT = float(os.environ.get('DRY_RUN_TIMEOUT', 30))
+    
+    # Upper bound on tracked (rule, scope, chat/sender) keys for automation rate limits
+    AUTOMATION_RATE_LIMIT_MAX_KEYS = int(os.environ.get('AUTOMATION_RATE_LIMIT_MAX_KEYS', 100000))
+    # Rule evaluation worker processes, sharded by chat (0 evaluates in-process)
+    AUTOMATION_WORKERS = int(os.environ.get('AUTOMATION_WORKERS', 0))
+    # Transactional outbox matched actions are committed to before they run
+    AUTOMATION_OUTBOX_PATH = os.environ.get('AUTOMATION_OUTBOX_PATH') or os.path.join(DATA_DIR, 'outbox.sqlite3')
+    AUTOMATION_OUTBOX_BATCH_SIZE = int(os.environ.get('AUTOMATION_OUTBOX_BATCH_SIZE', 100))
+    AUTOMATION_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('AUTOMATION_OUTBOX_MAX_ATTEMPTS', 5))
+    
+    # Webhook action delivery (pooled aiohttp session, SQLite retry queue)
+    WEBHOOK_QUEUE_PATH = os.environ.get('WEBHOOK_QUEUE_PATH') or os.path.join(DATA_DIR, 'webhooks.sqlite3')
+    WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', 64))
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 8))
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+    
+    # Client event export: comma separated sinks out of jsonl, unix, http (empty disables it)
+    EVENT_EXPORT_SINKS = os.environ.get('EVENT_EXPORT_SINKS', '')
+    EVENT_EXPORT_DIR = os.environ.get('EVENT_EXPORT_DIR') or os.path.join(DATA_DIR, 'events')
+    EVENT_EXPORT_SEGMENT_BYTES = int(os.environ.get('EVENT_EXPORT_SEGMENT_BYTES', 64 * 1024 * 1024))
+    EVENT_EXPORT_MAX_SEGMENTS = int(os.environ.get('EVENT_EXPORT_MAX_SEGMENTS', 16))
+    EVENT_EXPORT_SOCKET = os.environ.get('EVENT_EXPORT_SOCKET') or os.path.join(DATA_DIR, 'events.sock')
+    EVENT_EXPORT_HTTP_URL = os.environ.get('EVENT_EXPORT_HTTP_URL', '')
+    EVENT_EXPORT_BUFFER = int(os.environ.get('EVENT_EXPORT_BUFFER', 10000))
+    
+    # Delivery receipts of sent messages (SQLite, with an LRU of recent message IDs in memory)
+    DELIVERY_DB_PATH = os.environ.get('DELIVERY_DB_PATH') or os.path.join(DATA_DIR, 'deliveries.sqlite3')
+    DELIVERY_CACHE_SIZE = int(os.environ.get('DELIVERY_CACHE_SIZE', 100000))
+    
+    # Group metadata cache: groups are re-fetched once older than the TTL (seconds)
+    GROUP_CACHE_TTL = float(os.environ.get('GROUP_CACHE_TTL', 3600))
+    GROUP_CACHE_REVALIDATE_INTERVAL = float(os.environ.get('GROUP_CACHE_REVALIDATE_INTERVAL', 60))
+    
+    # Conversation state of chats for multi-step automation flows (SQLite, LRU of chats in memory)
+    CONVERSATION_DB_PATH = os.environ.get('CONVERSATION_DB_PATH') or os.path.join(DATA_DIR, 'conversations.sqlite3')
+    CONVERSATION_CACHE_SIZE = int(os.environ.get('CONVERSATION_CACHE_SIZE', 100000))
+    CONVERSATION_TTL = float(os.environ.get('CONVERSATION_TTL', 3600))
+    
+    # Message ingest lanes: messages older than INGEST_LIVE_MAX_AGE seconds go to the history lane
+    INGEST_LIVE_MAX_AGE = float(os.environ.get('INGEST_LIVE_MAX_AGE', 120))
+    INGEST_QUEUE_CAPACITY = int(os.environ.get('INGEST_QUEUE_CAPACITY', 10000))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 200))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -1,41 +1,365 @@
 import re
 import json
+import math
 import os
+import time
+import uuid
 from datetime import datetime
+from functools import partial
+
+from ..config import Config
+from ..utils.metrics import metrics
+from ..utils.rate_limit import SlidingWindowCounter
+from ..utils.timestamps import to_seconds
+from .conversation import NO_STATE, check_state
+from .message_template import DEFAULT_FORWARD_TEMPLATE, MessageTemplate
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+# Supported trigger/condition types, cheapest to evaluate first
+TRIGGER_TYPES = (
+    'chat_type',     # 'direct' or 'group'
+    'media_type',    # one or more of 'text', 'image', 'video', 'audio', 'document', 'sticker', ...
+    'sender',        # sender JID or name
+    'group',         # group JID or name
+    'sender_is_admin',  # true/false: sender is an admin of the group the message was sent in
+    'sender_in_group',  # group JIDs or names; sender participates in any of them (any chat)
+    'conversation_state',  # state names the chat's conversation is in; 'none' for no conversation
+    'time_window',   # {'start': 'HH:MM', 'end': 'HH:MM', 'days': ['mon', ...], 'timezone': 'Area/City'}
+    'keywords',      # list of words/phrases (whole words, case-insensitive)
+    'message_text',  # regex
+)
+_TRIGGER_COST = {trigger_type: cost for cost, trigger_type in enumerate(TRIGGER_TYPES)}
+
+# Scopes a rule's cooldown and rate limits can be counted per
+RATE_LIMIT_SCOPES = ('rule', 'chat', 'sender')
+
+_DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercase word tokens used for keyword matching"""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _as_list(value):
+    """Accept either a list or a comma separated string"""
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return list(value or [])
+
+
+def _parse_minutes(value):
+    hours, _, minutes = str(value).partition(':')
+    total = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= total <= 24 * 60:
+        raise ValueError(f'Invalid time of day: {value}')
+    return total
+
+
+def _compile_time_window(pattern):
+    """Normalize a time window to (start_minute, end_minute, weekdays or None, tzinfo or None)"""
+    if isinstance(pattern, str):
+        start, _, end = pattern.partition('-')
+        pattern = {'start': start, 'end': end}
+    days = None
+    if pattern.get('days'):
+        days = frozenset(_DAYS.index(str(day).lower()[:3]) for day in _as_list(pattern['days']))
+    tz = None
+    if pattern.get('timezone'):
+        if ZoneInfo is None:
+            raise ValueError('Time zones require Python 3.9+')
+        tz = ZoneInfo(pattern['timezone'])
+    return (
+        _parse_minutes(pattern.get('start', '00:00')),
+        _parse_minutes(pattern.get('end', '24:00')),
+        days,
+        tz,
+    )
+
+
+def _in_time_window(window, timestamp):
+    start, end, days, tz = window
+    if not timestamp:
+        return False
+    timestamp = to_seconds(timestamp)
+    moment = datetime.fromtimestamp(timestamp, tz) if tz else datetime.fromtimestamp(timestamp)
+    if days is not None and moment.weekday() not in days:
+        return False
+    minute = moment.hour * 60 + moment.minute
+    if start <= end:
+        return start <= minute < end
+    # Window wraps past midnight, e.g. 22:00-06:00
+    return minute >= start or minute < end
+
+
+def _contains_phrase(tokens, phrase):
+    if len(phrase) == 1:
+        return phrase[0] in tokens
+    size = len(phrase)
+    return any(tuple(tokens[i:i + size]) == phrase for i in range(len(tokens) - size + 1))
+
+
+def _action_template_source(action):
+    """Template text of a reply or forward action, None for other actions"""
+    if action.get('type') == 'reply':
+        return action.get('text', '')
+    if action.get('type') == 'forward':
+        return action.get('text') or DEFAULT_FORWARD_TEMPLATE
+    return None
+
+
+def _compile_limit(scope, limit, window):
+    if scope not in RATE_LIMIT_SCOPES:
+        raise ValueError(f'Rate limit scope must be one of {", ".join(RATE_LIMIT_SCOPES)}')
+    limit, window = int(limit), float(window)
+    if limit < 1 or window <= 0:
+        raise ValueError('Rate limits need a positive limit and window')
+    return scope, limit, window
+
 
 class AutomationRule:
-    def __init__(self, rule_id, name, trigger_type, trigger_pattern, actions, is_active=True):
+    def __init__(self, rule_id, name, trigger_type, trigger_pattern, actions, is_active=True, conditions=None,
+                 cooldown=None, rate_limits=None):
         self.id = rule_id
         self.name = name
-        self.trigger_type = trigger_type  # 'message_text', 'sender', 'group', etc.
-        self.trigger_pattern = trigger_pattern  # Regex pattern or exact match
+        self.trigger_type = trigger_type  # One of TRIGGER_TYPES
+        self.trigger_pattern = trigger_pattern  # Regex, keywords, exact match or window, depending on type
+        self.conditions = conditions or []  # Extra {'type', 'pattern'} conditions, all must match
         self.actions = actions  # List of actions to perform
         self.is_active = is_active
+        self.cooldown = cooldown  # Seconds, or {'seconds': 30, 'scope': 'chat'}; default scope is 'chat'
+        self.rate_limits = rate_limits or []  # [{'scope': 'sender', 'limit': 5, 'window': 60}, ...]
+        self._compiled_conditions = None
+        self._compiled_limits = None
+        self._compiled_templates = None
+    
+    @property
+    def compiled_limits(self):
+        """(scope, limit, window) tuples from cooldown and rate_limits, validated once
+
+        A cooldown is a limit of one action per window.
+        Raises ValueError for invalid settings.
+        """
+        if self._compiled_limits is None:
+            limits = []
+            try:
+                if self.cooldown:
+                    cooldown = self.cooldown if isinstance(self.cooldown, dict) else {'seconds': self.cooldown}
+                    limits.append(_compile_limit(cooldown.get('scope', 'chat'), 1, cooldown.get('seconds', 0)))
+                for limit in self.rate_limits:
+                    limits.append(
+                        _compile_limit(limit.get('scope', 'rule'), limit.get('limit', 0), limit.get('window', 0))
+                    )
+            except (TypeError, AttributeError) as e:
+                raise ValueError(f'Invalid cooldown or rate limit: {e}') from e
+            self._compiled_limits = limits
+        return self._compiled_limits
+    
+    def get_conditions(self):
+        """All conditions of this rule: the primary trigger plus any extra conditions"""
+        conditions = []
+        if self.trigger_type:
+            conditions.append({'type': self.trigger_type, 'pattern': self.trigger_pattern})
+        conditions.extend(self.conditions)
+        return conditions
+    
+    @property
+    def compiled_conditions(self):
+        """(type, compiled pattern) pairs ordered cheapest first, compiled once per rule
+
+        Raises ValueError (or re.error) for invalid conditions.
+        """
+        if self._compiled_conditions is None:
+            compiled = []
+            try:
+                for condition in self.get_conditions():
+                    condition_type = condition.get('type')
+                    pattern = condition.get('pattern')
+                    if condition_type == 'message_text':
+                        value = re.compile(pattern, re.IGNORECASE)
+                    elif condition_type == 'keywords':
+                        value = tuple({tuple(tokenize(keyword)) for keyword in _as_list(pattern)} - {()})
+                        if not value:
+                            raise ValueError('Keyword condition needs at least one keyword')
+                    elif condition_type == 'media_type':
+                        value = frozenset(item.lower() for item in _as_list(pattern))
+                    elif condition_type == 'chat_type':
+                        if pattern not in ('direct', 'group'):
+                            raise ValueError("chat_type must be 'direct' or 'group'")
+                        value = pattern
+                    elif condition_type == 'time_window':
+                        value = _compile_time_window(pattern)
+                    elif condition_type in ('sender', 'group'):
+                        value = pattern
+                    elif condition_type == 'sender_is_admin':
+                        value = str(pattern).lower() in ('true', '1', 'yes')
+                    elif condition_type == 'sender_in_group':
+                        value = frozenset(_as_list(pattern))
+                        if not value:
+                            raise ValueError('sender_in_group needs at least one group')
+                    elif condition_type == 'conversation_state':
+                        value = frozenset(_as_list(pattern))
+                        if not value:
+                            raise ValueError('conversation_state needs at least one state')
+                    else:
+                        raise ValueError(f'Unknown trigger type: {condition_type}')
+                    compiled.append((condition_type, value))
+            except (KeyError, TypeError, AttributeError) as e:
+                # An unknown time zone, a missing pattern, a condition that isn't an object...
+                raise ValueError(f'Invalid condition: {e}') from e
+            compiled.sort(key=lambda item: _TRIGGER_COST[item[0]])
+            self._compiled_conditions = compiled
+        return self._compiled_conditions
+    
+    @property
+    def match_regex(self):
+        """Compiled regex of the first message_text condition, whose groups templates can use"""
+        for condition_type, value in self.compiled_conditions:
+            if condition_type == 'message_text':
+                return value
+        return None
     
-    def matches(self, message):
-        """Check if the message matches this rule's trigger conditions"""
+    @property
+    def compiled_templates(self):
+        """Text templates of the reply/forward actions keyed by action index, compiled once per rule
+        
+        Each is named ``<rule id>.<action index>``, which is also its render-time metric.
+        Raises ValueError for invalid templates.
+        """
+        if self._compiled_templates is None:
+            templates = {}
+            try:
+                for index, action in enumerate(self.actions or []):
+                    source = _action_template_source(action)
+                    if source is not None:
+                        templates[index] = MessageTemplate(source, f'{self.id}.{index}', self.match_regex)
+            except (TypeError, AttributeError) as e:
+                # An action that isn't an object, a text that isn't a string...
+                raise ValueError(f'Invalid action template: {e}') from e
+            self._compiled_templates = templates
+        return self._compiled_templates
+    
+    def render_text(self, index, message):
+        """Text of this rule's reply/forward action number index for a message"""
+        template = self.compiled_templates[index]
+        match = None
+        if template.uses_match:
+            match = template.regex.search(message.get('text') or '')
+        return template.render(message, match)
+    
+    def rendered_actions(self, message):
+        """(index, action) pairs of this rule for a message it matched, reply/forward text rendered"""
+        actions = []
+        for index, action in enumerate(self.actions):
+            if index in self.compiled_templates:
+                # Rendered now, with the rule as it matched; the outbox sends this text verbatim
+                action = dict(action, rendered_text=self.render_text(index, message))
+            actions.append((index, action))
+        return actions
+    
+    def validate(self):
+        """Compile conditions, limits and templates, raising ValueError or re.error if invalid"""
+        actions = self.actions or []
+        if not isinstance(actions, list) or not all(isinstance(action, dict) for action in actions):
+            raise ValueError('Actions must be a list of objects')
+        self.compiled_conditions
+        self.compiled_limits
+        self.compiled_templates
+        for action in actions:
+            try:
+                if action.get('type') == 'webhook':
+                    url = action.get('url') or ''
+                    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+                        raise ValueError('needs an http(s) url')
+                    if not isinstance(action.get('headers') or {}, dict):
+                        raise ValueError('headers must be an object')
+                    batch_interval = float(action.get('batch_interval', 1.0))
+                    if int(action.get('batch_size', 1)) < 1 or not math.isfinite(batch_interval) or batch_interval <= 0:
+                        raise ValueError('batch_size and batch_interval must be positive')
+                elif action.get('type') == 'set_state':
+                    check_state(action.get('state'), action.get('ttl'))
+            except (TypeError, ValueError) as e:
+                # int(None), float('abc')...
+                raise ValueError(f"Invalid {action.get('type')} action: {e}") from e
+    
+    def limit_checks(self, message):
+        """(key, limit, window) checks for the rate limiter when this rule fires on message"""
+        checks = []
+        for scope, limit, window in self.compiled_limits:
+            if scope == 'chat':
+                subject = message.get('chat_id')
+            elif scope == 'sender':
+                subject = message.get('sender_id') or message.get('sender')
+            else:
+                subject = ''
+            checks.append(((self.id, scope, subject, limit, window), limit, window))
+        return checks
+    
+    def matches(self, message, keyword_hits=None):
+        """Check if the message matches all of this rule's conditions
+
+        ``message`` is a normalized message dict (see ``message_to_dict``).
+        ``keyword_hits`` is the set of indexes into ``compiled_conditions`` whose
+        keywords were already found by the RuleEngine automaton; when omitted the
+        message text is tokenized here.
+        """
         if not self.is_active:
             return False
-            
-        if self.trigger_type == 'message_text':
-            # Match against message text using regex
-            return re.search(self.trigger_pattern, message.text, re.IGNORECASE) is not None
-            
-        elif self.trigger_type == 'sender':
-            # Match against sender ID or name
-            if message.sender:
-                return (message.sender.id == self.trigger_pattern or 
-                        message.sender.name == self.trigger_pattern)
-            return False
-            
-        elif self.trigger_type == 'group':
-            # Match against group ID or name
-            if message.is_group and message.chat:
-                return (message.chat.id == self.trigger_pattern or 
-                        message.chat.name == self.trigger_pattern)
+        
+        conditions = self.compiled_conditions
+        if not conditions:
             return False
+        
+        tokens = None
+        for index, (condition_type, value) in enumerate(conditions):
+            if condition_type == 'chat_type':
+                matched = bool(message.get('is_group')) == (value == 'group')
+                
+            elif condition_type == 'media_type':
+                matched = (message.get('media_type') or 'text').lower() in value
+                
+            elif condition_type == 'sender':
+                # Match against sender ID or name
+                matched = value in (message.get('sender_id'), message.get('sender'))
+                
+            elif condition_type == 'group':
+                # Match against group ID or name
+                matched = bool(message.get('is_group')) and value in (message.get('chat_id'), message.get('group_name'))
+                
+            elif condition_type == 'sender_is_admin':
+                # Group facts are added by GroupCache.annotate before evaluation
+                matched = bool(message.get('sender_is_admin')) == value
+                
+            elif condition_type == 'sender_in_group':
+                matched = not value.isdisjoint(message.get('sender_groups') or ())
+                
+            elif condition_type == 'conversation_state':
+                # Added by ConversationStore.annotate before evaluation
+                matched = (message.get('conversation_state') or NO_STATE) in value
+                
+            elif condition_type == 'time_window':
+                matched = _in_time_window(value, message.get('timestamp'))
+                
+            elif condition_type == 'keywords':
+                if keyword_hits is not None:
+                    matched = index in keyword_hits
+                else:
+                    if tokens is None:
+                        tokens = tokenize(message.get('text'))
+                    matched = any(_contains_phrase(tokens, phrase) for phrase in value)
+                    
+            else:
+                # Match against message text using regex
+                matched = value.search(message.get('text') or '') is not None
             
-        return False
+            if not matched:
+                return False
+        return True
     
     def to_dict(self):
         """Convert rule to dictionary for storage/transmission"""
@@ -44,6 +368,9 @@ class AutomationRule:
             'name': self.name,
             'trigger_type': self.trigger_type,
             'trigger_pattern': self.trigger_pattern,
+            'conditions': self.conditions,
+            'cooldown': self.cooldown,
+            'rate_limits': self.rate_limits,
             'actions': self.actions,
             'is_active': self.is_active
         }
@@ -57,7 +384,10 @@ class AutomationRule:
             trigger_type=data.get('trigger_type'),
             trigger_pattern=data.get('trigger_pattern'),
             actions=data.get('actions'),
-            is_active=data.get('is_active', True)
+            is_active=data.get('is_active', True),
+            conditions=data.get('conditions'),
+            cooldown=data.get('cooldown'),
+            rate_limits=data.get('rate_limits')
         )
 
 
@@ -68,9 +398,68 @@ class AutomationManager:
         if cls._instance is None:
             cls._instance = super(AutomationManager, cls).__new__(cls)
             cls._instance.rules = []
+            cls._instance.engine = None
+            cls._instance.pool = None
+            cls._instance.outbox = None
+            cls._instance.limiter = SlidingWindowCounter(Config.AUTOMATION_RATE_LIMIT_MAX_KEYS)
             cls._instance._load_rules()
+            cls._instance._rebuild_engine()
         return cls._instance
     
+    def _rebuild_engine(self):
+        """Recompile the rule set into a single-pass RuleEngine"""
+        from .rule_engine import RuleEngine
+        
+        valid_rules = []
+        for rule in self.rules:
+            try:
+                rule.validate()
+                valid_rules.append(rule)
+            except (re.error, ValueError) as e:
+                print(f"Skipping invalid automation rule {rule.id}: {e}")
+        self.engine = RuleEngine(valid_rules)
+        self._rules_by_id = {rule.id: rule for rule in self.engine.rules}
+        if self.pool is not None:
+            self.pool.update_rules(self.engine.rules)
+    
+    def _ensure_pool(self):
+        """Start the worker processes (AUTOMATION_WORKERS > 0) on first use"""
+        if self.pool is None:
+            from .automation_workers import AutomationWorkerPool
+            
+            from .conversation import get_conversation_store
+            
+            self.pool = AutomationWorkerPool(
+                Config.AUTOMATION_WORKERS, self.engine.rules, self._on_worker_matches,
+                annotate=get_conversation_store().annotate,
+            )
+        return self.pool
+    
+    def _on_worker_matches(self, matches):
+        """Queue the actions worker processes matched and rendered, one outbox commit per result batch"""
+        entries = []
+        for message, rule_actions in matches:
+            for rule_id, actions in rule_actions:
+                # A rule may have been deleted while the message was being evaluated
+                rule = self._rules_by_id.get(rule_id)
+                if rule is not None:
+                    entries.extend(self._rule_entries(message, rule, actions))
+        self.get_outbox().add(entries)
+    
+    def get_outbox(self):
+        """The action outbox, opened (and any unfinished actions resumed) on first use"""
+        if self.outbox is None:
+            from ..neonize_wrapper.outbox import ActionOutbox
+            
+            self.outbox = ActionOutbox(
+                Config.AUTOMATION_OUTBOX_PATH,
+                self._run_outbox_action,
+                batch_size=Config.AUTOMATION_OUTBOX_BATCH_SIZE,
+                max_attempts=Config.AUTOMATION_OUTBOX_MAX_ATTEMPTS,
+            )
+            self.outbox.start()
+        return self.outbox
+    
     def _load_rules(self):
         """Load automation rules from storage"""
         try:
@@ -135,6 +524,7 @@ class AutomationManager:
         """Add a new automation rule"""
         self.rules.append(rule)
         self._save_rules()
+        self._rebuild_engine()
         return rule.id
     
     def update_rule(self, rule_id, updated_rule):
@@ -143,6 +533,7 @@ class AutomationManager:
             if rule.id == rule_id:
                 self.rules[i] = updated_rule
                 self._save_rules()
+                self._rebuild_engine()
                 return True
         return False
     
@@ -152,6 +543,7 @@ class AutomationManager:
             if rule.id == rule_id:
                 del self.rules[i]
                 self._save_rules()
+                self._rebuild_engine()
                 return True
         return False
     
@@ -159,32 +551,145 @@ class AutomationManager:
         """Get all automation rules"""
         return self.rules
     
+    def process_messages(self, messages):
+        """Process a batch of messages, in worker processes if configured"""
+        from .conversation import get_conversation_store
+        from .group_cache import get_group_cache
+        
+        cache = get_group_cache()
+        messages = [cache.annotate(message) for message in messages]
+        if Config.AUTOMATION_WORKERS > 0:
+            # The pool adds each chat's conversation state and tracks transitions across the batch
+            self._ensure_pool().submit(messages)
+            return
+        conversations = get_conversation_store()
+        entries = []
+        for message in messages:
+            # Annotated one at a time, so a transition applies to the chat's next message
+            message = conversations.annotate(message)
+            entries.extend(self._matched_actions(message, self.engine.match(message)))
+        self.get_outbox().add(entries)
+    
     def process_message(self, message):
         """Process a message against all automation rules"""
-        from ..neonize_wrapper.client import NeonizeClient
+        from .conversation import get_conversation_store
         
-        client = NeonizeClient()
+        message = get_conversation_store().annotate(message)
+        self.get_outbox().add(self._matched_actions(message, self.engine.match(message)))
+    
+    def _matched_actions(self, message, rules):
+        """Outbox entries for the actions of the matching rules that are within their limits"""
+        entries = []
+        for rule in rules:
+            entries.extend(self._rule_entries(message, rule, rule.rendered_actions(message)))
+        return entries
+    
+    def _rule_entries(self, message, rule, actions):
+        """Outbox entries for a matched rule's rendered (index, action) pairs, if within its limits
         
-        for rule in self.rules:
-            if rule.matches(message):
-                for action in rule.actions:
-                    self._execute_action(action, message, client)
+        State transitions (``set_state``) are applied here rather than queued,
+        so the chat's next message is matched against its new state, and they
+        apply whatever the rule's cooldown and rate limits (which only hold
+        back what is sent), as worker processes assume when they track them.
+        They are recorded in the outbox under the same key as a queued action
+        would be, so a redelivered message doesn't apply them again.
+        """
+        from .conversation import get_conversation_store
+        
+        metrics.incr('automation.rule_matches')
+        outbox = self.get_outbox()
+        # Idempotency key: the same message can never queue a rule's actions twice
+        message_key = message.get('id') or uuid.uuid4().hex
+        entries = []
+        for index, action in actions:
+            key = f'{message_key}:{rule.id}:{index}'
+            if action.get('type') == 'set_state':
+                ttl = None if action.get('ttl') is None else float(action['ttl'])
+                apply = partial(get_conversation_store().set, message.get('chat_id'), action.get('state'), ttl)
+                if outbox.apply_once(key, rule.id, action, message, apply):
+                    metrics.incr('automation.state_transitions')
+                continue
+            entries.append((key, rule.id, action, message))
+        
+        # Enforce cooldowns and rate limits before any action fires
+        checks = rule.limit_checks(message) if entries else None
+        if checks:
+            exceeded = self.limiter.try_acquire(checks)
+            if exceeded is not None:
+                scope = exceeded[0][1]
+                metrics.incr('automation.actions_suppressed', len(entries))
+                metrics.incr(f'automation.actions_suppressed.{scope}', len(entries))
+                return []
+        return entries
+    
+    def _run_outbox_action(self, key, rule_id, action, message):
+        """Execute an action taken from the outbox"""
+        from ..neonize_wrapper.client import SendOutcomeUnknown, get_whatsapp_client
+        from ..neonize_wrapper.outbox import AmbiguousAction, DeferAction
+        
+        client = get_whatsapp_client()
+        if action.get('type') in ('reply', 'forward') and not client.connected:
+            # Sends wait out a reconnect instead of using up their attempts
+            raise DeferAction('Not connected to WhatsApp')
+        try:
+            self._execute_action(action, message, client, self._rules_by_id.get(rule_id), key)
+        except SendOutcomeUnknown as e:
+            # Retrying could deliver it twice: leave it for an operator to retry or drop
+            raise AmbiguousAction(str(e)) from e
     
-    def _execute_action(self, action, message, client):
-        """Execute a single automation action"""
+    def _action_text(self, action, message, rule):
+        """Text to send for a reply/forward action: rendered when it was queued, or rendered here"""
+        if 'rendered_text' in action:
+            return action['rendered_text']
+        # Not queued through _matched_actions: compile the action's own template
+        regex = rule.match_regex if rule else None
+        return MessageTemplate(_action_template_source(action), 'inline', regex).render(message)
+    
+    def _execute_action(self, action, message, client, rule=None, idempotency_key=None):
+        """Execute a single automation action, raising RuntimeError if a send fails"""
         action_type = action.get('type')
+        # Sends are tracked per rule so delivery rates can be reported like a campaign
+        campaign = f'rule:{rule.id}' if rule else None
         
         if action_type == 'reply':
             # Reply to the message
-            text = action.get('text', '')
-            client.send_message(message.chat_id, text)
+            text = self._action_text(action, message, rule)
+            success, error = client.send_message(message['chat_id'], text, campaign)
+            if not success:
+                raise RuntimeError(error)
             
         elif action_type == 'forward':
             # Forward the message to another chat
             destination = action.get('destination')
             if destination:
-                forward_text = f"Forwarded message from {message.sender.name if message.sender else 'Unknown'}: {message.text}"
-                client.send_message(destination, forward_text)
+                forward_text = self._action_text(action, message, rule)
+                success, error = client.send_message(destination, forward_text, campaign)
+                if not success:
+                    raise RuntimeError(error)
+                
+        elif action_type == 'webhook':
+            # Push the matched message to an external service
+            from ..neonize_wrapper.automation import get_webhook_dispatcher
+            
+            # Lets receivers drop the duplicate if the outbox runs this action again after a crash.
+            # Batched payloads share one request (and its headers), so the key is in each payload.
+            batch_size = int(action.get('batch_size', 1))
+            headers = dict(action.get('headers') or {})
+            if idempotency_key and batch_size <= 1:
+                headers['Idempotency-Key'] = idempotency_key
+            get_webhook_dispatcher().enqueue(
+                action['url'],
+                {
+                    'rule_id': rule.id if rule else None,
+                    'rule_name': rule.name if rule else None,
+                    'matched_at': time.time(),
+                    'idempotency_key': idempotency_key,
+                    'message': message
+                },
+                headers=headers or None,
+                batch_size=batch_size,
+                batch_interval=float(action.get('batch_interval', 1.0))
+            )
                 
         elif action_type == 'log':
             # Log the message to a file
@@ -195,5 +700,5 @@ class AutomationManager:
             log_path = os.path.join(log_dir, log_file)
             with open(log_path, 'a') as f:
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                sender = message.sender.name if message.sender else 'Unknown'
-                f.write(f"[{timestamp}] {sender}: {message.text}\n")
\ No newline at end of file
+                sender = message.get('sender') or 'Unknown'
+                f.write(f"[{timestamp}] {sender}: {message.get('text', '')}\n")
\ No newline at end of file
@@ -0,0 +1,222 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from ..config import Config
+from ..utils.metrics import metrics
+from .automation import AutomationRule
+from .rule_engine import RuleEngine
+
+
+def shard_for(chat_id, workers):
+    """Worker index for a chat; stable so a chat's messages stay in order"""
+    return zlib.crc32((chat_id or '').encode('utf-8')) % workers
+
+
+def _build_engine(rule_data):
+    return RuleEngine([AutomationRule.from_dict(data) for data in rule_data])
+
+
+def _worker(index, inbox, results, rule_data, default_ttl):
+    """Worker process: match message batches against its copy of the rule set and render the actions"""
+    engine = _build_engine(rule_data)
+    # chat id -> (token, state, expires_at) of the last set_state this worker matched for the chat,
+    # kept until the main process has applied it to the states it sends with new messages
+    transitions = {}
+    while True:
+        command, payload = inbox.get()
+        if command == 'rules':
+            engine = _build_engine(payload)
+        elif command == 'match':
+            matches = []
+            errors = 0
+            applied = -1
+            for token, message, applied_through in payload:
+                applied = max(applied, applied_through)
+                chat_id = message.get('chat_id')
+                try:
+                    transition = transitions.get(chat_id)
+                    if transition is not None and transition[0] > applied_through:
+                        # Set by an earlier message the main process hadn't finished with on submission
+                        state = transition[1] if transition[2] > time.time() else None
+                        message = dict(message, conversation_state=state)
+                    rule_actions = []
+                    for rule in engine.match(message):
+                        actions = rule.rendered_actions(message)
+                        for _, action in actions:
+                            if action.get('type') == 'set_state':
+                                ttl = default_ttl if action.get('ttl') is None else float(action['ttl'])
+                                transitions[chat_id] = (token, action.get('state'), time.time() + ttl)
+                        rule_actions.append((rule.id, actions))
+                except Exception:
+                    # A malformed message must not take the worker (and its queue) down
+                    errors += 1
+                    continue
+                if rule_actions:
+                    matches.append((token, rule_actions))
+            for chat_id in [chat_id for chat_id, transition in transitions.items() if transition[0] <= applied]:
+                del transitions[chat_id]
+            # Template render times etc. are reported by the main process
+            worker_metrics = metrics.snapshot()
+            metrics.reset()
+            results.put((index, [token for token, _, _ in payload], matches, errors, worker_metrics))
+        elif command == 'stop':
+            return
+
+
+class AutomationWorkerPool:
+    """Evaluates automation rules in worker processes.
+
+    Messages are sharded by chat ID, so each chat is always handled by the
+    same worker and its matches come back in order. Workers match and render
+    the actions of the matching rules; ``on_matches([(message, [(rule_id,
+    [(action index, action), ...]), ...]), ...])`` is called once per worker
+    result batch from a collector thread in this process, where rate limits
+    (which span workers) are applied and actions queued. Rule changes are
+    broadcast to every worker's inbox and apply to all messages submitted
+    after them.
+
+    ``annotate(message)`` adds the chat's conversation state on submission.
+    Every message also carries the last token whose results its worker had
+    handed to ``on_matches`` by then, so a worker knows which of the
+    ``set_state`` transitions it matched are not reflected in that state
+    yet and applies them itself, as if messages were processed one by one.
+
+    The collector also checks the workers every ``health_interval`` seconds.
+    A worker that died is restarted and its unanswered messages are sent to
+    the new process once; a message that was already resent is given up on
+    (``automation.worker_lost_messages``), so ``submit`` never blocks on
+    results that will not come.
+    """
+
+    def __init__(self, workers, rules, on_matches, annotate=None, max_pending=20000, health_interval=1.0):
+        self.workers = workers
+        self.on_matches = on_matches
+        self.annotate = annotate
+        self.max_pending = max_pending
+        self.health_interval = health_interval
+        self._tokens = itertools.count()
+        self._pending = {}  # token -> (message, worker index, resent) awaiting its worker's result
+        self._applied = [-1] * workers  # per worker, the last token whose results on_matches has had
+        self._cond = threading.Condition()
+        self._stopping = False
+
+        self._rule_data = [rule.to_dict() for rule in rules]
+        self._results = multiprocessing.Queue()
+        self._inboxes = [multiprocessing.Queue() for _ in range(workers)]
+        self._processes = [self._spawn(i) for i in range(workers)]
+        self._collector = threading.Thread(target=self._collect, name='automation-collector', daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        process = multiprocessing.Process(
+            target=_worker, args=(index, self._inboxes[index], self._results, self._rule_data, Config.CONVERSATION_TTL),
+            name=f'automation-worker-{index}', daemon=True,
+        )
+        process.start()
+        return process
+
+    def update_rules(self, rules):
+        """Send a new rule set to every worker"""
+        rule_data = [rule.to_dict() for rule in rules]
+        with self._cond:
+            self._rule_data = rule_data
+            for inbox in self._inboxes:
+                inbox.put(('rules', rule_data))
+
+    def submit(self, messages):
+        """Queue messages for evaluation, waiting while too many are in flight"""
+        shards = [[] for _ in range(self.workers)]
+        with self._cond:
+            while len(self._pending) >= self.max_pending:
+                self._cond.wait()
+            for message in messages:
+                token = next(self._tokens)
+                index = shard_for(message.get('chat_id'), self.workers)
+                applied = self._applied[index]
+                if self.annotate is not None:
+                    # After reading applied: the state is at least as new as the transitions it covers
+                    message = self.annotate(message)
+                self._pending[token] = (message, index, False)
+                shards[index].append((token, message, applied))
+            # Under the lock, so a batch can't go to the inbox of a worker being replaced
+            for inbox, batch in zip(self._inboxes, shards):
+                if batch:
+                    inbox.put(('match', batch))
+
+    def pending(self):
+        """Number of submitted messages not evaluated yet"""
+        with self._cond:
+            return len(self._pending)
+
+    def _collect(self):
+        checked_at = time.monotonic()
+        while True:
+            if time.monotonic() - checked_at >= self.health_interval:
+                self._check_workers()
+                checked_at = time.monotonic()
+            try:
+                index, tokens, matches, errors, worker_metrics = self._results.get(timeout=self.health_interval)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            metrics.merge(worker_metrics)
+            if errors:
+                metrics.incr('automation.worker_errors', errors)
+            with self._cond:
+                # Tokens of a restarted worker may have been given up on meanwhile
+                messages = {token: self._pending[token][0] for token in tokens if token in self._pending}
+            matches = [(token, rule_actions) for token, rule_actions in matches if token in messages]
+            try:
+                if matches:
+                    self.on_matches([(messages[token], rule_actions) for token, rule_actions in matches])
+            except Exception as e:
+                print(f"Error queueing automation actions: {e}")
+            with self._cond:
+                # Only now are the batch's state transitions in what annotate() returns
+                for token in messages:
+                    self._pending.pop(token, None)
+                self._applied[index] = max(self._applied[index], max(tokens))
+                self._cond.notify_all()
+
+    def _check_workers(self):
+        """Restart dead workers and resend (or give up on) the messages they held"""
+        for index, process in enumerate(self._processes):
+            if self._stopping or process.is_alive():
+                continue
+            metrics.incr('automation.worker_restarts')
+            print(f"Automation worker {index} exited with code {process.exitcode}, restarting")
+            lost = 0
+            with self._cond:
+                # A fresh inbox: the dead process may have held the old one's read lock
+                self._inboxes[index] = multiprocessing.Queue()
+                self._processes[index] = self._spawn(index)
+                resend = []
+                for token, (message, worker, resent) in list(self._pending.items()):
+                    if worker != index:
+                        continue
+                    if resent:
+                        del self._pending[token]
+                        lost += 1
+                    else:
+                        self._pending[token] = (message, index, True)
+                        resend.append((token, message, self._applied[index]))
+                if resend:
+                    self._inboxes[index].put(('match', resend))
+                self._cond.notify_all()
+            if lost:
+                metrics.incr('automation.worker_lost_messages', lost)
+
+    def stop(self):
+        """Stop the worker processes"""
+        self._stopping = True
+        for inbox in self._inboxes:
+            inbox.put(('stop', None))
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
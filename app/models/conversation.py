@@ -0,0 +1,158 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ..config import Config
+
+# State value a rule uses to match chats that aren't in any conversation
+NO_STATE = 'none'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    chat_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS conversations_expires_at ON conversations (expires_at);
+"""
+
+_MISSING = object()
+
+
+def check_state(state, ttl=None):
+    """Raise ValueError unless ``state`` and ``ttl`` are valid for ConversationStore.set"""
+    if state is not None and (not isinstance(state, str) or state in ('', NO_STATE)):
+        raise ValueError(f"State needs a name other than '{NO_STATE}', or null to end it")
+    if ttl is None:
+        return
+    try:
+        ttl = float(ttl)
+    except (TypeError, ValueError):
+        raise ValueError('State ttl must be a number') from None
+    if not math.isfinite(ttl):
+        raise ValueError('State ttl must be a finite number of seconds')
+    if ttl <= 0:
+        raise ValueError('State ttl must be positive')
+
+
+class ConversationStore:
+    """Per-chat conversation state for multi-step automation flows.
+
+    Each chat is in at most one named state (e.g. ``menu``) that expires
+    ``ttl`` seconds after it was last set. Writes go through to SQLite so
+    conversations survive restarts; reads are served from an LRU of
+    ``cache_size`` chats, which also remembers chats that have no state, so
+    a message costs one dict lookup and memory stays bounded however many
+    chats there are. Expired rows are purged from SQLite in bulk every
+    ``purge_every`` writes.
+    """
+
+    def __init__(self, db_path, cache_size=100000, ttl=3600, purge_every=1000):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # chat id -> (state, expires_at), or None for no state
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def _remember(self, chat_id, entry):
+        self._cache[chat_id] = entry
+        self._cache.move_to_end(chat_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, chat_id, now=None):
+        """Current state of a chat, or None if it has none (or it expired)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._cache.get(chat_id, _MISSING)
+            if entry is _MISSING:
+                row = self._conn.execute(
+                    'SELECT state, expires_at FROM conversations WHERE chat_id = ?', (chat_id,)
+                ).fetchone()
+                entry = tuple(row) if row else None
+                self._remember(chat_id, entry)
+            else:
+                self._cache.move_to_end(chat_id)
+            if entry is None:
+                return None
+            state, expires_at = entry
+            if expires_at <= now:
+                # The row itself goes with the next purge
+                self._cache[chat_id] = None
+                return None
+            return state
+
+    def set(self, chat_id, state, ttl=None):
+        """Move a chat to a state for ttl seconds (the store's default if None); None clears it"""
+        if state is None:
+            self.clear(chat_id)
+            return
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO conversations (chat_id, state, updated_at, expires_at) VALUES (?, ?, ?, ?)',
+                (chat_id, state, now, expires_at),
+            )
+            self._remember(chat_id, (state, expires_at))
+            self._count_write(now)
+
+    def clear(self, chat_id):
+        """End a chat's conversation"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM conversations WHERE chat_id = ?', (chat_id,))
+            self._remember(chat_id, None)
+            self._count_write(time.time())
+
+    def _count_write(self, now):
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self._conn.execute('DELETE FROM conversations WHERE expires_at <= ?', (now,))
+
+    def annotate(self, message):
+        """Copy of a normalized message with its chat's ``conversation_state`` added"""
+        return dict(message, conversation_state=self.get(message.get('chat_id')))
+
+    def describe(self, chat_id):
+        """State record of a chat, or None if it has no live state"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state, updated_at, expires_at FROM conversations WHERE chat_id = ? AND expires_at > ?',
+                (chat_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        state, updated_at, expires_at = row
+        return {'chat_id': chat_id, 'state': state, 'updated_at': updated_at, 'expires_at': expires_at}
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
+
+
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """Shared ConversationStore, opened on first use"""
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                _conversation_store = ConversationStore(
+                    Config.CONVERSATION_DB_PATH, Config.CONVERSATION_CACHE_SIZE, Config.CONVERSATION_TTL
+                )
+    return _conversation_store
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ..config import Config
+
+# Delivery states, ordered: a message only ever moves forward
+SENT, DELIVERED, READ = 1, 2, 3
+STATE_NAMES = {SENT: 'sent', DELIVERED: 'delivered', READ: 'read'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    id TEXT PRIMARY KEY,
+    chat_id TEXT,
+    campaign TEXT,
+    state INTEGER NOT NULL,
+    sent_at REAL,
+    delivered_at REAL,
+    read_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS deliveries_campaign_state ON deliveries (campaign, state);
+"""
+
+_TIMESTAMP_COLUMNS = {DELIVERED: 'delivered_at', READ: 'read_at'}
+
+
+def _rates(counts):
+    """Aggregate dict for a campaign from its [sent, delivered, read] counts"""
+    sent, delivered, read = counts
+    return {
+        'sent': sent,
+        'delivered': delivered,
+        'read': read,
+        'delivery_rate': delivered / sent if sent else 0.0,
+        'read_rate': read / sent if sent else 0.0,
+    }
+
+
+class DeliveryTracker:
+    """Delivery state (sent/delivered/read) of outgoing messages, by message ID.
+
+    SQLite holds every tracked message; memory only holds an LRU of the most
+    recently sent or updated IDs (receipts overwhelmingly arrive for recent
+    sends) plus one counter triple per campaign, so memory stays bounded no
+    matter how many messages are tracked. ``delivered`` and ``read`` counts
+    are cumulative: a read message also counts as delivered.
+    """
+
+    def __init__(self, db_path, cache_size=100000):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # id -> (chat_id, campaign, state)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._campaigns = {}
+        for campaign, state, count in self._conn.execute(
+            'SELECT campaign, state, COUNT(*) FROM deliveries WHERE campaign IS NOT NULL GROUP BY campaign, state'
+        ):
+            counts = self._campaigns.setdefault(campaign, [0, 0, 0])
+            for reached in range(SENT, state + 1):
+                counts[reached - 1] += count
+
+    def _remember(self, message_id, entry):
+        self._cache[message_id] = entry
+        self._cache.move_to_end(message_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def track(self, message_id, chat_id, campaign=None):
+        """Start tracking a message that was just sent"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO deliveries (id, chat_id, campaign, state, sent_at) VALUES (?, ?, ?, ?, ?)',
+                (message_id, chat_id, campaign, SENT, time.time()),
+            )
+            if not cursor.rowcount:
+                return
+            self._remember(message_id, (chat_id, campaign, SENT))
+            if campaign is not None:
+                self._campaigns.setdefault(campaign, [0, 0, 0])[SENT - 1] += 1
+
+    def update(self, message_ids, state, timestamp=None):
+        """Apply a receipt to tracked messages.
+
+        Returns ``[{'id', 'chat_id', 'status'}, ...]`` for the messages whose
+        state actually advanced; unknown IDs and stale receipts are ignored.
+        """
+        timestamp = timestamp or time.time()
+        changes = []
+        with self._lock:
+            misses = [message_id for message_id in message_ids if message_id not in self._cache]
+            if misses:
+                for message_id, chat_id, campaign, current in self._conn.execute(
+                    f'SELECT id, chat_id, campaign, state FROM deliveries WHERE id IN ({", ".join("?" for _ in misses)})',
+                    misses,
+                ):
+                    self._remember(message_id, (chat_id, campaign, current))
+
+            for message_id in message_ids:
+                entry = self._cache.get(message_id)
+                if entry is None or entry[2] >= state:
+                    continue
+                chat_id, campaign, current = entry
+                self._remember(message_id, (chat_id, campaign, state))
+                if campaign is not None:
+                    counts = self._campaigns.setdefault(campaign, [0, 0, 0])
+                    for reached in range(current + 1, state + 1):
+                        counts[reached - 1] += 1
+                changes.append({'id': message_id, 'chat_id': chat_id, 'status': STATE_NAMES[state]})
+
+            if changes:
+                column = _TIMESTAMP_COLUMNS[state]
+                with self._conn:
+                    self._conn.executemany(
+                        f'UPDATE deliveries SET state = ?, {column} = ? WHERE id = ?',
+                        [(state, timestamp, change['id']) for change in changes],
+                    )
+        return changes
+
+    def status(self, message_id):
+        """Delivery record of a single message, or None if it isn't tracked"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT chat_id, campaign, state, sent_at, delivered_at, read_at FROM deliveries WHERE id = ?',
+                (message_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        chat_id, campaign, state, sent_at, delivered_at, read_at = row
+        return {
+            'id': message_id,
+            'chat_id': chat_id,
+            'campaign': campaign,
+            'status': STATE_NAMES[state],
+            'sent_at': sent_at,
+            'delivered_at': delivered_at,
+            'read_at': read_at,
+        }
+
+    def campaign_stats(self, campaign):
+        """Aggregate delivery and read rates of a campaign, or None if unknown"""
+        with self._lock:
+            counts = self._campaigns.get(campaign)
+            return _rates(counts) if counts else None
+
+    def campaigns(self):
+        """Aggregates of every campaign, keyed by campaign name"""
+        with self._lock:
+            return {campaign: _rates(counts) for campaign, counts in self._campaigns.items()}
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
+
+
+_delivery_tracker = None
+_delivery_tracker_lock = threading.Lock()
+
+
+def get_delivery_tracker():
+    """Shared DeliveryTracker, opened on first use"""
+    global _delivery_tracker
+    if _delivery_tracker is None:
+        with _delivery_tracker_lock:
+            if _delivery_tracker is None:
+                _delivery_tracker = DeliveryTracker(Config.DELIVERY_DB_PATH, Config.DELIVERY_CACHE_SIZE)
+    return _delivery_tracker
@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import time
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from .automation import AutomationRule
+from .message_store import MESSAGE_FIELDS, connect_readonly, row_to_message
+from .rule_engine import RuleEngine
+
+# Messages per shard handed to a worker process
+SHARD_SIZE = 50000
+
+# p99 per-message evaluation time above which a rule is reported as slow
+SLOW_MESSAGE_NS = 1000000
+
+# Columns AutomationRule.matches looks at; full rows are only loaded for samples
+MATCH_FIELDS = (
+    'seq', 'chat_id', 'sender', 'sender_id', 'text', 'timestamp', 'is_group', 'group_name', 'media_type',
+)
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_UNBOUNDED = sre_constants.MAXREPEAT
+
+
+def _first_token(items):
+    """First (op, av) of a parsed sub-pattern, skipping groups"""
+    for op, av in items:
+        if op == sre_constants.SUBPATTERN:
+            return _first_token(av[-1])
+        if op in _REPEATS:
+            return _first_token(av[2])
+        return op, av
+    return None, None
+
+
+def _alternatives_overlap(branches):
+    """Heuristic: can two alternatives of a repeated branch start with the same character?"""
+    seen = set()
+    for branch in branches:
+        op, av = _first_token(branch)
+        if op != sre_constants.LITERAL:
+            # Classes, categories and '.' overlap with almost anything
+            return True
+        if av in seen:
+            return True
+        seen.add(av)
+    return False
+
+
+def _walk(items, in_repeat, reasons):
+    for op, av in items:
+        if op in _REPEATS:
+            lo, hi, sub = av
+            repeats = hi == _UNBOUNDED or hi > 1
+            if repeats and in_repeat and hi == _UNBOUNDED:
+                reasons.add('nested quantifier (e.g. (a+)+) can backtrack exponentially')
+            _walk(sub, in_repeat or repeats, reasons)
+        elif op == sre_constants.BRANCH:
+            branches = av[1]
+            if in_repeat and _alternatives_overlap(branches):
+                reasons.add('overlapping alternation inside a repeat (e.g. (a|a)*)')
+            for branch in branches:
+                _walk(branch, in_repeat, reasons)
+        elif op == sre_constants.SUBPATTERN:
+            _walk(av[-1], in_repeat, reasons)
+        elif op in (getattr(sre_constants, 'ASSERT', None), getattr(sre_constants, 'ASSERT_NOT', None)):
+            _walk(av[1], in_repeat, reasons)
+
+
+def backtracking_risks(pattern):
+    """Static check of a regex for catastrophic-backtracking constructs.
+
+    Returns a sorted list of human readable reasons, empty if none were found.
+    Raises re.error for invalid patterns.
+    """
+    reasons = set()
+    _walk(sre_parse.parse(pattern), False, reasons)
+    return sorted(reasons)
+
+
+def _evaluate_shard(args):
+    """Worker: evaluate a rule against messages with seq in [lo, hi]"""
+    db_path, rule_data, lo, hi, sample_size = args
+    engine = RuleEngine([AutomationRule.from_dict(rule_data)])
+    matches = engine.match
+    perf_counter_ns = time.perf_counter_ns
+
+    evaluated = matched = total_ns = max_ns = 0
+    histogram = [0] * 64  # bucket b counts evaluations taking < 2**b ns
+    sample_seqs = []
+
+    conn = connect_readonly(db_path)
+    try:
+        cursor = conn.execute(
+            f'SELECT {", ".join(MATCH_FIELDS)} FROM messages WHERE seq BETWEEN ? AND ?',
+            (lo, hi),
+        )
+        for row in cursor:
+            message = dict(zip(MATCH_FIELDS, row))
+            start = perf_counter_ns()
+            hit = matches(message)
+            elapsed = perf_counter_ns() - start
+
+            evaluated += 1
+            total_ns += elapsed
+            if elapsed > max_ns:
+                max_ns = elapsed
+            histogram[min(elapsed.bit_length(), 63)] += 1
+            if hit:
+                matched += 1
+                if len(sample_seqs) < sample_size:
+                    sample_seqs.append(message['seq'])
+
+        samples = [
+            row_to_message(row)
+            for row in conn.execute(
+                f'SELECT {", ".join(MESSAGE_FIELDS)} FROM messages WHERE seq IN ({", ".join("?" for _ in sample_seqs)})',
+                sample_seqs,
+            )
+        ] if sample_seqs else []
+    finally:
+        conn.close()
+
+    return {
+        'evaluated': evaluated,
+        'matched': matched,
+        'total_ns': total_ns,
+        'max_ns': max_ns,
+        'histogram': histogram,
+        'samples': samples,
+    }
+
+
+def _percentile_ns(histogram, count, fraction):
+    """Upper bound of the histogram bucket holding the given percentile"""
+    if not count:
+        return 0
+    target = count * fraction
+    seen = 0
+    for bucket, bucket_count in enumerate(histogram):
+        seen += bucket_count
+        if seen >= target:
+            return 2 ** bucket
+    return 2 ** (len(histogram) - 1)
+
+
+def dry_run_rule(rule, store, sample_size=20, limit=None, workers=0, timeout=30):
+    """Evaluate a candidate rule against the archived message history.
+
+    Raises ValueError or re.error if the rule has invalid conditions.
+
+    The archive is split into seq ranges evaluated in parallel worker
+    processes; each worker opens its own read-only connection so no
+    message data crosses process boundaries.
+    """
+    risks = set()
+    for condition_type, compiled in rule.compiled_conditions:
+        if condition_type == 'message_text':
+            risks.update(backtracking_risks(compiled.pattern))
+    risks = sorted(risks)
+
+    rule_data = dict(rule.to_dict(), is_active=True)
+    lo, hi = store.seq_bounds()
+    result = {
+        'evaluated': 0,
+        'matched': 0,
+        'samples': [],
+        'timed_out': False,
+        'risk': {'catastrophic_backtracking': bool(risks), 'reasons': risks, 'slow': False},
+    }
+    shards = []
+    if lo is not None:
+        if limit:
+            lo = max(lo, hi - limit + 1)
+        shards = [
+            (store.db_path, rule_data, start, min(start + SHARD_SIZE - 1, hi), sample_size)
+            for start in range(lo, hi + 1, SHARD_SIZE)
+        ]
+    if not shards:
+        # Nothing to evaluate: don't start a pool
+        result.update(match_rate=0.0, timing={}, workers=0, wall_ms=0.0)
+        return result
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+
+    histogram = [0] * 64
+    total_ns = max_ns = 0
+    started = time.perf_counter()
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = pool.imap_unordered(_evaluate_shard, shards)
+        for _ in shards:
+            remaining = timeout - (time.perf_counter() - started)
+            try:
+                shard = pending.next(timeout=max(remaining, 0))
+            except multiprocessing.TimeoutError:
+                result['timed_out'] = True
+                break
+            result['evaluated'] += shard['evaluated']
+            result['matched'] += shard['matched']
+            total_ns += shard['total_ns']
+            max_ns = max(max_ns, shard['max_ns'])
+            histogram = [a + b for a, b in zip(histogram, shard['histogram'])]
+            result['samples'].extend(shard['samples'][:sample_size - len(result['samples'])])
+    finally:
+        # terminate() also kills workers stuck in a runaway regex
+        pool.terminate()
+        pool.join()
+
+    evaluated = result['evaluated']
+    p99_ns = _percentile_ns(histogram, evaluated, 0.99)
+    result.update(
+        match_rate=result['matched'] / evaluated if evaluated else 0.0,
+        workers=workers,
+        wall_ms=(time.perf_counter() - started) * 1000,
+        timing={
+            'total_ms': total_ns / 1e6,
+            'avg_us': total_ns / evaluated / 1e3 if evaluated else 0.0,
+            'p50_us': _percentile_ns(histogram, evaluated, 0.5) / 1e3,
+            'p99_us': p99_ns / 1e3,
+            'max_us': max_ns / 1e3,
+        },
+    )
+    result['risk']['slow'] = p99_ns >= SLOW_MESSAGE_NS or result['timed_out']
+    return result
@@ -0,0 +1,206 @@
+import threading
+import time
+
+from ..config import Config
+
+# Participant roles, as stored in the cache
+MEMBER, ADMIN, SUPERADMIN = 0, 1, 2
+ROLE_NAMES = {MEMBER: 'member', ADMIN: 'admin', SUPERADMIN: 'superadmin'}
+
+
+def normalize_jid(jid):
+    """Canonical 'user@server' form of a JID string (drops the device/agent part)"""
+    if not jid:
+        return jid
+    user, at, server = jid.partition('@')
+    return user.split(':')[0].split('.')[0] + at + server
+
+
+class GroupCache:
+    """Group metadata with a participant -> groups reverse index.
+
+    Answers "is this JID an admin of that group" and "which groups contain
+    this JID" from memory. Groups are loaded whole (``replace``), kept up to
+    date from group events (``apply_changes``) and reported by ``stale`` once
+    they are older than ``ttl`` seconds or known to have missed an update,
+    so the client can re-fetch them.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._groups = {}  # group id -> {'name', 'participants': {jid: role}, 'version', 'fetched_at'}
+        self._by_participant = {}  # jid -> set of group ids
+        self._invalid = set()  # groups that missed an incremental update
+
+    def _index(self, group_id, jid):
+        self._by_participant.setdefault(jid, set()).add(group_id)
+
+    def _unindex(self, group_id, jid):
+        groups = self._by_participant.get(jid)
+        if groups is not None:
+            groups.discard(group_id)
+            if not groups:
+                del self._by_participant[jid]
+
+    def replace(self, group_id, name, participants, version=None):
+        """Store the full metadata of a group; participants maps JID -> role"""
+        participants = {normalize_jid(jid): role for jid, role in participants.items()}
+        with self._lock:
+            previous = self._groups.get(group_id)
+            old = previous['participants'] if previous else {}
+            for jid in old.keys() - participants.keys():
+                self._unindex(group_id, jid)
+            for jid in participants.keys() - old.keys():
+                self._index(group_id, jid)
+            self._groups[group_id] = {
+                'name': name,
+                'participants': participants,
+                'version': version,
+                'fetched_at': time.monotonic(),
+            }
+            self._invalid.discard(group_id)
+
+    def retain(self, group_ids):
+        """Drop every cached group not in group_ids (e.g. groups we have left)"""
+        with self._lock:
+            for group_id in set(self._groups) - set(group_ids):
+                self.remove(group_id)
+
+    def remove(self, group_id):
+        """Forget a group"""
+        with self._lock:
+            group = self._groups.pop(group_id, None)
+            if group is not None:
+                for jid in group['participants']:
+                    self._unindex(group_id, jid)
+            self._invalid.discard(group_id)
+
+    def apply_changes(self, group_id, join=(), leave=(), promote=(), demote=(), name=None,
+                      prev_version=None, version=None):
+        """Apply an incremental group update.
+
+        If the update doesn't follow the cached participant version, changes
+        were missed: the group is marked stale and re-fetched on the next
+        revalidation (the update itself is still applied).
+        """
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is None:
+                self._invalid.add(group_id)
+                return
+            if prev_version and group['version'] and prev_version != group['version']:
+                self._invalid.add(group_id)
+            participants = group['participants']
+            for jid in map(normalize_jid, join):
+                if jid not in participants:
+                    participants[jid] = MEMBER
+                    self._index(group_id, jid)
+            for jid in map(normalize_jid, leave):
+                if participants.pop(jid, None) is not None:
+                    self._unindex(group_id, jid)
+            for jid in map(normalize_jid, promote):
+                if jid in participants and participants[jid] < ADMIN:
+                    participants[jid] = ADMIN
+            for jid in map(normalize_jid, demote):
+                if jid in participants:
+                    participants[jid] = MEMBER
+            if name:
+                group['name'] = name
+            if version:
+                group['version'] = version
+
+    def stale(self, now=None):
+        """IDs of groups to re-fetch: past their TTL or known to be out of date"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = {
+                group_id for group_id, group in self._groups.items()
+                if now - group['fetched_at'] >= self.ttl
+            }
+            return sorted(expired | self._invalid)
+
+    def role(self, group_id, jid):
+        """Role of a JID in a group, or None if it isn't a participant"""
+        with self._lock:
+            group = self._groups.get(group_id)
+            return group['participants'].get(normalize_jid(jid)) if group else None
+
+    def get(self, group_id):
+        """Name, version and participants (JID -> 'member'/'admin'/'superadmin') of a group"""
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is None:
+                return None
+            return {
+                'id': group_id,
+                'name': group['name'],
+                'version': group['version'],
+                'participants': {jid: ROLE_NAMES[role] for jid, role in group['participants'].items()},
+            }
+
+    def name(self, group_id):
+        """Name of a cached group, or None"""
+        with self._lock:
+            group = self._groups.get(group_id)
+            return group['name'] if group else None
+
+    def is_admin(self, group_id, jid):
+        """Whether a JID is an admin (or super admin) of a group"""
+        role = self.role(group_id, jid)
+        return role is not None and role >= ADMIN
+
+    def groups_of(self, jid):
+        """IDs of the cached groups a JID participates in"""
+        with self._lock:
+            return set(self._by_participant.get(normalize_jid(jid), ()))
+
+    def annotate(self, message):
+        """Copy of a normalized message with the sender's group facts added.
+
+        ``sender_is_admin`` is whether the sender is an admin of the group the
+        message was sent in; ``sender_groups`` holds the IDs and names of all
+        cached groups the sender is in. Automation conditions read these
+        fields, so they also work in worker processes that have no cache.
+        """
+        sender = message.get('sender_id')
+        if not sender:
+            return dict(message, sender_is_admin=False, sender_groups=[])
+        with self._lock:
+            group_ids = self._by_participant.get(normalize_jid(sender), ())
+            sender_groups = set(group_ids)
+            sender_groups.update(self._groups[group_id]['name'] for group_id in group_ids)
+            sender_is_admin = bool(message.get('is_group')) and self.is_admin(message.get('chat_id'), sender)
+        sender_groups.discard(None)
+        # A list rather than a set: annotated messages end up in webhook payloads
+        return dict(message, sender_is_admin=sender_is_admin, sender_groups=sorted(sender_groups))
+
+    def summaries(self):
+        """Group list in the shape sent to the frontend"""
+        with self._lock:
+            return [
+                {
+                    'id': group_id,
+                    'name': group['name'],
+                    'participants': len(group['participants']),
+                    'admins': sum(1 for role in group['participants'].values() if role >= ADMIN),
+                }
+                for group_id, group in self._groups.items()
+            ]
+
+    def __len__(self):
+        return len(self._groups)
+
+
+_group_cache = None
+_group_cache_lock = threading.Lock()
+
+
+def get_group_cache():
+    """Shared GroupCache"""
+    global _group_cache
+    if _group_cache is None:
+        with _group_cache_lock:
+            if _group_cache is None:
+                _group_cache = GroupCache(Config.GROUP_CACHE_TTL)
+    return _group_cache
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+
+from ..config import Config
+from ..utils.timestamps import to_seconds
+
+# Normalized message fields, in storage order (see message_to_dict in the client)
+MESSAGE_FIELDS = (
+    'id', 'chat_id', 'sender', 'sender_id', 'text', 'timestamp',
+    'is_group', 'group_name', 'type', 'is_outgoing', 'media_type',
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    id TEXT UNIQUE,
+    chat_id TEXT,
+    sender TEXT,
+    sender_id TEXT,
+    text TEXT,
+    timestamp INTEGER,
+    is_group INTEGER,
+    group_name TEXT,
+    type TEXT,
+    is_outgoing INTEGER,
+    media_type TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_chat_seq ON messages (chat_id, seq);
+"""
+
+
+def row_to_message(row):
+    """Convert a row of MESSAGE_FIELDS columns back into a message dict"""
+    message = dict(zip(MESSAGE_FIELDS, row))
+    message['is_group'] = bool(message['is_group'])
+    message['is_outgoing'] = bool(message['is_outgoing'])
+    # Rows archived before timestamps were normalized hold milliseconds
+    message['timestamp'] = to_seconds(message['timestamp'])
+    return message
+
+
+def connect_readonly(db_path):
+    """Open a read-only connection to a message archive (used by worker processes)"""
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+
+
+class MessageStore:
+    """SQLite (WAL) archive of normalized messages.
+
+    Every message gets a monotonically increasing ``seq`` which is used to
+    shard the archive for rule dry-runs.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+    
+    def _migrate(self):
+        """Add columns introduced after the archive was created"""
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(messages)')}
+        for field in MESSAGE_FIELDS:
+            if field not in columns:
+                self._conn.execute(f'ALTER TABLE messages ADD COLUMN {field}')
+        self._conn.commit()
+
+    def add(self, message):
+        """Archive a single message dict (duplicates are ignored)"""
+        self.add_many([message])
+
+    def add_many(self, messages):
+        """Archive several message dicts in one transaction"""
+        placeholders = ', '.join('?' for _ in MESSAGE_FIELDS)
+        rows = [tuple(message.get(field) for field in MESSAGE_FIELDS) for message in messages]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT OR IGNORE INTO messages ({", ".join(MESSAGE_FIELDS)}) VALUES ({placeholders})',
+                rows,
+            )
+
+    def count(self):
+        """Number of archived messages"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+    def page(self, chat_id, before=None, limit=50):
+        """Newest messages of a chat with seq < before, oldest first.
+
+        Returns (messages, cursor); pass the cursor back as ``before`` to get
+        the previous page. The cursor is None once the start of the chat is
+        reached. Each page is a range scan of the (chat_id, seq) index, so
+        its cost does not depend on how deep into the history it is.
+        """
+        if before is None:
+            before = 2 ** 63 - 1
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT seq, {", ".join(MESSAGE_FIELDS)} FROM messages '
+                'WHERE chat_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?',
+                (chat_id, before, limit + 1),
+            ).fetchall()
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        messages = []
+        for row in reversed(rows[:limit]):
+            message = row_to_message(row[1:])
+            message['seq'] = row[0]
+            messages.append(message)
+        return messages, cursor
+
+    def seq_bounds(self):
+        """(min seq, max seq) of the archive, or (None, None) when empty"""
+        with self._lock:
+            return self._conn.execute('SELECT MIN(seq), MAX(seq) FROM messages').fetchone()
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
+
+
+_message_store = None
+_message_store_lock = threading.Lock()
+
+
+def get_message_store():
+    """Shared MessageStore, opened on first use"""
+    global _message_store
+    if _message_store is None:
+        with _message_store_lock:
+            if _message_store is None:
+                _message_store = MessageStore(Config.MESSAGE_ARCHIVE_PATH)
+    return _message_store
@@ -0,0 +1,132 @@
+import re
+import time
+from functools import lru_cache
+
+from ..utils.metrics import metrics
+from ..utils.timestamps import to_seconds
+
+# Placeholders look like {{ sender }}, {{ match.1 | upper }}
+_PLACEHOLDER_RE = re.compile(r'\{\{\s*(.*?)\s*\}\}')
+
+# Rendered text is cut off here, whatever the template expands to
+MAX_RENDERED_LENGTH = 4096
+
+# Text of a forward action that doesn't set its own
+DEFAULT_FORWARD_TEMPLATE = 'Forwarded message from {{ sender }}: {{ text }}'
+
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute, fmt):
+    return time.strftime(fmt, time.localtime(minute * 60))
+
+
+def _message_time(message, fmt):
+    """Local time of a message, formatted; cached per minute since many messages share one"""
+    timestamp = to_seconds(message.get('timestamp')) or time.time()
+    return _format_minute(int(timestamp // 60), fmt)
+
+
+# Variables a template can use; each is read from (message, regex match)
+VARIABLES = {
+    'sender': lambda message, match: message.get('sender') or message.get('sender_id') or 'Unknown',
+    'sender_id': lambda message, match: message.get('sender_id') or '',
+    'chat': lambda message, match: message.get('group_name') or message.get('chat_id') or '',
+    'chat_id': lambda message, match: message.get('chat_id') or '',
+    'text': lambda message, match: message.get('text') or '',
+    'time': lambda message, match: _message_time(message, '%H:%M'),
+    'date': lambda message, match: _message_time(message, '%Y-%m-%d'),
+    'now': lambda message, match: _format_minute(int(time.time() // 60), '%H:%M'),
+}
+
+FILTERS = {
+    'upper': str.upper,
+    'lower': str.lower,
+    'title': str.title,
+    'strip': str.strip,
+}
+
+
+def _match_getter(group, regex):
+    """Getter for {{ match }} / {{ match.N }} / {{ match.name }}, checked against the rule's regex"""
+    if regex is None:
+        raise ValueError('Template uses match but the rule has no message_text regex')
+    if group is None:
+        group = 0
+    elif group.isdigit():
+        group = int(group)
+        if group > regex.groups:
+            raise ValueError(f'Template uses match.{group} but the rule regex has no such group')
+    elif group not in regex.groupindex:
+        raise ValueError(f'Template uses match.{group} but the rule regex has no such named group')
+
+    def getter(message, match):
+        return (match.group(group) or '') if match else ''
+    return getter
+
+
+def _compile_placeholder(expression, regex):
+    """Callable(message, match) -> str for one placeholder expression"""
+    name, *filters = [part.strip() for part in expression.split('|')]
+    variable, _, attribute = name.partition('.')
+    if variable == 'match':
+        getter = _match_getter(attribute or None, regex)
+    elif variable in VARIABLES and not attribute:
+        getter = VARIABLES[variable]
+    else:
+        raise ValueError(f'Unknown template variable: {name}')
+    for filter_name in filters:
+        if filter_name not in FILTERS:
+            raise ValueError(f'Unknown template filter: {filter_name}')
+    if not filters:
+        return getter
+    functions = [FILTERS[filter_name] for filter_name in filters]
+
+    def filtered(message, match):
+        value = getter(message, match)
+        for function in functions:
+            value = function(value)
+        return value
+    return filtered
+
+
+class MessageTemplate:
+    """Reply/forward text with {{ variable }} placeholders, compiled once.
+
+    Only the names in ``VARIABLES``, ``match`` groups of the rule's
+    ``message_text`` regex and the ``FILTERS`` are allowed; there is no
+    expression evaluation, so a template can't reach anything else.
+    Compiling splits the text into literal parts and getters, so rendering
+    is a join. Render times are recorded per template under
+    ``automation.template_render_seconds.<name>``.
+    """
+
+    def __init__(self, source, name='inline', regex=None):
+        self.source = source or ''
+        self.name = name
+        self.regex = regex
+        self.uses_match = False
+        self._metric = f'automation.template_render_seconds.{name}'
+        parts = []
+        position = 0
+        for placeholder in _PLACEHOLDER_RE.finditer(self.source):
+            if placeholder.start() > position:
+                parts.append(self.source[position:placeholder.start()])
+            expression = placeholder.group(1)
+            parts.append(_compile_placeholder(expression, regex))
+            if expression.split('|')[0].strip().partition('.')[0] == 'match':
+                self.uses_match = True
+            position = placeholder.end()
+        if position < len(self.source):
+            parts.append(self.source[position:])
+        self._parts = parts
+        self._static = self.source if not any(callable(part) for part in parts) else None
+
+    def render(self, message, match=None):
+        """Text for a message; match is the rule regex's match object, if any"""
+        start = time.perf_counter()
+        if self._static is not None:
+            text = self._static
+        else:
+            text = ''.join([part if part.__class__ is str else part(message, match) for part in self._parts])
+        metrics.observe(self._metric, time.perf_counter() - start)
+        return text[:MAX_RENDERED_LENGTH]
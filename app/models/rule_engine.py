@@ -0,0 +1,75 @@
+from ..utils.aho_corasick import AhoCorasick
+from .automation import tokenize
+from .conversation import NO_STATE
+
+
+class RuleEngine:
+    """Evaluates a whole rule set against a message in a single pass.
+
+    Keywords of every rule share one Aho-Corasick automaton, and rules are
+    indexed by their most selective condition (keywords, sender, group,
+    conversation state), so
+    only candidate rules are checked in full. A message costs one tokenize,
+    one automaton scan and a few dict lookups whether there are 1 or 5,000
+    keyword rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule for rule in rules if rule.is_active]
+        self._automaton = AhoCorasick()
+        self._by_sender = {}
+        self._by_group = {}
+        self._by_state = {}
+        self._unanchored = []
+
+        for index, rule in enumerate(self.rules):
+            conditions = rule.compiled_conditions
+            anchored = False
+            for condition_index, (condition_type, value) in enumerate(conditions):
+                if condition_type == 'keywords':
+                    for phrase in value:
+                        self._automaton.add(phrase, (index, condition_index))
+                    anchored = True
+            if anchored:
+                continue
+
+            types = dict(conditions)
+            if 'sender' in types:
+                self._by_sender.setdefault(types['sender'], []).append(index)
+            elif 'group' in types:
+                self._by_group.setdefault(types['group'], []).append(index)
+            elif 'conversation_state' in types and NO_STATE not in types['conversation_state']:
+                for state in types['conversation_state']:
+                    self._by_state.setdefault(state, []).append(index)
+            else:
+                self._unanchored.append(index)
+
+        self._automaton.build()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, message):
+        """Rules matching the message, in rule order"""
+        keyword_hits = {}
+        if len(self._automaton):
+            for index, condition_index in self._automaton.search(tokenize(message.get('text'))):
+                keyword_hits.setdefault(index, set()).add(condition_index)
+
+        candidates = set(keyword_hits)
+        candidates.update(self._unanchored)
+        if self._by_sender:
+            for key in (message.get('sender_id'), message.get('sender')):
+                candidates.update(self._by_sender.get(key, ()))
+        if self._by_group and message.get('is_group'):
+            for key in (message.get('chat_id'), message.get('group_name')):
+                candidates.update(self._by_group.get(key, ()))
+        if self._by_state and message.get('conversation_state'):
+            candidates.update(self._by_state.get(message['conversation_state'], ()))
+
+        matched = []
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            if rule.matches(message, keyword_hits.get(index, ())):
+                matched.append(rule)
+        return matched
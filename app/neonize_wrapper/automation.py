@@ -0,0 +1,446 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from ..config import Config
+from ..utils.metrics import metrics
+
+_WEBHOOK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_retries (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    headers TEXT,
+    body BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS webhook_retries_due ON webhook_retries (next_attempt_at);
+CREATE TABLE IF NOT EXISTS webhook_batch_items (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    headers TEXT,
+    payload BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS webhook_dead_letters (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    headers TEXT,
+    body BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+# next_attempt_at of deliveries this process holds in memory; they become due on restart
+_HELD = float('inf')
+
+
+def _batch_key(url, headers):
+    """Payloads are only batched together if they go to the same URL with the same headers"""
+    return url, tuple(sorted((str(name), str(value)) for name, value in (headers or {}).items()))
+
+
+class WebhookDelivery:
+    """A single HTTP POST: one payload, or one batch of payloads for an endpoint"""
+
+    __slots__ = ('url', 'headers', 'body', 'attempts', 'retry_id', 'created_at')
+
+    def __init__(self, url, headers, body, attempts=0, retry_id=None, created_at=None):
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.attempts = attempts
+        self.retry_id = retry_id
+        self.created_at = created_at or time.time()
+
+
+class WebhookDispatcher:
+    """Delivers webhook actions over one pooled, keep-alive aiohttp session.
+
+    Runs its own event loop in a daemon thread so it can be fed from the
+    Flask request threads and the neonize event loop alike. Payloads for
+    endpoints configured with a batch size are coalesced into one POST.
+    Failed deliveries are kept in a SQLite retry queue with exponential
+    backoff and moved to a dead-letter table after ``max_attempts``.
+
+    Every payload is written to SQLite before ``enqueue`` returns and removed
+    once it is delivered or dead-lettered, so deliveries that were queued in
+    memory when the process died are sent on the next start.
+    """
+
+    def __init__(self, db_path, concurrency=64, max_attempts=8, timeout=10,
+                 queue_size=10000, retry_base_delay=1.0, retry_max_delay=3600.0):
+        self.db_path = os.path.abspath(db_path)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # Leased retries not finished within this time are picked up again
+        self.retry_lease = max(timeout * 3, 30)
+        self.retry_poll_interval = 1.0
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_WEBHOOK_SCHEMA)
+        self._recover()
+
+        self._start_lock = threading.Lock()
+        self._started = threading.Event()
+        self._setup_done = threading.Event()
+        self._setup_error = None
+        self._thread = None
+        self._loop = None
+        self._queue = None
+        self._session = None
+        self._tasks = []
+        self._batches = {}  # (url, headers) -> [headers, payload bodies, batch item ids, timer handle]
+
+    def _recover(self):
+        """Make deliveries a previous process held in memory due for delivery now"""
+        now = time.time()
+        with self._db_lock, self._conn:
+            held = self._conn.execute(
+                'UPDATE webhook_retries SET next_attempt_at = ? WHERE next_attempt_at = ?', (now, _HELD)
+            ).rowcount
+            batches = {}
+            for item_id, url, headers, payload, created_at in self._conn.execute(
+                'SELECT id, url, headers, payload, created_at FROM webhook_batch_items ORDER BY id'
+            ).fetchall():
+                batch = batches.setdefault((url, headers), [[], [], created_at])
+                batch[0].append(payload)
+                batch[1].append(item_id)
+            for (url, headers), (payloads, item_ids, created_at) in batches.items():
+                self._conn.execute(
+                    'INSERT INTO webhook_retries (url, headers, body, attempts, next_attempt_at, last_error, created_at) '
+                    'VALUES (?, ?, ?, 0, ?, NULL, ?)',
+                    (url, headers, b'[' + b','.join(payloads) + b']', now, created_at),
+                )
+                self._conn.executemany('DELETE FROM webhook_batch_items WHERE id = ?', [(i,) for i in item_ids])
+        metrics.incr('webhook.recovered', held + len(batches))
+
+    # Lifecycle
+
+    def start(self):
+        """Start the dispatcher thread if it is not running yet.
+
+        Raises RuntimeError if the session can't be set up (the next call tries again).
+        """
+        if self._started.is_set():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._setup_error = None
+                self._setup_done.clear()
+                self._thread = threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True)
+                self._thread.start()
+            thread = self._thread
+        self._setup_done.wait()
+        if not self._started.is_set():
+            error = self._setup_error
+            with self._start_lock:
+                if self._thread is thread:
+                    self._thread = None
+            raise RuntimeError(f'Webhook dispatcher failed to start: {error}') from error
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._setup())
+        except Exception as e:
+            self._setup_error = e
+            self._loop.close()
+            self._setup_done.set()
+            return
+        self._started.set()
+        self._setup_done.set()
+        self._loop.run_forever()
+
+    async def _setup(self):
+        import aiohttp
+
+        self._queue = asyncio.Queue(self.queue_size)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.ensure_future(self._retry_loop()))
+
+    def stop(self, timeout=10):
+        """Flush pending batches, wait for in-flight deliveries and stop the thread"""
+        if not self._started.is_set():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self._loop)
+        future.result(timeout + 5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        self._started.clear()
+
+    async def _shutdown(self, timeout):
+        for key in list(self._batches):
+            self._flush_batch(key)
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            # Whatever is still queued goes to the retry queue
+            while not self._queue.empty():
+                self._schedule_retry(self._queue.get_nowait(), 'shutdown', count_attempt=False)
+                self._queue.task_done()
+        for task in self._tasks:
+            task.cancel()
+        await self._session.close()
+
+    # Producer side (any thread)
+
+    def enqueue(self, url, payload, headers=None, batch_size=1, batch_interval=1.0):
+        """Queue a JSON payload for delivery to url; it is in SQLite when this returns"""
+        self.start()
+        body = json.dumps(payload).encode('utf-8')
+        now = time.time()
+        with self._db_lock, self._conn:
+            if batch_size <= 1:
+                row_id = self._conn.execute(
+                    'INSERT INTO webhook_retries (url, headers, body, attempts, next_attempt_at, last_error, created_at) '
+                    'VALUES (?, ?, ?, 0, ?, NULL, ?)',
+                    (url, json.dumps(headers) if headers else None, body, _HELD, now),
+                ).lastrowid
+            else:
+                row_id = self._conn.execute(
+                    'INSERT INTO webhook_batch_items (url, headers, payload, created_at) VALUES (?, ?, ?, ?)',
+                    (url, json.dumps(headers, sort_keys=True) if headers else None, body, now),
+                ).lastrowid
+        self._loop.call_soon_threadsafe(self._accept, url, body, headers, row_id, batch_size, batch_interval)
+
+    def _accept(self, url, body, headers, row_id, batch_size, batch_interval):
+        metrics.incr('webhook.enqueued')
+        if batch_size <= 1:
+            self._submit(WebhookDelivery(url, headers, body, retry_id=row_id))
+            return
+
+        key = _batch_key(url, headers)
+        batch = self._batches.get(key)
+        if batch is None:
+            handle = self._loop.call_later(batch_interval, self._flush_batch, key)
+            batch = self._batches[key] = [headers, [], [], handle]
+        batch[1].append(body)
+        batch[2].append(row_id)
+        if len(batch[1]) >= batch_size:
+            self._flush_batch(key)
+
+    def _flush_batch(self, key):
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        url = key[0]
+        headers, bodies, item_ids, handle = batch
+        handle.cancel()
+        metrics.incr('webhook.batches')
+        delivery = WebhookDelivery(url, headers, b'[' + b','.join(bodies) + b']')
+        # The batch replaces its items in SQLite in one transaction
+        with self._db_lock, self._conn:
+            delivery.retry_id = self._conn.execute(
+                'INSERT INTO webhook_retries (url, headers, body, attempts, next_attempt_at, last_error, created_at) '
+                'VALUES (?, ?, ?, 0, ?, NULL, ?)',
+                (url, json.dumps(headers) if headers else None, delivery.body, _HELD, delivery.created_at),
+            ).lastrowid
+            self._conn.executemany('DELETE FROM webhook_batch_items WHERE id = ?', [(i,) for i in item_ids])
+        self._submit(delivery)
+
+    def _submit(self, delivery):
+        try:
+            self._queue.put_nowait(delivery)
+        except asyncio.QueueFull:
+            # Don't block the caller: park it in the persistent retry queue
+            metrics.incr('webhook.overflow')
+            self._schedule_retry(delivery, 'queue full', count_attempt=False)
+        metrics.set_gauge('webhook.queue_depth', self._queue.qsize())
+
+    # Delivery
+
+    async def _worker(self):
+        while True:
+            delivery = await self._queue.get()
+            try:
+                await self._deliver(delivery)
+            except Exception as e:
+                self._record_failure(delivery, f'Unexpected error: {e}', retryable=True)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, delivery):
+        import aiohttp
+
+        headers = {'Content-Type': 'application/json'}
+        if delivery.headers:
+            headers.update(delivery.headers)
+
+        start = time.perf_counter()
+        try:
+            async with self._session.post(delivery.url, data=delivery.body, headers=headers) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._record_failure(delivery, str(e) or type(e).__name__, retryable=True)
+            return
+        metrics.observe('webhook.latency_seconds', time.perf_counter() - start)
+
+        if 200 <= status < 300:
+            metrics.incr('webhook.delivered')
+            with self._db_lock, self._conn:
+                self._conn.execute('DELETE FROM webhook_retries WHERE id = ?', (delivery.retry_id,))
+            return
+
+        # Client errors other than timeouts/throttling won't succeed on retry
+        self._record_failure(delivery, f'HTTP {status}', retryable=status >= 500 or status in (408, 429))
+
+    def _record_failure(self, delivery, error, retryable):
+        metrics.incr('webhook.failed')
+        delivery.attempts += 1
+        if not retryable or delivery.attempts >= self.max_attempts:
+            self._dead_letter(delivery, error)
+        else:
+            self._schedule_retry(delivery, error)
+
+    # Persistent retry queue and dead letters
+
+    def _backoff(self, attempts):
+        """Exponential backoff with equal jitter"""
+        ceiling = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempts))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def _schedule_retry(self, delivery, error, count_attempt=True):
+        next_attempt_at = time.time() + (self._backoff(delivery.attempts) if count_attempt else 0)
+        headers = json.dumps(delivery.headers) if delivery.headers else None
+        with self._db_lock, self._conn:
+            if delivery.retry_id is None:
+                cursor = self._conn.execute(
+                    'INSERT INTO webhook_retries (url, headers, body, attempts, next_attempt_at, last_error, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (delivery.url, headers, delivery.body, delivery.attempts, next_attempt_at, error, delivery.created_at),
+                )
+                delivery.retry_id = cursor.lastrowid
+            else:
+                self._conn.execute(
+                    'UPDATE webhook_retries SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                    (delivery.attempts, next_attempt_at, error, delivery.retry_id),
+                )
+        metrics.incr('webhook.retries_scheduled')
+
+    def _dead_letter(self, delivery, error):
+        headers = json.dumps(delivery.headers) if delivery.headers else None
+        with self._db_lock, self._conn:
+            if delivery.retry_id is not None:
+                self._conn.execute('DELETE FROM webhook_retries WHERE id = ?', (delivery.retry_id,))
+            self._conn.execute(
+                'INSERT INTO webhook_dead_letters (url, headers, body, attempts, last_error, created_at, failed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (delivery.url, headers, delivery.body, delivery.attempts, error, delivery.created_at, time.time()),
+            )
+        metrics.incr('webhook.dead_lettered')
+
+    def _lease_due_retries(self, limit=500):
+        now = time.time()
+        with self._db_lock, self._conn:
+            rows = self._conn.execute(
+                'SELECT id, url, headers, body, attempts, created_at FROM webhook_retries '
+                'WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?',
+                (now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                'UPDATE webhook_retries SET next_attempt_at = ? WHERE id = ?',
+                [(now + self.retry_lease, row[0]) for row in rows],
+            )
+        return [
+            WebhookDelivery(url, json.loads(headers) if headers else None, body, attempts, retry_id, created_at)
+            for retry_id, url, headers, body, attempts, created_at in rows
+        ]
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(self.retry_poll_interval)
+            try:
+                for delivery in self._lease_due_retries():
+                    metrics.incr('webhook.retried')
+                    await self._queue.put(delivery)
+            except sqlite3.Error as e:
+                print(f"Error reading webhook retry queue: {e}")
+
+    def pending_retries(self):
+        """Number of deliveries waiting in the retry queue"""
+        with self._db_lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM webhook_retries WHERE next_attempt_at < ?', (_HELD,)
+            ).fetchone()[0]
+
+    def dead_letters(self, limit=100):
+        """Most recent dead-lettered deliveries"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT id, url, body, attempts, last_error, created_at, failed_at FROM webhook_dead_letters '
+                'ORDER BY id DESC LIMIT ?',
+                (limit,),
+            ).fetchall()
+        return [
+            {
+                'id': row[0],
+                'url': row[1],
+                'body': json.loads(row[2]),
+                'attempts': row[3],
+                'last_error': row[4],
+                'created_at': row[5],
+                'failed_at': row[6],
+            }
+            for row in rows
+        ]
+
+    def requeue_dead_letter(self, dead_letter_id):
+        """Move a dead letter back into the retry queue, returns False if unknown"""
+        with self._db_lock, self._conn:
+            row = self._conn.execute(
+                'SELECT url, headers, body, created_at FROM webhook_dead_letters WHERE id = ?',
+                (dead_letter_id,),
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute(
+                'INSERT INTO webhook_retries (url, headers, body, attempts, next_attempt_at, last_error, created_at) '
+                'VALUES (?, ?, ?, 0, ?, NULL, ?)',
+                (row[0], row[1], row[2], time.time(), row[3]),
+            )
+            self._conn.execute('DELETE FROM webhook_dead_letters WHERE id = ?', (dead_letter_id,))
+        return True
+
+
+_webhook_dispatcher = None
+_webhook_dispatcher_lock = threading.Lock()
+
+
+def get_webhook_dispatcher():
+    """Shared WebhookDispatcher, created on first use"""
+    global _webhook_dispatcher
+    if _webhook_dispatcher is None:
+        with _webhook_dispatcher_lock:
+            if _webhook_dispatcher is None:
+                _webhook_dispatcher = WebhookDispatcher(
+                    Config.WEBHOOK_QUEUE_PATH,
+                    concurrency=Config.WEBHOOK_CONCURRENCY,
+                    max_attempts=Config.WEBHOOK_MAX_ATTEMPTS,
+                    timeout=Config.WEBHOOK_TIMEOUT,
+                )
+    return _webhook_dispatcher
@@ -2,29 +2,69 @@ import os
 import base64
 from io import BytesIO
 import asyncio
-from threading import Thread
+import concurrent.futures
+from threading import Lock, Thread
 import time
 from flask_socketio import emit
-from neonize.aioze.client import NewAClient
-from neonize.events import ConnectedEv, MessageEv, PairStatusEv
-from neonize.proto.waE2E.WAWebProtobufsE2E_pb2 import (
-    Message,
-    FutureProofMessage,
-    InteractiveMessage,
-    MessageContextInfo,
-    DeviceListMetadata,
-)
-from neonize.types import MessageServerID
-from neonize.utils import log
-from neonize.utils.enum import ReceiptType
-import qrcode
-import io
-from icecream import ic
 import re
+import random
 import logging
-import eventlet
 
 from .. import socketio
+from ..config import Config
+from ..models import delivery
+from ..models import group_cache
+from ..models.message_store import get_message_store
+from ..utils.metrics import metrics
+from ..utils.payloads import emit_large
+from ..utils.subscriptions import subscriptions
+from ..utils.timestamps import to_seconds
+from .events import publish_event
+from .ingest import IngestPipeline
+
+# neonize (protobuf + Go binding), qrcode/PIL, eventlet and icecream are
+# imported on first use so that importing this module stays cheap
+_ic = None
+
+_whatsapp_client = None
+_whatsapp_client_lock = Lock()
+
+def ic(*args):
+    """icecream's ic(), imported on first call"""
+    global _ic
+    if _ic is None:
+        from icecream import ic as icecream_ic
+        _ic = icecream_ic
+    return _ic(*args)
+
+def jid_to_str(jid):
+    """'user@server' string of a neonize JID, used as chat, sender and group ID"""
+    from neonize.utils.jid import Jid2String
+    
+    return Jid2String(jid)
+
+class SendOutcomeUnknown(Exception):
+    """A send was handed to WhatsApp without a confirmation: it may or may not have gone out"""
+
+def message_to_dict(message):
+    """Normalize a neonize MessageEv into the dict used by the frontend and archive"""
+    source = message.Info.MessageSource
+    chat_id = jid_to_str(source.Chat)
+    return {
+        'id': message.Info.ID,
+        'chat_id': chat_id,
+        # JIDs carry no names: the sender's is the push name, a group's comes from the cache
+        'sender': message.Info.Pushname or 'Unknown',
+        'sender_id': jid_to_str(source.Sender) if source.Sender.User else None,
+        'text': message.Message.conversation if message.Message.conversation else '',
+        # Unix seconds everywhere past this point; neonize gives milliseconds
+        'timestamp': int(to_seconds(message.Info.Timestamp) or 0),
+        'is_group': source.IsGroup,
+        'group_name': group_cache.get_group_cache().name(chat_id) if source.IsGroup else None,
+        'type': message.Info.Type,
+        'media_type': message.Info.MediaType or 'text',
+        'is_outgoing': source.IsFromMe
+    }
 
 class WhatsAppClient:
     def __init__(self, session_path):
@@ -38,6 +78,21 @@ class WhatsAppClient:
         self.groups = []
         self.loop = None
         
+        # Reconnect supervisor state
+        self.reconnecting = False
+        self._manual_disconnect = False
+        self._disconnected_at = None
+        self._supervisor_task = None
+        self._revalidate_task = None
+        self._connected_event = asyncio.Event()
+        
+        # Incoming messages are processed off the event loop, live before history
+        self.ingest = IngestPipeline(
+            self._process_messages,
+            capacity=Config.INGEST_QUEUE_CAPACITY,
+            batch_size=Config.INGEST_BATCH_SIZE,
+        )
+        
         # Create session directory if it doesn't exist
         os.makedirs(self.session_path, exist_ok=True)
         
@@ -45,75 +100,17 @@ class WhatsAppClient:
         """Connect to WhatsApp"""
         try:
             ic("Starting connection process")
-            # Create new client instance with SQLite database
-            db_path = os.path.join(self.session_path, "db.sqlite3")
-            self.client = NewAClient(db_path)
-            ic("Client instance created")
+            self._manual_disconnect = False
             
-            # Set up event handlers
-            @self.client.event(ConnectedEv)
-            async def on_connected(_: NewAClient, __: ConnectedEv):
-                try:
-                    ic("Connected event received")
-                    self.connected = True
-                    socketio.emit('connection_status', {'status': 'connected'})
-                    # Load contacts and groups after connection
-                    await self._load_contacts_and_groups()
-                    ic("Contacts and groups loaded")
-                except Exception as e:
-                    ic(f"Error in connected handler: {str(e)}")
-                    socketio.emit('error', {'message': f'Connection Error: {str(e)}'})
-            
-            @self.client.event(MessageEv)
-            async def on_message(_: NewAClient, message: MessageEv):
-                try:
-                    ic(f"Message received: {message.Info.ID}")
-                    self._process_message(message)
-                except Exception as e:
-                    ic(f"Error in message handler: {str(e)}")
-                    socketio.emit('error', {'message': f'Message Error: {str(e)}'})
-            
-            @self.client.event(PairStatusEv)
-            async def on_pair_status(_: NewAClient, message: PairStatusEv):
-                try:
-                    ic(f"Pair status received: {message.ID.User}")
-                    socketio.emit('connection_status', {'status': 'paired'})
-                except Exception as e:
-                    ic(f"Error in pair status handler: {str(e)}")
-                    socketio.emit('error', {'message': f'Pair Status Error: {str(e)}'})
-            
-            # Set QR callback
-            def on_qr(qr_data: str):
-                try:
-                    ic(f"QR code received: {qr_data}")
-                    # Generate QR code with specific settings
-                    qr = qrcode.QRCode(
-                        version=1,
-                        error_correction=qrcode.constants.ERROR_CORRECT_L,
-                        box_size=10,
-                        border=4,
-                    )
-                    qr.add_data(qr_data)
-                    qr.make(fit=True)
-                    
-                    # Create image with specific settings
-                    qr_img = qr.make_image(fill_color="black", back_color="white")
-                    
-                    # Convert to base64
-                    buffered = BytesIO()
-                    qr_img.save(buffered, format="PNG")
-                    qr_base64 = base64.b64encode(buffered.getvalue()).decode()
-                    
-                    # Emit QR code to frontend
-                    socketio.emit('qr_code', {'qr': qr_base64})
-                    ic("QR code emitted to frontend")
-                    
-                except Exception as e:
-                    ic(f"Error in QR handler: {str(e)}")
-                    socketio.emit('error', {'message': f'QR Error: {str(e)}'})
-            
-            self.client.on_qr = on_qr
-            ic("QR callback set")
+            # Reuse the existing client (and its session db and handlers) if we have one
+            if self.client is None:
+                from neonize.aioze.client import NewAClient
+                
+                # Create new client instance with SQLite database
+                db_path = os.path.join(self.session_path, "db.sqlite3")
+                self.client = NewAClient(db_path)
+                ic("Client instance created")
+                self._register_handlers()
             
             # Start connection
             loop = asyncio.get_event_loop()
@@ -125,6 +122,257 @@ class WhatsAppClient:
             socketio.emit('error', {'message': f'Connection Error: {str(e)}'})
             raise e
     
+    def _register_handlers(self):
+        """Register neonize event handlers on the current client"""
+        from neonize.aioze.client import NewAClient
+        from neonize.events import (
+            ConnectedEv,
+            ConnectFailureEv,
+            DisconnectedEv,
+            GroupInfoEv,
+            JoinedGroupEv,
+            KeepAliveTimeoutEv,
+            LoggedOutEv,
+            MessageEv,
+            PairStatusEv,
+            ReceiptEv,
+            StreamErrorEv,
+            StreamReplacedEv,
+        )
+        
+        # Set up event handlers
+        @self.client.event(ConnectedEv)
+        async def on_connected(_: NewAClient, __: ConnectedEv):
+            try:
+                ic("Connected event received")
+                # The loop that drives the client; other threads schedule client coroutines on it
+                self.loop = asyncio.get_running_loop()
+                self.connected = True
+                self.reconnecting = False
+                self._connected_event.set()
+                publish_event('connected', {'reconnect': self._disconnected_at is not None})
+                if self._disconnected_at is not None:
+                    # Warm restart: serve the cached directory right away
+                    downtime = time.monotonic() - self._disconnected_at
+                    self._disconnected_at = None
+                    metrics.incr('whatsapp.reconnects')
+                    metrics.observe('whatsapp.downtime_seconds', downtime)
+                    ic(f"Reconnected after {downtime:.1f}s")
+                    socketio.emit('connection_status', {'status': 'connected'})
+                    emit_large('contacts_updated', {'contacts': self.contacts})
+                    emit_large('groups_updated', {'groups': self.groups})
+                else:
+                    socketio.emit('connection_status', {'status': 'connected'})
+                # Load contacts and groups after connection
+                await self._load_contacts_and_groups()
+                ic("Contacts and groups loaded")
+                if self._revalidate_task is None or self._revalidate_task.done():
+                    self._revalidate_task = asyncio.get_running_loop().create_task(self._revalidate_groups())
+                # Resume automation actions left pending by a previous run
+                from ..models.automation import AutomationManager
+
+                AutomationManager().get_outbox()
+            except Exception as e:
+                ic(f"Error in connected handler: {str(e)}")
+                socketio.emit('error', {'message': f'Connection Error: {str(e)}'})
+        
+        @self.client.event(MessageEv)
+        async def on_message(_: NewAClient, message: MessageEv):
+            try:
+                ic(f"Message received: {message.Info.ID}")
+                await self._ingest_message(message)
+            except Exception as e:
+                ic(f"Error in message handler: {str(e)}")
+                socketio.emit('error', {'message': f'Message Error: {str(e)}'})
+        
+        @self.client.event(PairStatusEv)
+        async def on_pair_status(_: NewAClient, message: PairStatusEv):
+            try:
+                ic(f"Pair status received: {message.ID.User}")
+                publish_event('pair_status', {'jid': message.ID.User})
+                socketio.emit('connection_status', {'status': 'paired'})
+            except Exception as e:
+                ic(f"Error in pair status handler: {str(e)}")
+                socketio.emit('error', {'message': f'Pair Status Error: {str(e)}'})
+        
+        # Keep the group cache current without re-fetching whole groups
+        @self.client.event(GroupInfoEv)
+        async def on_group_info(_: NewAClient, event: GroupInfoEv):
+            try:
+                group_id = jid_to_str(event.JID)
+                cache = group_cache.get_group_cache()
+                if event.HasField('Delete'):
+                    cache.remove(group_id)
+                else:
+                    cache.apply_changes(
+                        group_id,
+                        join=[jid_to_str(jid) for jid in event.Join],
+                        leave=[jid_to_str(jid) for jid in event.Leave],
+                        promote=[jid_to_str(jid) for jid in event.Promote],
+                        demote=[jid_to_str(jid) for jid in event.Demote],
+                        name=event.Name.Name if event.HasField('Name') else None,
+                        prev_version=event.PrevParticipantsVersionID or None,
+                        version=event.ParticipantVersionID or None,
+                    )
+                self._groups_changed()
+            except Exception as e:
+                ic(f"Error in group info handler: {str(e)}")
+        
+        @self.client.event(JoinedGroupEv)
+        async def on_joined_group(_: NewAClient, event: JoinedGroupEv):
+            try:
+                self._cache_group(event.GroupInfo)
+                self._groups_changed()
+            except Exception as e:
+                ic(f"Error in joined group handler: {str(e)}")
+        
+        # Played counts as read; sender/retry/self receipts don't change delivery state
+        receipt_states = {
+            ReceiptEv.DELIVERED: delivery.DELIVERED,
+            ReceiptEv.READ: delivery.READ,
+            ReceiptEv.PLAYED: delivery.READ,
+        }
+        
+        @self.client.event(ReceiptEv)
+        async def on_receipt(_: NewAClient, receipt: ReceiptEv):
+            try:
+                state = receipt_states.get(receipt.Type)
+                if state is None:
+                    return
+                changes = delivery.get_delivery_tracker().update(
+                    list(receipt.MessageIDs), state, to_seconds(receipt.Timestamp)
+                )
+                self._emit_status_updates(changes)
+            except Exception as e:
+                ic(f"Error in receipt handler: {str(e)}")
+        
+        # Transient failures: let the supervisor bring the connection back
+        @self.client.event(DisconnectedEv)
+        async def on_disconnected(_: NewAClient, __: DisconnectedEv):
+            self._on_connection_lost('disconnected')
+        
+        @self.client.event(ConnectFailureEv)
+        async def on_connect_failure(_: NewAClient, __: ConnectFailureEv):
+            self._on_connection_lost('connect_failure')
+        
+        @self.client.event(KeepAliveTimeoutEv)
+        async def on_keepalive_timeout(_: NewAClient, __: KeepAliveTimeoutEv):
+            self._on_connection_lost('keepalive_timeout')
+        
+        @self.client.event(StreamErrorEv)
+        async def on_stream_error(_: NewAClient, __: StreamErrorEv):
+            self._on_connection_lost('stream_error')
+        
+        # Terminal failures: the session is no longer ours, reconnecting won't help
+        @self.client.event(LoggedOutEv)
+        async def on_logged_out(_: NewAClient, __: LoggedOutEv):
+            self._on_connection_lost('logged_out', retry=False)
+        
+        @self.client.event(StreamReplacedEv)
+        async def on_stream_replaced(_: NewAClient, __: StreamReplacedEv):
+            self._on_connection_lost('stream_replaced', retry=False)
+        
+        # Set QR callback
+        def on_qr(qr_data: str):
+            try:
+                ic(f"QR code received: {qr_data}")
+                import qrcode
+                
+                # Generate QR code with specific settings
+                qr = qrcode.QRCode(
+                    version=1,
+                    error_correction=qrcode.constants.ERROR_CORRECT_L,
+                    box_size=10,
+                    border=4,
+                )
+                qr.add_data(qr_data)
+                qr.make(fit=True)
+                
+                # Create image with specific settings
+                qr_img = qr.make_image(fill_color="black", back_color="white")
+                
+                # Convert to base64
+                buffered = BytesIO()
+                qr_img.save(buffered, format="PNG")
+                qr_base64 = base64.b64encode(buffered.getvalue()).decode()
+                self.qr_code_data = qr_base64
+                
+                # Emit QR code to frontend
+                socketio.emit('qr_code', {'qr': qr_base64})
+                ic("QR code emitted to frontend")
+                
+            except Exception as e:
+                ic(f"Error in QR handler: {str(e)}")
+                socketio.emit('error', {'message': f'QR Error: {str(e)}'})
+        
+        self.client.on_qr = on_qr
+        ic("QR callback set")
+    
+    def _on_connection_lost(self, reason, retry=True):
+        """Mark the connection as down and start the reconnect supervisor"""
+        ic(f"Connection lost: {reason}")
+        metrics.incr(f'whatsapp.disconnects.{reason}')
+        publish_event('disconnected', {'reason': reason, 'retry': retry and not self._manual_disconnect})
+        was_connected = self.connected
+        self.connected = False
+        self._connected_event.clear()
+        if was_connected and self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
+        
+        if not retry or self._manual_disconnect:
+            self.reconnecting = False
+            self._disconnected_at = None
+            socketio.emit('connection_status', {'status': 'disconnected', 'reason': reason})
+            return
+        
+        socketio.emit('connection_status', {'status': 'reconnecting', 'reason': reason})
+        if self._supervisor_task is None or self._supervisor_task.done():
+            self.reconnecting = True
+            self._supervisor_task = asyncio.get_running_loop().create_task(self._supervise_reconnect())
+    
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff delay for the given attempt"""
+        ceiling = min(Config.NEONIZE_RECONNECT_MAX_DELAY, Config.NEONIZE_RECONNECT_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, ceiling)
+    
+    async def _supervise_reconnect(self):
+        """Reconnect with jittered exponential backoff until connected or told to stop"""
+        attempt = 0
+        max_attempts = Config.NEONIZE_RECONNECT_MAX_ATTEMPTS
+        try:
+            while not self.connected and not self._manual_disconnect:
+                if max_attempts and attempt >= max_attempts:
+                    ic(f"Giving up reconnecting after {attempt} attempts")
+                    metrics.incr('whatsapp.reconnect_gave_up')
+                    socketio.emit('connection_status', {'status': 'disconnected', 'reason': 'reconnect_failed'})
+                    return
+                
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                metrics.incr('whatsapp.reconnect_attempts')
+                metrics.set_gauge('whatsapp.reconnect_attempt', attempt)
+                ic(f"Reconnect attempt {attempt} in {delay:.1f}s")
+                
+                # whatsmeow may restore the socket on its own while we wait
+                try:
+                    await asyncio.wait_for(self._connected_event.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                
+                # Only restart the client once its connection task has ended,
+                # reusing the same NewAClient, session db and handlers
+                connect_task = getattr(self.client, 'connect_task', None)
+                if connect_task is None or connect_task.done():
+                    try:
+                        await self.client.connect()
+                    except Exception as e:
+                        ic(f"Reconnect attempt {attempt} failed: {str(e)}")
+                        metrics.incr('whatsapp.reconnect_failures')
+        finally:
+            self.reconnecting = False
+            metrics.set_gauge('whatsapp.reconnect_attempt', 0)
+    
     def _connect(self):
         """Connect to WhatsApp in background thread"""
         try:
@@ -134,6 +382,8 @@ class WhatsAppClient:
             socketio.emit('connection_status', {'status': 'connecting'})
             
             # Run the connection with eventlet
+            import eventlet
+            
             def run_async():
                 try:
                     # Create new event loop for this thread
@@ -165,100 +415,224 @@ class WhatsAppClient:
                 {'id': c.id, 'name': c.name, 'number': c.number} 
                 for c in contacts
             ]
-            socketio.emit('contacts_updated', {'contacts': self.contacts})
+            emit_large('contacts_updated', {'contacts': self.contacts})
             ic(f"Contacts loaded: {len(self.contacts)}")
             
-            # Get all groups
+            # Get all groups, keeping their participants in the group cache
             groups = await self.client.get_joined_groups()
-            self.groups = [
-                {'id': g.JID.id, 'name': g.GroupName.Name, 'participants': len(g.Participants)} 
-                for g in groups
-            ]
-            socketio.emit('groups_updated', {'groups': self.groups})
+            cache = group_cache.get_group_cache()
+            for g in groups:
+                self._cache_group(g)
+            cache.retain([jid_to_str(g.JID) for g in groups])
+            self.groups = cache.summaries()
+            emit_large('groups_updated', {'groups': self.groups})
             ic(f"Groups loaded: {len(self.groups)}")
             
         except Exception as e:
             ic(f"Error loading contacts and groups: {str(e)}")
             socketio.emit('error', {'message': str(e)})
     
-    def _process_message(self, message):
-        """Process incoming messages and emit to frontend"""
+    def _cache_group(self, group_info):
+        """Store a neonize GroupInfo in the group cache"""
+        participants = {}
+        for participant in group_info.Participants:
+            if participant.IsSuperAdmin:
+                role = group_cache.SUPERADMIN
+            elif participant.IsAdmin:
+                role = group_cache.ADMIN
+            else:
+                role = group_cache.MEMBER
+            participants[jid_to_str(participant.JID)] = role
+        group_cache.get_group_cache().replace(
+            jid_to_str(group_info.JID),
+            group_info.GroupName.Name,
+            participants,
+            group_info.ParticipantVersionID or None,
+        )
+    
+    def _groups_changed(self):
+        """Refresh the group list sent to the frontend from the cache"""
+        self.groups = group_cache.get_group_cache().summaries()
+        emit_large('groups_updated', {'groups': self.groups})
+    
+    async def _revalidate_groups(self):
+        """Periodically re-fetch groups that are past their TTL or missed an update"""
+        from neonize.utils.jid import build_jid
+        
+        cache = group_cache.get_group_cache()
+        while self.connected:
+            await asyncio.sleep(Config.GROUP_CACHE_REVALIDATE_INTERVAL)
+            stale = cache.stale()
+            for group_id in stale:
+                if not self.connected:
+                    break
+                user, _, server = group_id.partition('@')
+                try:
+                    self._cache_group(await self.client.get_group_info(build_jid(user, server or 'g.us')))
+                    metrics.incr('group_cache.revalidations')
+                except Exception as e:
+                    metrics.incr('group_cache.revalidation_errors')
+                    ic(f"Error revalidating group {group_id}: {str(e)}")
+                    if cache.get(group_id) is None:
+                        # Only known from an event (e.g. a group we already left): stop retrying
+                        cache.remove(group_id)
+            if stale:
+                self._groups_changed()
+    
+    async def _ingest_message(self, message):
+        """Normalize a message and queue it in the live or history lane"""
+        # Add to message history
+        self.message_history.append(message)
+        
+        # Limit message history size
+        if len(self.message_history) > 100:
+            self.message_history = self.message_history[-100:]
+        
+        # Anything older than INGEST_LIVE_MAX_AGE is backlog (history sync, offline catch-up)
+        message_data = message_to_dict(message)
+        age = time.time() - message_data['timestamp']
+        lane = 'history' if age > Config.INGEST_LIVE_MAX_AGE else 'live'
+        await self.ingest.put(message_data, lane)
+    
+    def _process_messages(self, lane, messages):
+        """Archive, publish and emit a batch of messages from one ingest lane"""
         try:
-            ic(f"Processing message: {message.Info.ID}")
-            # Add to message history
-            self.message_history.append(message)
-            
-            # Limit message history size
-            if len(self.message_history) > 100:
-                self.message_history = self.message_history[-100:]
-            
-            # Convert message to dictionary for frontend
-            message_data = {
-                'id': message.Info.ID,
-                'chat_id': message.Info.MessageSource.Chat.id,
-                'sender': message.Info.MessageSource.Sender.name if message.Info.MessageSource.Sender else 'Unknown',
-                'sender_id': message.Info.MessageSource.Sender.id if message.Info.MessageSource.Sender else None,
-                'text': message.Message.conversation if message.Message.conversation else '',
-                'timestamp': message.Info.Timestamp,
-                'is_group': message.Info.MessageSource.IsGroup,
-                'group_name': message.Info.MessageSource.Chat.name if message.Info.MessageSource.IsGroup else None,
-                'type': message.Info.Type,
-                'is_outgoing': message.Info.MessageSource.IsFromMe
-            }
+            get_message_store().add_many(messages)
+            for message_data in messages:
+                publish_event('message', message_data)
+                
+                # Skip serialization entirely when no browser watches this chat
+                rooms = subscriptions.rooms_for(message_data['chat_id'])
+                if rooms:
+                    socketio.emit('new_message', message_data, to=rooms)
             
-            # Emit message to connected clients
-            socketio.emit('new_message', message_data)
-            ic(f"Message processed and emitted: {message.Info.ID}")
+            # Automation only reacts to live traffic, never to replayed history
+            if lane == 'live':
+                from ..models.automation import AutomationManager
+                
+                AutomationManager().process_messages(messages)
+            ic(f"Processed {len(messages)} {lane} messages")
             
         except Exception as e:
-            ic(f"Error processing message: {str(e)}")
+            ic(f"Error processing messages: {str(e)}")
             socketio.emit('error', {'message': str(e)})
     
-    async def send_message_async(self, recipient_id, message_text):
+    def _emit_status_updates(self, changes):
+        """Push delivery state changes to the browsers watching the affected chats"""
+        by_chat = {}
+        for change in changes:
+            by_chat.setdefault(change['chat_id'], []).append(change)
+        for chat_id, updates in by_chat.items():
+            publish_event('message_status', {'chat_id': chat_id, 'updates': updates})
+            rooms = subscriptions.rooms_for(chat_id)
+            if rooms:
+                socketio.emit('message_status', {'updates': updates}, to=rooms)
+    
+    async def send_message_async(self, recipient_id, message_text, campaign=None):
         """Send a message to a specific recipient using async"""
+        try:
+            return await self._send(recipient_id, message_text, campaign)
+        except SendOutcomeUnknown as e:
+            socketio.emit('error', {'message': str(e)})
+            return False, str(e)
+    
+    async def _send(self, recipient_id, message_text, campaign=None):
+        """Send a message, returning (success, message) when the outcome is known.
+        
+        Raises SendOutcomeUnknown if the send itself failed, since WhatsApp may
+        have received the message anyway.
+        """
         if not self.client or not self.connected:
             return False, "Not connected to WhatsApp"
         
         try:
-            # Create JID for recipient
+            # Create JID for recipient (a bare number or a full JID)
             from neonize.utils.jid import build_jid
-            recipient_jid = build_jid(recipient_id, "s.whatsapp.net")
-            
-            # Send message
+            user, _, server = recipient_id.partition('@')
+            recipient_jid = build_jid(user, server or "s.whatsapp.net")
+            # Browsers subscribe by full JID, so receipts and the echo are keyed by it
+            chat_id = jid_to_str(recipient_jid)
+        except Exception as e:
+            return False, str(e)
+        
+        try:
             response = await self.client.send_message(recipient_jid, message_text)
+        except Exception as e:
+            raise SendOutcomeUnknown(str(e) or type(e).__name__) from e
+        
+        try:
+            delivery.get_delivery_tracker().track(response.ID, chat_id, campaign)
             
-            # Emit sent message to frontend
-            socketio.emit('new_message', {
-                'to': recipient_id,
-                'content': message_text,
-                'type': 'sent',
-                'id': response.ID
-            })
+            # Archived and echoed like a received message, so it stays in the chat's history
+            is_group = recipient_jid.Server == 'g.us'
+            sent = {
+                'id': response.ID,
+                'chat_id': chat_id,
+                'sender': 'Me',
+                'sender_id': None,
+                'text': message_text,
+                'timestamp': int(time.time()),
+                'is_group': is_group,
+                'group_name': group_cache.get_group_cache().name(chat_id) if is_group else None,
+                'type': 'text',
+                'media_type': 'text',
+                'is_outgoing': True,
+            }
+            get_message_store().add(sent)
             
-            return True, "Message sent successfully"
+            # Emit sent message to frontend
+            rooms = subscriptions.rooms_for(chat_id)
+            if rooms:
+                socketio.emit('new_message', dict(sent, status='sent'), to=rooms)
         except Exception as e:
-            socketio.emit('error', {'message': str(e)})
-            return False, str(e)
+            # The message went out; only the bookkeeping failed
+            ic(f"Error recording sent message: {str(e)}")
+        return True, "Message sent successfully"
     
-    def send_message(self, recipient_id, message_text):
-        """Synchronous wrapper for sending messages"""
+    def _run_on_client_loop(self, coroutine, timeout):
+        """Run a client coroutine on the client's own loop from another thread and wait for it"""
+        loop = self.loop
+        if loop is None or not loop.is_running():
+            coroutine.close()
+            raise RuntimeError("Not connected to WhatsApp")
+        try:
+            on_client_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_client_loop = False
+        if on_client_loop:
+            coroutine.close()
+            raise RuntimeError("Can't block the client's event loop; await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
         try:
-            if not self.loop:
-                self.loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self.loop)
-            success, message = self.loop.run_until_complete(self.send_message_async(recipient_id, message_text))
-            return success, message
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+    
+    def send_message(self, recipient_id, message_text, campaign=None):
+        """Synchronous wrapper for sending messages, for threads other than the client's loop
+        
+        Returns (success, message) when the send is known to have succeeded or
+        failed, and raises SendOutcomeUnknown when it may have gone out (the
+        send failed or timed out after it was handed to WhatsApp).
+        """
+        try:
+            return self._run_on_client_loop(
+                self._send(recipient_id, message_text, campaign), Config.NEONIZE_SEND_TIMEOUT
+            )
+        except SendOutcomeUnknown:
+            raise
+        except concurrent.futures.TimeoutError as e:
+            raise SendOutcomeUnknown(f"No answer from WhatsApp within {Config.NEONIZE_SEND_TIMEOUT}s") from e
         except Exception as e:
-            return False, str(e)
+            return False, str(e) or type(e).__name__
     
     def disconnect(self):
         """Disconnect from WhatsApp"""
         if self.client:
             try:
-                if not self.loop:
-                    self.loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(self.loop)
-                self.loop.run_until_complete(self.client.disconnect())
+                self._manual_disconnect = True
+                self._run_on_client_loop(self.client.disconnect(), Config.NEONIZE_SEND_TIMEOUT)
                 self.connected = False
                 socketio.emit('connection_status', {'status': 'disconnected'})
                 return True, "Disconnected successfully"
@@ -272,4 +646,14 @@ class WhatsAppClient:
     
     def get_groups(self):
         """Get all groups"""
-        return self.groups
\ No newline at end of file
+        return self.groups
+
+
+def get_whatsapp_client():
+    """Shared WhatsAppClient, constructed on first use"""
+    global _whatsapp_client
+    if _whatsapp_client is None:
+        with _whatsapp_client_lock:
+            if _whatsapp_client is None:
+                _whatsapp_client = WhatsAppClient(Config.NEONIZE_SESSION_DIR)
+    return _whatsapp_client
\ No newline at end of file
@@ -0,0 +1,360 @@
+import bisect
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+from ..config import Config
+from ..utils.metrics import metrics
+
+# Sparse index granularity: remember the byte position of every Nth record
+_INDEX_INTERVAL = 1024
+
+
+class SegmentLog:
+    """Append-only JSONL event log split into size-bounded segments.
+
+    Each segment is named after the offset of its first record, so a reader
+    can locate any offset with a binary search over file names and a sparse
+    in-memory index of byte positions.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_segments=16):
+        self.directory = os.path.abspath(directory)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._bases = sorted(
+            int(name[:-len('.jsonl')]) for name in os.listdir(self.directory) if name.endswith('.jsonl')
+        )
+        self._indexes = {}  # segment base -> [(offset, byte position), ...]
+        self._file = None
+        if not self._bases:
+            self._bases.append(0)
+        self.next_offset = self._bases[-1] + self._scan(self._bases[-1])
+        self._open_active()
+
+    def _path(self, base):
+        return os.path.join(self.directory, f'{base:020d}.jsonl')
+
+    def _scan(self, base):
+        """Index a segment from disk, returns its record count"""
+        index = []
+        count = 0
+        position = 0
+        path = self._path(base)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn write from a crash, truncated below
+                    if count % _INDEX_INTERVAL == 0:
+                        index.append((base + count, position))
+                    count += 1
+                    position += len(line)
+            if position != os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(position)
+        self._indexes[base] = index
+        return count
+
+    def _open_active(self):
+        self._file = open(self._path(self._bases[-1]), 'ab')
+
+    def _roll(self):
+        self._file.close()
+        self._bases.append(self.next_offset)
+        self._indexes[self.next_offset] = []
+        self._open_active()
+        while len(self._bases) > self.max_segments:
+            base = self._bases.pop(0)
+            self._indexes.pop(base, None)
+            try:
+                os.remove(self._path(base))
+            except OSError:
+                pass
+
+    def append(self, events):
+        """Assign offsets to event dicts, append them and return them"""
+        with self._lock:
+            if self._file.tell() >= self.segment_bytes:
+                self._roll()
+            index = self._indexes[self._bases[-1]]
+            position = self._file.tell()
+            lines = []
+            for event in events:
+                event['offset'] = self.next_offset
+                line = (json.dumps(event, separators=(',', ':')) + '\n').encode('utf-8')
+                if (self.next_offset - self._bases[-1]) % _INDEX_INTERVAL == 0:
+                    index.append((self.next_offset, position))
+                position += len(line)
+                lines.append(line)
+                self.next_offset += 1
+            self._file.write(b''.join(lines))
+            self._file.flush()
+        return events
+
+    def read(self, offset, limit=1000):
+        """Up to limit events starting at offset (clamped to the oldest retained)"""
+        with self._lock:
+            self._file.flush()
+            offset = max(offset, self._bases[0])
+            if offset >= self.next_offset:
+                return []
+            base = self._bases[bisect.bisect_right(self._bases, offset) - 1]
+            index = self._indexes.get(base)
+            if index is None:
+                self._scan(base)
+                index = self._indexes[base]
+            entry = index[bisect.bisect_right(index, (offset, float('inf'))) - 1] if index else (base, 0)
+            path = self._path(base)
+
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # Deleted by retention since the lookup: carry on from the next retained segment
+            with self._lock:
+                later = [retained for retained in self._bases if retained > base]
+            return self.read(max(offset, later[0]), limit) if later else []
+
+        events = []
+        with f:
+            f.seek(entry[1])
+            current = entry[0]
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if current >= offset:
+                    events.append(json.loads(line))
+                    if len(events) >= limit:
+                        break
+                current += 1
+        if len(events) < limit and events and events[-1]['offset'] + 1 < self.next_offset:
+            # Continue into the next segment
+            events.extend(self.read(events[-1]['offset'] + 1, limit - len(events)))
+        return events
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class UnixSocketStream:
+    """Streams events as JSON lines to consumers on a Unix socket.
+
+    A consumer may first send a line with the offset to resume from; the
+    backlog is replayed from the segment log before live events. Consumers
+    that fall more than ``buffer_size`` events behind are disconnected
+    rather than allowed to block the exporter.
+    """
+
+    def __init__(self, path, log=None, buffer_size=10000):
+        self.path = os.path.abspath(path)
+        self.log = log
+        self.buffer_size = buffer_size
+        self._consumers = []
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        threading.Thread(target=self._accept_loop, name='event-stream', daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        consumer = {'buffer': deque(), 'ready': threading.Event(), 'closed': False}
+        with self._lock:
+            # Registered before the backlog replay so no live event is missed
+            self._consumers.append(consumer)
+        try:
+            conn.settimeout(0.5)
+            resume_from = None
+            try:
+                line = conn.makefile('rb').readline()
+                if line.strip():
+                    resume_from = int(line)
+            except (socket.timeout, ValueError):
+                pass
+            conn.settimeout(None)
+
+            last_sent = -1
+            if resume_from is not None and self.log is not None:
+                offset = resume_from
+                while True:
+                    backlog = self.log.read(offset, 1000)
+                    if not backlog:
+                        break
+                    conn.sendall(b''.join(_encode(event) for event in backlog))
+                    last_sent = backlog[-1]['offset']
+                    offset = last_sent + 1
+
+            while not consumer['closed']:
+                consumer['ready'].wait(1.0)
+                consumer['ready'].clear()
+                chunk = []
+                while consumer['buffer']:
+                    event = consumer['buffer'].popleft()
+                    # Skip live events already sent as part of the backlog
+                    if event['offset'] > last_sent:
+                        chunk.append(_encode(event))
+                        last_sent = event['offset']
+                if chunk:
+                    conn.sendall(b''.join(chunk))
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._consumers.remove(consumer)
+            conn.close()
+
+    def publish(self, events):
+        with self._lock:
+            consumers = list(self._consumers)
+        for consumer in consumers:
+            if len(consumer['buffer']) + len(events) > self.buffer_size:
+                consumer['closed'] = True
+                metrics.incr('events.stream_consumers_dropped')
+                continue
+            consumer['buffer'].extend(events)
+            consumer['ready'].set()
+
+    def close(self):
+        self._server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _encode(event):
+    return (json.dumps(event, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class EventExporter:
+    """Publishes normalized client events to the configured sinks.
+
+    publish() never blocks: events go into a bounded buffer drained by a
+    background thread, and events that don't fit are dropped and counted.
+    """
+
+    def __init__(self, sinks, log_dir=None, socket_path=None, http_url=None, buffer_size=10000,
+                 segment_bytes=64 * 1024 * 1024, max_segments=16, http_batch_size=100):
+        self.sinks = set(sinks)
+        self.dropped = 0
+        self._buffer = queue.Queue(buffer_size)
+        self._sequence = 0
+        self.log = SegmentLog(log_dir, segment_bytes, max_segments) if 'jsonl' in self.sinks else None
+        self.stream = UnixSocketStream(socket_path, self.log, buffer_size) if 'unix' in self.sinks else None
+        self.http_url = http_url if 'http' in self.sinks else None
+        self.http_batch_size = http_batch_size
+        self._thread = threading.Thread(target=self._drain, name='event-exporter', daemon=True)
+        self._thread.start()
+
+    def publish(self, event_type, data):
+        """Queue an event for export without blocking"""
+        try:
+            self._buffer.put_nowait({'type': event_type, 'ts': time.time(), 'data': data})
+        except queue.Full:
+            self.dropped += 1
+            metrics.incr('events.dropped')
+
+    def _drain(self):
+        while True:
+            events = [self._buffer.get()]
+            try:
+                while len(events) < 500:
+                    events.append(self._buffer.get_nowait())
+            except queue.Empty:
+                pass
+            metrics.set_gauge('events.buffer_depth', self._buffer.qsize())
+            if self._export(events):
+                metrics.incr('events.published', len(events))
+
+    def _drop(self, events, sink, error):
+        """Count events a sink failed to take; they are not retried"""
+        self.dropped += len(events)
+        metrics.incr('events.dropped', len(events))
+        metrics.incr(f'events.dropped.{sink}', len(events))
+        metrics.incr('events.export_errors')
+        print(f"Error exporting events to {sink}: {error}")
+
+    def _export(self, events):
+        """Hand a batch to every sink, returns False if any sink dropped it"""
+        try:
+            if self.log is not None:
+                self.log.append(events)
+            else:
+                for event in events:
+                    event['offset'] = self._sequence
+                    self._sequence += 1
+        except Exception as e:
+            # Without offsets the batch can't go anywhere else either
+            self._drop(events, 'jsonl', e)
+            return False
+
+        exported = True
+        if self.stream is not None:
+            try:
+                self.stream.publish(events)
+            except Exception as e:
+                self._drop(events, 'unix', e)
+                exported = False
+
+        if self.http_url:
+            from .automation import get_webhook_dispatcher
+
+            try:
+                dispatcher = get_webhook_dispatcher()
+                for event in events:
+                    dispatcher.enqueue(self.http_url, event, batch_size=self.http_batch_size, batch_interval=1.0)
+            except Exception as e:
+                self._drop(events, 'http', e)
+                exported = False
+        return exported
+
+    @property
+    def next_offset(self):
+        return self.log.next_offset if self.log is not None else self._sequence
+
+
+_event_exporter = None
+_event_exporter_lock = threading.Lock()
+
+
+def get_event_exporter():
+    """Shared EventExporter, or None when EVENT_EXPORT_SINKS is empty"""
+    global _event_exporter
+    sinks = [sink.strip() for sink in Config.EVENT_EXPORT_SINKS.split(',') if sink.strip()]
+    if not sinks:
+        return None
+    if _event_exporter is None:
+        with _event_exporter_lock:
+            if _event_exporter is None:
+                _event_exporter = EventExporter(
+                    sinks,
+                    log_dir=Config.EVENT_EXPORT_DIR,
+                    socket_path=Config.EVENT_EXPORT_SOCKET,
+                    http_url=Config.EVENT_EXPORT_HTTP_URL,
+                    buffer_size=Config.EVENT_EXPORT_BUFFER,
+                    segment_bytes=Config.EVENT_EXPORT_SEGMENT_BYTES,
+                    max_segments=Config.EVENT_EXPORT_MAX_SEGMENTS,
+                )
+    return _event_exporter
+
+
+def publish_event(event_type, data):
+    """Publish a normalized client event if event export is enabled"""
+    exporter = get_event_exporter()
+    if exporter is not None:
+        exporter.publish(event_type, data)
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from ..utils.metrics import metrics
+
+# Lanes in priority order: a lane is only drained while all lanes before it are empty
+LANES = ('live', 'history')
+
+
+class IngestPipeline:
+    """Bounded, prioritized hand-off from the client's event handlers to message processing.
+
+    Each lane is a bounded queue drained by one worker thread in batches of
+    at most ``batch_size``, always from the highest priority non-empty lane.
+    A history flood therefore delays a live message by at most one history
+    batch. Producers wait (without blocking the event loop) while their lane
+    is full, which pushes back on the event source instead of growing memory.
+
+    ``handler(lane, items)`` is called from the worker thread.
+    """
+
+    def __init__(self, handler, capacity=10000, batch_size=200, lanes=LANES):
+        self.handler = handler
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.lanes = lanes
+        self._queues = {lane: deque() for lane in lanes}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='message-ingest', daemon=True)
+                    self._thread.start()
+
+    def offer(self, item, lane):
+        """Queue an item without waiting, returns False if the lane is full"""
+        self._ensure_worker()
+        with self._cond:
+            queue = self._queues[lane]
+            if len(queue) >= self.capacity:
+                return False
+            queue.append((time.monotonic(), item))
+            self._cond.notify()
+        return True
+
+    async def put(self, item, lane):
+        """Queue an item, yielding to the event loop while the lane is full"""
+        if self.offer(item, lane):
+            return
+        metrics.incr(f'ingest.backpressure.{lane}')
+        while not self.offer(item, lane):
+            await asyncio.sleep(0.005)
+
+    def depths(self):
+        """Current number of queued items per lane"""
+        with self._cond:
+            return {lane: len(queue) for lane, queue in self._queues.items()}
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                for lane in self.lanes:
+                    queue = self._queues[lane]
+                    if queue:
+                        batch = [queue.popleft() for _ in range(min(len(queue), self.batch_size))]
+                        for name, pending in self._queues.items():
+                            metrics.set_gauge(f'ingest.queue_depth.{name}', len(pending))
+                        return lane, batch
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            lane, batch = self._next_batch()
+            try:
+                self.handler(lane, [item for _, item in batch])
+            except Exception as e:
+                metrics.incr(f'ingest.errors.{lane}')
+                print(f"Error processing {lane} messages: {e}")
+            now = time.monotonic()
+            metrics.incr(f'ingest.processed.{lane}', len(batch))
+            # Lag of the oldest item in the batch: queued until processing finished
+            metrics.observe(f'ingest.lag_seconds.{lane}', now - batch[0][0])
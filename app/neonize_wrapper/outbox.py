@@ -0,0 +1,282 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from ..utils.metrics import metrics
+
+# Outbox entry states
+PENDING, STARTED, DONE, FAILED, AMBIGUOUS = 0, 1, 2, 3, 4
+STATE_NAMES = {PENDING: 'pending', STARTED: 'started', DONE: 'done', FAILED: 'failed', AMBIGUOUS: 'ambiguous'}
+
+# Action types that are safe to run again if a crash left them half done
+IDEMPOTENT_ACTIONS = frozenset(('webhook', 'log'))
+
+
+class DeferAction(Exception):
+    """Raised by an outbox executor to try an entry again later without using up an attempt"""
+
+
+class AmbiguousAction(Exception):
+    """Raised by an outbox executor when the action may or may not have taken effect"""
+
+
+_OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS action_outbox (
+    seq INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    rule_id TEXT,
+    action TEXT NOT NULL,
+    message TEXT NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS action_outbox_state ON action_outbox (state, seq);
+"""
+
+
+class ActionOutbox:
+    """Transactional outbox for automation actions (SQLite, WAL).
+
+    Matched actions are committed here before anything is executed, keyed
+    by ``<message id>:<rule id>:<action index>`` so a message that is
+    processed twice cannot queue its actions twice. A drain thread executes
+    entries in groups of ``batch_size``; one transaction records the results
+    of a group and marks the next group as started, so the cost is one
+    commit per group.
+
+    On start-up, entries that were never started simply resume. Entries left
+    ``started`` by a crash may or may not have run: idempotent actions are
+    run again, and the others (WhatsApp sends, which can't be deduplicated)
+    are parked as ``ambiguous`` for an operator to retry or drop.
+
+    ``execute(key, rule_id, action, message)`` raises to report a failure;
+    failed entries are retried with backoff up to ``max_attempts``. It
+    raises ``DeferAction`` instead when the action can't run yet (e.g. while
+    WhatsApp is reconnecting): the entry is retried every ``defer_delay``
+    seconds and no attempt is counted, however long the outage lasts. It
+    raises ``AmbiguousAction`` when the action may have happened anyway (a
+    send that timed out): the entry is parked as ``ambiguous``, as after a
+    crash, since running it again could send it twice.
+    """
+
+    def __init__(self, db_path, execute, batch_size=100, max_attempts=5, retry_base_delay=2.0,
+                 retention=7 * 24 * 3600, defer_delay=5.0):
+        self.db_path = os.path.abspath(db_path)
+        self.execute = execute
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retention = retention
+        self.defer_delay = defer_delay
+        self.poll_interval = 1.0
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_OUTBOX_SCHEMA)
+        self._recover()
+
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._groups = 0
+
+    def _recover(self):
+        """Resolve entries a previous process started but never finished"""
+        with self._db_lock, self._conn:
+            rows = self._conn.execute(
+                'SELECT seq, action FROM action_outbox WHERE state = ?', (STARTED,)
+            ).fetchall()
+            updates = []
+            now = time.time()
+            for seq, action in rows:
+                state = PENDING if json.loads(action).get('type') in IDEMPOTENT_ACTIONS else AMBIGUOUS
+                updates.append((state, now, seq))
+            self._conn.executemany('UPDATE action_outbox SET state = ?, updated_at = ? WHERE seq = ?', updates)
+        if updates:
+            ambiguous = sum(1 for state, _, _ in updates if state == AMBIGUOUS)
+            metrics.incr('outbox.recovered', len(updates) - ambiguous)
+            metrics.incr('outbox.ambiguous', ambiguous)
+
+    # Producer side (any thread)
+
+    def add(self, entries):
+        """Commit (key, rule_id, action, message) entries in one transaction.
+
+        Returns the number of new entries; keys already in the outbox are ignored.
+        """
+        if not entries:
+            return 0
+        now = time.time()
+        rows = [
+            (key, rule_id, json.dumps(action), json.dumps(message), now, now)
+            for key, rule_id, action, message in entries
+        ]
+        with self._db_lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO action_outbox (key, rule_id, action, message, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            added = self._conn.total_changes - before
+        metrics.incr('outbox.enqueued', added)
+        if added < len(rows):
+            metrics.incr('outbox.duplicates', len(rows) - added)
+        self.start()
+        self._wakeup.set()
+        return added
+
+    def apply_once(self, key, rule_id, action, message, apply):
+        """Run ``apply()`` now, unless an entry with this key was already recorded.
+
+        For actions that must take effect immediately rather than from the
+        drain. The entry is recorded as done in the transaction that runs
+        ``apply()``, so a redelivered message can't apply it a second time;
+        if ``apply()`` raises, nothing is recorded. Returns whether it ran.
+        """
+        now = time.time()
+        with self._db_lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO action_outbox (key, rule_id, action, message, state, attempts, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, 1, ?, ?)',
+                (key, rule_id, json.dumps(action), json.dumps(message), DONE, now, now),
+            )
+            if not cursor.rowcount:
+                metrics.incr('outbox.duplicates')
+                return False
+            apply()
+        metrics.incr('outbox.executed')
+        return True
+
+    # Drain
+
+    def start(self):
+        """Start the drain thread if it is not running yet"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='action-outbox', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        group = self._record([])
+        while True:
+            if not group:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                group = self._record([])
+                continue
+            results = [self._execute_entry(*row) for row in group]
+            group = self._record(results)
+
+    def _record(self, results):
+        """_finish_and_lease, retried until it commits so results of actions that ran aren't lost"""
+        while True:
+            try:
+                return self._finish_and_lease(results)
+            except sqlite3.Error as e:
+                print(f"Error updating action outbox: {e}")
+                metrics.incr('outbox.db_errors')
+                time.sleep(self.poll_interval)
+
+    def _execute_entry(self, seq, key, rule_id, action, message, attempts):
+        """Run one entry, returns the (state, attempts, next_attempt_at, error, seq) update"""
+        try:
+            self.execute(key, rule_id, json.loads(action), json.loads(message))
+            metrics.incr('outbox.executed')
+            return DONE, attempts + 1, 0, None, seq
+        except DeferAction as e:
+            metrics.incr('outbox.deferred')
+            return PENDING, attempts, time.time() + self.defer_delay, str(e), seq
+        except AmbiguousAction as e:
+            metrics.incr('outbox.ambiguous')
+            return AMBIGUOUS, attempts + 1, 0, str(e), seq
+        except Exception as e:
+            attempts += 1
+            metrics.incr('outbox.failures')
+            if attempts >= self.max_attempts:
+                return FAILED, attempts, 0, str(e), seq
+            delay = self.retry_base_delay * (2 ** (attempts - 1))
+            return PENDING, attempts, time.time() + random.uniform(delay / 2, delay), str(e), seq
+
+    def _finish_and_lease(self, results):
+        """Record a group's results and mark the next group started, in one transaction"""
+        now = time.time()
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                'UPDATE action_outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, '
+                'updated_at = ? WHERE seq = ?',
+                [(state, attempts, next_at, error, now, seq) for state, attempts, next_at, error, seq in results],
+            )
+            group = self._conn.execute(
+                'SELECT seq, key, rule_id, action, message, attempts FROM action_outbox '
+                'WHERE state = ? AND next_attempt_at <= ? ORDER BY seq LIMIT ?',
+                (PENDING, now, self.batch_size),
+            ).fetchall()
+            self._conn.executemany(
+                'UPDATE action_outbox SET state = ?, updated_at = ? WHERE seq = ?',
+                [(STARTED, now, row[0]) for row in group],
+            )
+            self._groups += 1
+            if self._groups % 1000 == 0:
+                # Completed entries only need to outlive any redelivery of their message
+                self._conn.execute(
+                    'DELETE FROM action_outbox WHERE state = ? AND updated_at < ?', (DONE, now - self.retention)
+                )
+        return group
+
+    # Inspection
+
+    def counts(self):
+        """Number of entries per state"""
+        with self._db_lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM action_outbox GROUP BY state').fetchall()
+        counts = {name: 0 for name in STATE_NAMES.values()}
+        counts.update({STATE_NAMES[state]: count for state, count in rows})
+        return counts
+
+    def entries(self, state, limit=100):
+        """Most recent entries in a state ('failed', 'ambiguous', ...)"""
+        state = {name: value for value, name in STATE_NAMES.items()}[state]
+        with self._db_lock:
+            rows = self._conn.execute(
+                'SELECT key, rule_id, action, message, attempts, last_error, created_at, updated_at '
+                'FROM action_outbox WHERE state = ? ORDER BY seq DESC LIMIT ?',
+                (state, limit),
+            ).fetchall()
+        return [
+            {
+                'key': row[0],
+                'rule_id': row[1],
+                'action': json.loads(row[2]),
+                'message': json.loads(row[3]),
+                'attempts': row[4],
+                'last_error': row[5],
+                'created_at': row[6],
+                'updated_at': row[7],
+            }
+            for row in rows
+        ]
+
+    def retry(self, key):
+        """Queue a failed or ambiguous entry again, returns False if there is none"""
+        with self._db_lock, self._conn:
+            cursor = self._conn.execute(
+                'UPDATE action_outbox SET state = ?, next_attempt_at = 0, updated_at = ? '
+                'WHERE key = ? AND state IN (?, ?)',
+                (PENDING, time.time(), key, FAILED, AMBIGUOUS),
+            )
+        if cursor.rowcount:
+            self.start()
+            self._wakeup.set()
+        return bool(cursor.rowcount)
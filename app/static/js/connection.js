@@ -1,5 +1,34 @@
+// Payload codecs this browser can decode, most compact first
+// (must match the codec names in app/utils/payloads.py)
+function supportedCodecs() {
+    const codecs = ['json'];
+    if (typeof DecompressionStream !== 'undefined') {
+        codecs.unshift('json+deflate');
+        if (window.MessagePack) {
+            codecs.unshift('msgpack+deflate');
+        }
+    }
+    return codecs;
+}
+
+// Decode a payload sent by emit_large on the server
+async function decodePayload(payload) {
+    if (!payload || !payload.codec || !payload.data) {
+        return payload;
+    }
+    
+    const stream = new Blob([payload.data]).stream().pipeThrough(new DecompressionStream('deflate'));
+    const raw = await new Response(stream).arrayBuffer();
+    
+    if (payload.codec === 'msgpack+deflate') {
+        return MessagePack.decode(new Uint8Array(raw));
+    }
+    return JSON.parse(new TextDecoder().decode(raw));
+}
+
 // Initialize Socket.IO connection with reconnection options
 const socket = io({
+    auth: { codecs: supportedCodecs() },
     transports: ['websocket'],
     reconnection: true,
     reconnectionAttempts: 5,
@@ -61,6 +90,11 @@ socket.on('connection_status', (data) => {
     updateConnectionStatus(data.status);
 });
 
+// Payload codec negotiated with the server
+socket.on('payload_codec', (data) => {
+    console.log('Payload codec:', data.codec);
+});
+
 // Test event handling
 socket.on('test_event', (data) => {
     console.log('Test event received:', data);
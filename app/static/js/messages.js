@@ -7,13 +7,53 @@ const groupsList = document.getElementById('groups-list');
 
 let selectedChat = null;
 
+// Only the visible part of the chat is rendered (see virtual_list.js)
+const messageList = new VirtualList(messageStream, renderMessage, { onNearTop: loadOlderMessages });
+let messagesById = new Map();
+let olderCursor = null;
+let loadingOlder = false;
+
 // Socket.IO message handling
 socket.on('new_message', (message) => {
     addMessageToStream(message);
 });
 
-// Add message to the message stream
+// Delivery receipts: sent -> delivered -> read
+const STATUS_MARKS = {sent: '\u2713', delivered: '\u2713\u2713', read: '\u2713\u2713'};
+
+function renderStatus(element, status) {
+    element.className = `message-status message-status-${status}`;
+    element.textContent = STATUS_MARKS[status] || '';
+    element.title = status;
+}
+
+socket.on('message_status', (data) => {
+    for (const update of data.updates) {
+        const message = messagesById.get(update.id);
+        if (message) {
+            message.status = update.status;
+            messageList.refresh(message);
+        }
+    }
+});
+
+// Add a live message to the bottom of the stream
 function addMessageToStream(message) {
+    if (message.id) {
+        if (messagesById.has(message.id)) return;
+        messagesById.set(message.id, message);
+    }
+    messageList.append([message]);
+}
+
+// Local time of a Unix timestamp in seconds (the server normalizes them); blank if missing
+function formatTime(timestamp) {
+    if (!timestamp) return '';
+    return new Date(timestamp * 1000).toLocaleTimeString();
+}
+
+// Build the DOM node of a single message
+function renderMessage(message) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${message.is_outgoing ? 'message-outgoing' : 'message-incoming'}`;
     
@@ -33,12 +73,17 @@ function addMessageToStream(message) {
     
     const time = document.createElement('div');
     time.className = 'message-time';
-    time.textContent = new Date(message.timestamp * 1000).toLocaleTimeString();
+    time.textContent = formatTime(message.timestamp);
     content.appendChild(time);
     
+    if (message.status) {
+        const status = document.createElement('span');
+        renderStatus(status, message.status);
+        time.appendChild(status);
+    }
+    
     messageDiv.appendChild(content);
-    messageStream.appendChild(messageDiv);
-    messageStream.scrollTop = messageStream.scrollHeight;
+    return messageDiv;
 }
 
 // Send message
@@ -78,21 +123,42 @@ messageText.addEventListener('keypress', (e) => {
     }
 });
 
+// Render the contacts list
+function renderContacts(contacts) {
+    const fragment = document.createDocumentFragment();
+    contacts.forEach(contact => {
+        const item = document.createElement('a');
+        item.href = '#';
+        item.className = 'list-group-item list-group-item-action';
+        item.textContent = contact.name || contact.number;
+        item.addEventListener('click', () => selectChat(contact.id));
+        fragment.appendChild(item);
+    });
+    contactsList.innerHTML = '';
+    contactsList.appendChild(fragment);
+}
+
+// Render the groups list
+function renderGroups(groups) {
+    const fragment = document.createDocumentFragment();
+    groups.forEach(group => {
+        const item = document.createElement('a');
+        item.href = '#';
+        item.className = 'list-group-item list-group-item-action';
+        item.textContent = group.name;
+        item.addEventListener('click', () => selectChat(group.id));
+        fragment.appendChild(item);
+    });
+    groupsList.innerHTML = '';
+    groupsList.appendChild(fragment);
+}
+
 // Load contacts
 async function loadContacts() {
     try {
         const response = await fetch('/api/contacts');
         const data = await response.json();
-        
-        contactsList.innerHTML = '';
-        data.contacts.forEach(contact => {
-            const item = document.createElement('a');
-            item.href = '#';
-            item.className = 'list-group-item list-group-item-action';
-            item.textContent = contact.name || contact.number;
-            item.addEventListener('click', () => selectChat(contact.id));
-            contactsList.appendChild(item);
-        });
+        renderContacts(data.contacts);
     } catch (error) {
         console.error('Load contacts error:', error);
     }
@@ -103,49 +169,107 @@ async function loadGroups() {
     try {
         const response = await fetch('/api/groups');
         const data = await response.json();
-        
-        groupsList.innerHTML = '';
-        data.groups.forEach(group => {
-            const item = document.createElement('a');
-            item.href = '#';
-            item.className = 'list-group-item list-group-item-action';
-            item.textContent = group.name;
-            item.addEventListener('click', () => selectChat(group.id));
-            groupsList.appendChild(item);
-        });
+        renderGroups(data.groups);
     } catch (error) {
         console.error('Load groups error:', error);
     }
 }
 
+// Contacts pushed by the server (possibly compressed, see decodePayload)
+socket.on('contacts_updated', async (payload) => {
+    try {
+        const data = await decodePayload(payload);
+        renderContacts(data.contacts);
+    } catch (error) {
+        console.error('Contacts update error:', error);
+    }
+});
+
+// Groups pushed by the server (possibly compressed, see decodePayload)
+socket.on('groups_updated', async (payload) => {
+    try {
+        const data = await decodePayload(payload);
+        renderGroups(data.groups);
+    } catch (error) {
+        console.error('Groups update error:', error);
+    }
+});
+
 // Select chat
 function selectChat(chatId) {
+    // Only receive live messages for the chat being viewed
+    if (selectedChat && selectedChat !== chatId) {
+        socket.emit('unsubscribe_chat', { chat_id: selectedChat });
+    }
+    socket.emit('subscribe_chat', { chat_id: chatId });
+    
     selectedChat = chatId;
-    messageStream.innerHTML = '';
+    messageList.clear();
+    messagesById = new Map();
+    olderCursor = null;
     loadMessages();
 }
 
-// Load messages
+// Rooms are lost when the socket reconnects, so subscribe again
+socket.on('connect', () => {
+    if (selectedChat) {
+        socket.emit('subscribe_chat', { chat_id: selectedChat });
+    }
+});
+
+// Messages of a page that are not already shown, remembered by ID
+function unseenMessages(messages) {
+    return messages.filter(message => {
+        if (messagesById.has(message.id)) return false;
+        messagesById.set(message.id, message);
+        return true;
+    });
+}
+
+// Fetch a page of the selected chat's archived history, newest first
+async function fetchMessagePage(before) {
+    const params = new URLSearchParams({ chat_id: selectedChat, limit: 100 });
+    if (before !== null) params.set('before', before);
+    const response = await fetch(`/api/messages?${params}`);
+    return response.json();
+}
+
+// Load the latest messages of the selected chat
 async function loadMessages() {
     if (!selectedChat) return;
+    const chatId = selectedChat;
     
     try {
-        const response = await fetch('/api/messages');
-        const data = await response.json();
-        
-        if (data.success) {
-            messageStream.innerHTML = '';
-            data.messages.forEach(message => {
-                if (message.chat_id === selectedChat) {
-                    addMessageToStream(message);
-                }
-            });
+        const data = await fetchMessagePage(null);
+        if (data.success && chatId === selectedChat) {
+            // Live messages may have arrived while the page was loading
+            messageList.prepend(unseenMessages(data.messages));
+            olderCursor = data.next_cursor;
         }
     } catch (error) {
         console.error('Load messages error:', error);
     }
 }
 
+// Load the previous page when the user scrolls near the top
+async function loadOlderMessages() {
+    if (!selectedChat || olderCursor === null || loadingOlder) return;
+    const chatId = selectedChat;
+    loadingOlder = true;
+    
+    try {
+        const data = await fetchMessagePage(olderCursor);
+        if (data.success && chatId === selectedChat) {
+            messageList.prepend(unseenMessages(data.messages));
+            olderCursor = data.next_cursor;
+        }
+    } catch (error) {
+        console.error('Load older messages error:', error);
+    } finally {
+        loadingOlder = false;
+    }
+}
+
 // Load initial data when connected
 socket.on('connection_status', (data) => {
     if (data.status === 'connected') {
@@ -0,0 +1,187 @@
+// Windowed list: only the rows in (or near) the viewport exist in the DOM.
+// Row heights are measured once when a row is first rendered; rows that
+// were never rendered use an estimate. All DOM work happens in one
+// requestAnimationFrame callback per frame, however many items arrive.
+class VirtualList {
+    constructor(container, renderItem, options = {}) {
+        this.container = container;
+        this.renderItem = renderItem;
+        this.estimatedHeight = options.estimatedHeight || 64;
+        this.overscan = options.overscan || 8;
+        this.onNearTop = options.onNearTop || null;
+
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'virtual-list-spacer';
+        container.appendChild(this.spacer);
+
+        this.frame = null;
+        this.clear();
+        container.addEventListener('scroll', () => this.onScroll(), { passive: true });
+        window.addEventListener('resize', () => this.schedule());
+    }
+
+    // Remove all items
+    clear() {
+        this.items = [];
+        this.heights = [];
+        this.offsets = [0];  // offsets[i] is the top of item i, offsets[n] the total height
+        this.validOffsets = 0;  // offsets up to this index are up to date
+        this.rows = new Map();  // item -> rendered row element
+        this.spacer.replaceChildren();
+        this.spacer.style.height = '0px';
+        // Scroll position is kept relative to an item so rows can be inserted above it
+        this.anchorIndex = 0;
+        this.anchorDelta = 0;
+        this.stickToBottom = true;
+        this.schedule();
+    }
+
+    // Add newer items at the bottom
+    append(items) {
+        for (const item of items) {
+            this.items.push(item);
+            this.heights.push(this.estimatedHeight);
+        }
+        this.schedule();
+    }
+
+    // Add older items at the top without moving what is on screen
+    prepend(items) {
+        if (!items.length) return;
+        this.items = items.concat(this.items);
+        this.heights = items.map(() => this.estimatedHeight).concat(this.heights);
+        this.validOffsets = 0;
+        this.anchorIndex += items.length;
+        this.schedule();
+    }
+
+    // Re-render an item after it changed (no-op when it is off screen)
+    refresh(item) {
+        const row = this.rows.get(item);
+        if (row) {
+            row.replaceChildren(this.renderItem(item));
+        }
+    }
+
+    schedule() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    updateOffsets() {
+        const count = this.items.length;
+        this.offsets.length = count + 1;
+        for (let i = this.validOffsets; i < count; i++) {
+            this.offsets[i + 1] = this.offsets[i] + this.heights[i];
+        }
+        this.validOffsets = count;
+    }
+
+    // Index of the item at a vertical offset (binary search over offsets)
+    indexAt(offset) {
+        let lo = 0;
+        let hi = Math.max(this.items.length - 1, 0);
+        while (lo < hi) {
+            const mid = (lo + hi + 1) >> 1;
+            if (this.offsets[mid] <= offset) {
+                lo = mid;
+            } else {
+                hi = mid - 1;
+            }
+        }
+        return lo;
+    }
+
+    onScroll() {
+        const container = this.container;
+        const top = container.scrollTop - this.spacer.offsetTop;
+        this.stickToBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 4;
+        if (this.items.length) {
+            this.anchorIndex = this.indexAt(top);
+            this.anchorDelta = top - this.offsets[this.anchorIndex];
+        }
+        if (top < container.clientHeight && this.onNearTop) {
+            this.onNearTop();
+        }
+        this.schedule();
+    }
+
+    // Size the spacer and restore the scroll position
+    positionViewport(spacerTop) {
+        const container = this.container;
+        const count = this.items.length;
+        this.spacer.style.height = `${this.offsets[count]}px`;
+        if (this.stickToBottom) {
+            container.scrollTop = container.scrollHeight;
+        } else if (count) {
+            const anchor = Math.min(this.anchorIndex, count - 1);
+            container.scrollTop = spacerTop + this.offsets[anchor] + this.anchorDelta;
+        }
+    }
+
+    placeRows(start, end) {
+        for (let i = start; i < end; i++) {
+            this.rows.get(this.items[i]).style.transform = `translateY(${this.offsets[i]}px)`;
+        }
+    }
+
+    render() {
+        const container = this.container;
+        const count = this.items.length;
+        const spacerTop = this.spacer.offsetTop;
+        this.updateOffsets();
+        this.positionViewport(spacerTop);
+
+        // Visible range plus some overscan on each side
+        const top = Math.max(container.scrollTop - spacerTop, 0);
+        let start = this.indexAt(top);
+        let end = start;
+        while (end < count && this.offsets[end] < top + container.clientHeight) {
+            end++;
+        }
+        start = Math.max(0, start - this.overscan);
+        end = Math.min(count, end + this.overscan);
+
+        // Writes: drop rows that left the window, create the ones that entered it
+        const visible = new Set(this.items.slice(start, end));
+        for (const [item, row] of this.rows) {
+            if (!visible.has(item)) {
+                row.remove();
+                this.rows.delete(item);
+            }
+        }
+        const created = [];
+        for (let i = start; i < end; i++) {
+            const item = this.items[i];
+            if (!this.rows.has(item)) {
+                const row = document.createElement('div');
+                row.className = 'virtual-list-row';
+                row.appendChild(this.renderItem(item));
+                this.rows.set(item, row);
+                this.spacer.appendChild(row);
+                created.push(i);
+            }
+        }
+        this.placeRows(start, end);
+
+        // Reads: measure the new rows in a single layout pass
+        let changed = false;
+        for (const i of created) {
+            const height = this.rows.get(this.items[i]).offsetHeight;
+            if (height !== this.heights[i]) {
+                this.heights[i] = height;
+                this.validOffsets = Math.min(this.validOffsets, i);
+                changed = true;
+            }
+        }
+        if (changed) {
+            this.updateOffsets();
+            this.placeRows(start, end);
+            this.positionViewport(spacerTop);
+        }
+    }
+}
@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over token sequences.
+
+    Phrases are tuples of tokens (words), so a single scan over a message's
+    tokens finds every phrase of every rule with whole-word semantics.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._size = 0
+        self._built = True
+
+    def __len__(self):
+        return self._size
+
+    def add(self, phrase, value):
+        """Register a phrase (tuple of tokens); value is reported when it occurs"""
+        if not phrase:
+            return
+        node = 0
+        for token in phrase:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(value)
+        self._size += 1
+        self._built = False
+
+    def build(self):
+        """Compute failure links; must be called after the last add()"""
+        queue = deque()
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            queue.append(node)
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                # Inherit matches of the longest proper suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def search(self, tokens):
+        """Values of every phrase occurring in tokens (with repeats)"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        node = 0
+        for token in tokens:
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if out[node]:
+                found.extend(out[node])
+        return found
@@ -0,0 +1,85 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Thread-safe in-process counters, gauges and timing summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def incr(self, name, value=1):
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Record a sample (usually seconds) in a timing summary"""
+        with self._lock:
+            summary = self._timings.get(name)
+            if summary is None:
+                self._timings[name] = {'count': 1, 'total': value, 'min': value, 'max': value}
+            else:
+                summary['count'] += 1
+                summary['total'] += value
+                summary['min'] = min(summary['min'], value)
+                summary['max'] = max(summary['max'], value)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the enclosed block and record it under name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name):
+        """Current value of a counter"""
+        return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Copy of all metrics, suitable for JSON serialization"""
+        with self._lock:
+            timings = {}
+            for name, summary in self._timings.items():
+                timings[name] = dict(summary, avg=summary['total'] / summary['count'])
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': timings,
+            }
+
+    def merge(self, snapshot):
+        """Add the counters and timings of another process's snapshot to these"""
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, other in snapshot['timings'].items():
+                summary = self._timings.get(name)
+                if summary is None:
+                    self._timings[name] = {key: other[key] for key in ('count', 'total', 'min', 'max')}
+                else:
+                    summary['count'] += other['count']
+                    summary['total'] += other['total']
+                    summary['min'] = min(summary['min'], other['min'])
+                    summary['max'] = max(summary['max'], other['max'])
+
+    def reset(self):
+        """Clear all metrics"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
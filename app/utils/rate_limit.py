@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SlidingWindowCounter:
+    """In-memory sliding-window rate limiter with bounded memory.
+
+    Each key keeps two fixed-window counts (previous and current) and the
+    request rate is estimated by weighting the previous window by how much of
+    it still overlaps the sliding window. Keys idle for two windows are
+    expired lazily, and the least recently used key is evicted once
+    ``max_keys`` is reached, so memory is O(max_keys) regardless of traffic.
+
+    A limit of 1 is treated as an exact cooldown (time since the last event),
+    since the weighted estimate would otherwise stretch it to up to 2 windows.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [window, window_start, previous_count, current_count, last_event]
+        self._entries = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _entry(self, key, window, now):
+        entry = self._entries.get(key)
+        if entry is None or now - entry[1] >= 2 * window:
+            # New or expired: start a fresh window
+            entry = [window, now, 0, 0, None]
+            self._entries[key] = entry
+            self._evict(now)
+        else:
+            self._entries.move_to_end(key)
+            if now - entry[1] >= window:
+                # Roll over into the next fixed window
+                entry[1] += window
+                entry[2], entry[3] = entry[3], 0
+        return entry
+
+    def _evict(self, now):
+        # Drop expired keys from the cold end first, then fall back to LRU
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[1] >= 2 * entry[0]:
+                del self._entries[key]
+            else:
+                break
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _allows(entry, limit, now):
+        window, window_start, previous, current, last_event = entry
+        if limit == 1:
+            return last_event is None or now - last_event >= window
+        overlap = 1.0 - (now - window_start) / window
+        return previous * max(overlap, 0.0) + current + 1 <= limit
+
+    def try_acquire(self, checks, now=None):
+        """Atomically count one event against every (key, limit, window) in checks.
+
+        Returns the first (key, limit, window) that would be exceeded without
+        counting anything, or None if the event is allowed and was counted.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entries = []
+            for key, limit, window in checks:
+                entry = self._entry(key, window, now)
+                if not self._allows(entry, limit, now):
+                    return key, limit, window
+                entries.append(entry)
+            for entry in entries:
+                entry[3] += 1
+                entry[4] = now
+        return None
+
+    def clear(self):
+        """Forget all keys"""
+        with self._lock:
+            self._entries.clear()
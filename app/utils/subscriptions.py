@@ -0,0 +1,85 @@
+import threading
+
+# Room joined by browsers that want every chat
+ALL_CHATS_ROOM = 'chat:*'
+
+
+def chat_room(chat_id):
+    """Socket.IO room for a single chat JID"""
+    return f'chat:{chat_id}'
+
+
+class ChatSubscriptions:
+    """Index of which browsers watch which chats.
+
+    Mirrors the Socket.IO room membership so the WhatsApp client can check
+    whether anyone is interested in a chat before serializing a message.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client_chats = {}  # sid -> set of chat ids
+        self._chat_counts = {}  # chat id -> number of subscribed sids
+        self._all_clients = set()
+
+    def subscribe(self, sid, chat_id):
+        """Subscribe a browser to a chat, returns False if already subscribed"""
+        with self._lock:
+            chats = self._client_chats.setdefault(sid, set())
+            if chat_id in chats:
+                return False
+            chats.add(chat_id)
+            self._chat_counts[chat_id] = self._chat_counts.get(chat_id, 0) + 1
+            return True
+
+    def unsubscribe(self, sid, chat_id):
+        """Unsubscribe a browser from a chat, returns False if not subscribed"""
+        with self._lock:
+            chats = self._client_chats.get(sid)
+            if not chats or chat_id not in chats:
+                return False
+            chats.discard(chat_id)
+            self._decrement(chat_id)
+            return True
+
+    def subscribe_all(self, sid, enabled=True):
+        """Toggle the firehose subscription for a browser"""
+        with self._lock:
+            if enabled:
+                self._all_clients.add(sid)
+            else:
+                self._all_clients.discard(sid)
+
+    def remove_client(self, sid):
+        """Drop every subscription held by a disconnected browser"""
+        with self._lock:
+            self._all_clients.discard(sid)
+            for chat_id in self._client_chats.pop(sid, ()):
+                self._decrement(chat_id)
+
+    def subscriber_count(self, chat_id):
+        """Number of browsers that would receive a message for this chat"""
+        return self._chat_counts.get(chat_id, 0) + len(self._all_clients)
+
+    def rooms_for(self, chat_id):
+        """Rooms a message for this chat must be emitted to (empty if none)"""
+        rooms = []
+        if self._chat_counts.get(chat_id):
+            rooms.append(chat_room(chat_id))
+        if self._all_clients:
+            rooms.append(ALL_CHATS_ROOM)
+        return rooms
+
+    def chats_for(self, sid):
+        """Chats a browser is subscribed to"""
+        return set(self._client_chats.get(sid, ()))
+
+    def _decrement(self, chat_id):
+        count = self._chat_counts.get(chat_id, 0) - 1
+        if count > 0:
+            self._chat_counts[chat_id] = count
+        else:
+            self._chat_counts.pop(chat_id, None)
+
+
+subscriptions = ChatSubscriptions()
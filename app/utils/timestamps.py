@@ -0,0 +1,5 @@
+def to_seconds(timestamp):
+    """Unix time in seconds of a message timestamp, which neonize gives in milliseconds"""
+    if timestamp and timestamp > 1e12:
+        return timestamp / 1000
+    return timestamp
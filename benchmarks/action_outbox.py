@@ -0,0 +1,99 @@
+"""Action outbox throughput and crash recovery.
+
+Usage: python benchmarks/action_outbox.py [--actions 50000] [--ingest-batch 200] [--batch-size 100]
+
+Actions are committed in ingest-sized batches (one transaction per batch,
+as AutomationManager does) while the drain thread runs them with a no-op
+executor, so the numbers are the outbox's own overhead. The target is 5k
+actions/s end to end. The recovery run then leaves a group ``started`` as
+a crash would and reopens the outbox: every action must run exactly once,
+except sends in the crashed group, which are parked as ambiguous.
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.neonize_wrapper.outbox import ActionOutbox  # noqa: E402
+
+TARGET = 5000
+
+
+def entries(start, count):
+    message = {'id': 'm', 'chat_id': '1@s.whatsapp.net', 'text': 'hello there', 'timestamp': 1700000000}
+    for n in range(start, start + count):
+        action = {'type': 'webhook', 'url': 'http://example.invalid'} if n % 2 else {'type': 'reply', 'text': 'hi'}
+        yield f'm{n}:rule:0', 'rule', action, dict(message, id=f'm{n}')
+
+
+def throughput(args):
+    executed = []
+    done = threading.Event()
+
+    def execute(key, rule_id, action, message):
+        executed.append(key)
+        if len(executed) >= args.actions:
+            done.set()
+
+    outbox = ActionOutbox(os.path.join(tempfile.mkdtemp(), 'outbox.sqlite3'), execute, batch_size=args.batch_size)
+    start = time.perf_counter()
+    for n in range(0, args.actions, args.ingest_batch):
+        outbox.add(list(entries(n, min(args.ingest_batch, args.actions - n))))
+    enqueued = time.perf_counter() - start
+    done.wait()
+    drained = time.perf_counter() - start
+
+    # Redelivered messages must not queue their actions again
+    duplicates = outbox.add(list(entries(0, args.ingest_batch)))
+    rate = args.actions / drained
+    print(f'enqueue: {args.actions / enqueued:9.0f} actions/s')
+    print(f'end to end: {rate:9.0f} actions/s  ({"meets" if rate >= TARGET else "misses"} the {TARGET}/s target)')
+    print(f'redelivered batch queued {duplicates} duplicate actions, {len(executed)} executions in total')
+
+
+def recovery(args):
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.sqlite3')
+    runs = collections.Counter()
+
+    def execute(key, rule_id, action, message):
+        runs[key] += 1
+
+    # Crash: a group is leased and half of it has run when the process dies
+    crashed = ActionOutbox(path, execute, batch_size=args.batch_size)
+    crashed._thread = threading.current_thread()  # no drain thread, the group is run by hand
+    crashed.add(list(entries(0, args.batch_size * 3)))
+    group = crashed._finish_and_lease([])
+    for row in group[:len(group) // 2]:
+        crashed._execute_entry(*row)
+    print(f'crashed with {len(group)} actions started, {len(runs)} of them run')
+
+    reopened = ActionOutbox(path, execute, batch_size=args.batch_size)
+    reopened.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        counts = reopened.counts()
+        if not counts['pending'] and not counts['started']:
+            break
+        time.sleep(0.01)
+    print(f'after restart: {counts}')
+    print(f'actions run more than once: {sum(1 for count in runs.values() if count > 1)} (webhooks only, '
+          f'delivered with their Idempotency-Key); never run: {args.batch_size * 3 - len(runs)}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actions', type=int, default=50000)
+    parser.add_argument('--ingest-batch', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+    throughput(args)
+    recovery(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Automation throughput in-process vs. sharded over worker processes.
+
+Usage: python benchmarks/automation_workers.py [--rules 300] [--messages 20000] [--workers 1,2,4,8]
+
+The rule set is deliberately regex heavy (unanchored message_text rules
+can't be indexed by the RuleEngine), which is the case worker processes
+are meant for. Throughput can only scale up to the number of CPU cores.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.automation import AutomationRule  # noqa: E402
+from app.models.automation_workers import AutomationWorkerPool  # noqa: E402
+from app.models.rule_engine import RuleEngine  # noqa: E402
+
+
+def make_vocabulary(rng, size=2000):
+    return [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(size)]
+
+
+def make_rules(count, rng, vocabulary):
+    return [
+        AutomationRule(
+            str(i), f'regex{i}', 'message_text',
+            rf'\b{rng.choice(vocabulary)}\w*\s+(?:\w+\s+){{0,3}}{rng.choice(vocabulary)}\d*\b', [],
+        )
+        for i in range(count)
+    ]
+
+
+def make_messages(count, rng, vocabulary):
+    return [
+        {
+            'id': str(n), 'chat_id': f'{rng.randint(1, 500)}@s.whatsapp.net',
+            'text': ' '.join(rng.choices(vocabulary, k=rng.randint(5, 40))),
+            'sender': 'x', 'sender_id': 'x@s.whatsapp.net', 'is_group': False,
+            'timestamp': 1700000000, 'media_type': 'text',
+        }
+        for n in range(count)
+    ]
+
+
+def in_process(rules, messages):
+    engine = RuleEngine(rules)
+    start = time.perf_counter()
+    matched = sum(1 for message in messages if engine.match(message))
+    return len(messages) / (time.perf_counter() - start), matched
+
+
+def with_pool(rules, messages, workers):
+    matched = []
+    pool = AutomationWorkerPool(
+        workers, rules, lambda matches: matched.extend(message['id'] for message, _ in matches),
+    )
+    try:
+        # Warm up: worker start-up and rule compilation are not part of throughput
+        pool.submit(messages[:workers * 10])
+        while pool.pending():
+            time.sleep(0.001)
+        matched.clear()
+
+        start = time.perf_counter()
+        for i in range(0, len(messages), 500):
+            pool.submit(messages[i:i + 500])
+        while pool.pending():
+            time.sleep(0.001)
+        return len(messages) / (time.perf_counter() - start), len(matched)
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rules', type=int, default=300)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    vocabulary = make_vocabulary(rng)
+    rules = make_rules(args.rules, rng, vocabulary)
+    messages = make_messages(args.messages, rng, vocabulary)
+    print(f'{args.rules} regex rules, {args.messages} messages, {os.cpu_count()} CPUs')
+
+    baseline, matched = in_process(rules, messages)
+    print(f'{"in-process":>12}: {baseline:9.0f} msg/s  ({matched} matched)')
+    for workers in (int(w) for w in args.workers.split(',')):
+        throughput, matched = with_pool(rules, messages, workers)
+        print(f'{workers:>4} workers: {throughput:9.0f} msg/s  x{throughput / baseline:.2f}  ({matched} matched)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Track import cost and time-to-first-request against a startup budget.
+
+Usage: python benchmarks/cold_start.py [--runs 5] [--budget-ms 1000] [--top 15]
+
+Exits with status 1 when the median time-to-first-request exceeds the budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = (
+    "from app import create_app\n"
+    "app = create_app()\n"
+    "response = app.test_client().get('/api/status')\n"
+    "assert response.status_code == 200, response.status_code\n"
+)
+
+
+def import_profile(module):
+    """Run python -X importtime and return [(cumulative_us, self_us, name)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def time_to_first_request():
+    """Wall-clock milliseconds from process spawn to the first served request"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', FIRST_REQUEST],
+        cwd=ROOT, capture_output=True, check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    rows = import_profile('app.api.routes')
+    total = next(cum for cum, _, name in rows if name.strip() == 'app.api.routes')
+    print(f'import app.api.routes: {total / 1000:.1f} ms cumulative')
+    print(f'{"cumulative ms":>14}{"self ms":>10}  module')
+    for cumulative, self_us, name in sorted(rows, reverse=True)[1:args.top + 1]:
+        print(f'{cumulative / 1000:>14.1f}{self_us / 1000:>10.1f}  {name.strip()}')
+
+    samples = [time_to_first_request() for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(f'\ntime-to-first-request: median {median:.0f} ms, '
+          f'min {min(samples):.0f} ms, max {max(samples):.0f} ms ({args.runs} runs)')
+    print(f'budget: {args.budget_ms:.0f} ms -> {"OK" if median <= args.budget_ms else "OVER BUDGET"}')
+    return 0 if median <= args.budget_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
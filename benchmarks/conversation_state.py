@@ -0,0 +1,64 @@
+"""Conversation state lookups and memory with 100k active conversations.
+
+Usage: python benchmarks/conversation_state.py [--chats 100000] [--lookups 500000] [--cache-size 100000]
+
+Every chat is moved to a state (write-through to SQLite), then random
+chats are looked up as incoming messages would be. With --cache-size
+below --chats the lookups include LRU misses that go to SQLite. Memory is
+the Python heap allocated by the store while it is filled (traced in a
+separate pass, so tracing doesn't slow the timed runs).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.conversation import ConversationStore  # noqa: E402
+
+STATES = ('menu', 'ask_name', 'ask_email', 'confirm', 'support')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=500000)
+    parser.add_argument('--cache-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    chats = [f'55{n:011d}@s.whatsapp.net' for n in range(args.chats)]
+
+    lookups = [rng.choice(chats) for _ in range(args.lookups)]
+    states = [rng.choice(STATES) for _ in chats]
+
+    tracemalloc.start()
+    store = ConversationStore(os.path.join(tempfile.mkdtemp(), 'conversations.sqlite3'), args.cache_size, ttl=3600)
+    for chat_id, state in zip(chats, states):
+        store.set(chat_id, state)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    store = ConversationStore(os.path.join(tempfile.mkdtemp(), 'conversations.sqlite3'), args.cache_size, ttl=3600)
+    start = time.perf_counter()
+    for chat_id, state in zip(chats, states):
+        store.set(chat_id, state)
+    writes = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chat_id in lookups:
+        store.get(chat_id)
+    reads = time.perf_counter() - start
+
+    print(f'{args.chats} conversations, LRU of {args.cache_size}')
+    print(f'set   : {writes / args.chats * 1e6:6.1f} us each (write-through)')
+    print(f'get   : {reads / args.lookups * 1e6:6.2f} us each over {args.lookups} lookups')
+    print(f'memory: {memory / 2 ** 20:6.1f} MiB held, {memory / min(args.chats, args.cache_size):.0f} bytes per cached chat')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Live message latency while a history-sync flood is being ingested.
+
+Usage: python benchmarks/ingest_lanes.py [--history 50000] [--live 200] [--batch-size 200]
+
+A history backlog is queued first, then live messages arrive every few
+milliseconds. Processing uses a real MessageStore so the cost per message
+is the archive write. Reported latency is queue -> processed for live
+messages, with priority lanes and with everything in a single lane.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.message_store import MessageStore  # noqa: E402
+from app.neonize_wrapper.ingest import IngestPipeline  # noqa: E402
+
+
+def message(n, chat_id):
+    return {'id': str(n), 'chat_id': chat_id, 'text': f'message {n}', 'timestamp': int(time.time())}
+
+
+async def run(args, single_lane):
+    store = MessageStore(os.path.join(tempfile.mkdtemp(), 'messages.sqlite3'))
+    latencies = []
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def handler(lane, items):
+        store.add_many(items)
+        now = time.perf_counter()
+        for item in items:
+            if 'sent' in item:
+                latencies.append(now - item['sent'])
+        if len(latencies) >= args.live:
+            loop.call_soon_threadsafe(done.set)
+
+    pipeline = IngestPipeline(handler, capacity=args.history + args.live, batch_size=args.batch_size)
+    started = time.perf_counter()
+    for n in range(args.history):
+        await pipeline.put(message(n, 'history'), 'history')
+    for n in range(args.live):
+        live = dict(message(args.history + n, 'live'), sent=time.perf_counter())
+        await pipeline.put(live, 'history' if single_lane else 'live')
+        await asyncio.sleep(0.002)
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{'single lane' if single_lane else 'live + history':>15}: "
+        f"live p50 {latencies[len(latencies) // 2] * 1000:8.1f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.1f} ms  "
+        f"({args.history + args.live} messages in {elapsed:.2f}s)"
+    )
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, default=50000)
+    parser.add_argument('--live', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args, single_lane=True))
+    asyncio.run(run(args, single_lane=False))
+
+
+if __name__ == '__main__':
+    main()
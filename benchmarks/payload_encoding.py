@@ -0,0 +1,101 @@
+"""Compare bandwidth and CPU cost of the Socket.IO payload codecs.
+
+Usage: python benchmarks/payload_encoding.py
+"""
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.payloads import (  # noqa: E402
+    CODEC_JSON,
+    available_codecs,
+    decode_payload,
+    encode_payload,
+)
+
+ROUNDS = 20
+
+
+def random_words(rng, count):
+    return ' '.join(
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(count)
+    )
+
+
+def make_contacts(count, rng):
+    contacts = []
+    for i in range(count):
+        number = f'55{rng.randint(10, 99)}9{rng.randint(10000000, 99999999)}'
+        contacts.append({
+            'id': f'{number}@s.whatsapp.net',
+            'name': random_words(rng, 2).title(),
+            'number': number,
+        })
+    return {'contacts': contacts}
+
+
+def make_messages(count, rng):
+    messages = []
+    for i in range(count):
+        is_group = rng.random() < 0.4
+        messages.append({
+            'id': ''.join(rng.choices(string.hexdigits.upper(), k=20)),
+            'chat_id': f'{rng.randint(10**11, 10**12)}@{"g.us" if is_group else "s.whatsapp.net"}',
+            'sender': random_words(rng, 2).title(),
+            'sender_id': f'{rng.randint(10**11, 10**12)}@s.whatsapp.net',
+            'text': random_words(rng, rng.randint(3, 40)),
+            'timestamp': 1700000000 + i,
+            'is_group': is_group,
+            'group_name': random_words(rng, 3) if is_group else None,
+            'type': 'text',
+            'is_outgoing': rng.random() < 0.2,
+        })
+    return {'messages': messages}
+
+
+def wire_size(payload):
+    """Approximate bytes on the wire for a Socket.IO event payload"""
+    if isinstance(payload, dict) and 'data' in payload and isinstance(payload['data'], bytes):
+        return len(payload['data']) + len(json.dumps({'codec': payload['codec']}))
+    return len(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def bench(name, data):
+    print(f'\n{name}')
+    print(f'{"codec":<18}{"bytes":>12}{"ratio":>8}{"encode ms":>12}{"decode ms":>12}')
+    baseline = wire_size(data)
+    for codec in available_codecs():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            if codec == CODEC_JSON:
+                # Socket.IO serializes plain payloads with json.dumps
+                encoded = json.dumps(encode_payload(data, codec), separators=(',', ':'))
+            else:
+                encoded = encode_payload(data, codec, threshold=0)
+        encode_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            if codec == CODEC_JSON:
+                json.loads(encoded)
+            else:
+                decode_payload(encoded)
+        decode_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+
+        size = len(encoded) if codec == CODEC_JSON else wire_size(encoded)
+        print(f'{codec:<18}{size:>12}{size / baseline:>8.2f}{encode_ms:>12.2f}{decode_ms:>12.2f}')
+
+def main():
+    rng = random.Random(42)
+    bench('10k contacts (contacts_updated)', make_contacts(10000, rng))
+    bench('1k messages (message history)', make_messages(1000, rng))
+
+
+if __name__ == '__main__':
+    main()
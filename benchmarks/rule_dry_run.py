@@ -0,0 +1,80 @@
+"""Time a rule dry-run against a synthetic message archive.
+
+Usage: python benchmarks/rule_dry_run.py [--messages 1000000] [--workers 0]
+
+The archive is generated once in a temporary directory (or reused with
+--db PATH) so repeated runs only measure the dry-run itself.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.automation import AutomationRule  # noqa: E402
+from app.models.dry_run import dry_run_rule  # noqa: E402
+from app.models.message_store import MessageStore  # noqa: E402
+
+PATTERNS = [
+    ('keyword', r'\b(urgent|important)\b'),
+    ('anchored', r'^(hello|hi|hey)$'),
+    ('wildcard', r'order\s+#?\d{4,}.*(cancel|refund)'),
+]
+
+WORDS = ['hello', 'hi', 'order', 'refund', 'cancel', 'urgent', 'meeting', 'tomorrow',
+         'please', 'thanks', 'ok', 'important', 'price', 'when', 'where', 'call']
+
+
+def populate(store, count, batch=20000):
+    rng = random.Random(7)
+    chats = [f'{rng.randint(10**11, 10**12)}@s.whatsapp.net' for _ in range(500)]
+    seq = store.count()
+    while seq < count:
+        rows = []
+        for i in range(seq, min(seq + batch, count)):
+            words = rng.choices(WORDS, k=rng.randint(1, 12))
+            if rng.random() < 0.05:
+                words.append(f'#{rng.randint(1000, 99999)}')
+            rows.append({
+                'id': f'{i:020d}',
+                'chat_id': rng.choice(chats),
+                'sender': ''.join(rng.choices(string.ascii_lowercase, k=8)),
+                'sender_id': rng.choice(chats),
+                'text': ' '.join(words),
+                'timestamp': 1700000000 + i,
+                'is_group': False,
+                'group_name': None,
+                'type': 'text',
+                'is_outgoing': False,
+            })
+        store.add_many(rows)
+        seq += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'neonize_dry_run_bench.sqlite3'))
+    args = parser.parse_args()
+
+    store = MessageStore(args.db)
+    start = time.perf_counter()
+    populate(store, args.messages)
+    print(f'archive: {store.count()} messages ({time.perf_counter() - start:.1f}s to prepare) at {args.db}')
+
+    print(f'{"rule":<10}{"matched":>10}{"wall s":>9}{"msg/s":>12}{"avg us":>9}{"p99 us":>9}{"workers":>9}')
+    for name, pattern in PATTERNS:
+        rule = AutomationRule(name, name, 'message_text', pattern, [])
+        result = dry_run_rule(rule, store, limit=args.messages, workers=args.workers)
+        wall = result['wall_ms'] / 1000
+        print(f'{name:<10}{result["matched"]:>10}{wall:>9.2f}{result["evaluated"] / wall:>12.0f}'
+              f'{result["timing"]["avg_us"]:>9.2f}{result["timing"]["p99_us"]:>9.2f}{result["workers"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Per-message cost of the RuleEngine as the number of keyword rules grows.
+
+Usage: python benchmarks/rule_engine.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.automation import AutomationRule  # noqa: E402
+from app.models.rule_engine import RuleEngine  # noqa: E402
+
+MESSAGES = 20000
+
+
+def random_word(rng):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+def make_rules(count, rng):
+    return [
+        AutomationRule(str(i), f'kw{i}', 'keywords', [random_word(rng) for _ in range(3)], [])
+        for i in range(count)
+    ]
+
+
+def make_messages(rng):
+    return [
+        {
+            'text': ' '.join(random_word(rng) for _ in range(rng.randint(3, 30))),
+            'sender': 'x', 'sender_id': 'x@s.whatsapp.net', 'chat_id': 'x@s.whatsapp.net',
+            'is_group': False, 'timestamp': 1700000000, 'media_type': 'text',
+        }
+        for _ in range(MESSAGES)
+    ]
+
+
+def per_message_us(match, messages):
+    start = time.perf_counter()
+    for message in messages:
+        match(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def naive_match(rules):
+    def match(message):
+        return [rule for rule in rules if rule.matches(message)]
+    return match
+
+
+def main():
+    rng = random.Random(1)
+    messages = make_messages(rng)
+    print(f'{"keyword rules":>14}{"engine us/msg":>16}{"per-rule loop us/msg":>22}')
+    for count in (1, 10, 100, 1000, 5000):
+        rules = make_rules(count, rng)
+        engine = RuleEngine(rules)
+        engine_us = per_message_us(engine.match, messages)
+        naive_us = per_message_us(naive_match(rules), messages[:max(200, MESSAGES // count)])
+        print(f'{count:>14}{engine_us:>16.2f}{naive_us:>22.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Webhook delivery throughput against a local HTTP stand-in.
+
+Usage: python benchmarks/webhook_delivery.py [--deliveries 20000] [--batch-size 1]
+                                             [--failure-rate 0.0] [--concurrency 64]
+
+The stand-in answers 503 for --failure-rate of requests so the retry queue
+is exercised; the run ends when every payload has been received once.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+from app.neonize_wrapper.automation import WebhookDispatcher  # noqa: E402
+from app.utils.metrics import metrics  # noqa: E402
+
+
+async def run(args):
+    received = set()
+    done = asyncio.Event()
+    rng = random.Random(3)
+
+    async def handler(request):
+        if rng.random() < args.failure_rate:
+            return web.Response(status=503)
+        body = json.loads(await request.read())
+        for payload in body if isinstance(body, list) else [body]:
+            received.add(payload['n'])
+        if len(received) >= args.deliveries:
+            done.set()
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post('/hook', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}/hook'
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'webhooks.sqlite3')
+    dispatcher = WebhookDispatcher(db_path, concurrency=args.concurrency, retry_base_delay=0.05)
+    dispatcher.retry_poll_interval = 0.05
+    dispatcher.start()
+
+    start = time.perf_counter()
+    for n in range(args.deliveries):
+        dispatcher.enqueue(url, {'n': n, 'message': {'text': 'hello world', 'chat_id': '123@s.whatsapp.net'}},
+                           batch_size=args.batch_size, batch_interval=0.05)
+    enqueue_s = time.perf_counter() - start
+    await asyncio.wait_for(done.wait(), timeout=300)
+    elapsed = time.perf_counter() - start
+
+    await asyncio.get_running_loop().run_in_executor(None, dispatcher.stop)
+    await runner.cleanup()
+
+    counters = metrics.snapshot()['counters']
+    print(f'deliveries: {args.deliveries}  batch size: {args.batch_size}  failure rate: {args.failure_rate}')
+    print(f'enqueue: {enqueue_s * 1000:.0f} ms ({args.deliveries / enqueue_s:.0f}/s)')
+    print(f'all received in {elapsed:.2f} s -> {args.deliveries / elapsed:.0f} payloads/s')
+    print(f'http requests ok: {counters.get("webhook.delivered", 0)}, failed: {counters.get("webhook.failed", 0)}, '
+          f'retried: {counters.get("webhook.retried", 0)}, dead-lettered: {counters.get("webhook.dead_lettered", 0)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--deliveries', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=64)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+from app.utils.aho_corasick import AhoCorasick
+
+
+def make(*phrases):
+    automaton = AhoCorasick()
+    for value, phrase in enumerate(phrases):
+        automaton.add(tuple(phrase.split()), value)
+    automaton.build()
+    return automaton
+
+
+def test_finds_whole_word_phrases():
+    automaton = make('price', 'order status', 'status')
+    assert sorted(automaton.search('what is my order status'.split())) == [1, 2]
+    assert automaton.search('prices'.split()) == []
+
+
+def test_overlapping_phrases_share_suffixes():
+    automaton = make('a b c', 'b c', 'c')
+    assert sorted(automaton.search('a b c'.split())) == [0, 1, 2]
+
+
+def test_failure_links_restart_partial_matches():
+    automaton = make('a a b')
+    assert automaton.search('a a a b'.split()) == [0]
+
+
+def test_repeats_are_reported():
+    automaton = make('hi')
+    assert automaton.search('hi there hi'.split()) == [0, 0]
+
+
+def test_add_after_build_rebuilds_on_search():
+    automaton = make('hi')
+    automaton.add(('bye',), 'bye')
+    assert automaton.search(['bye']) == ['bye']
+    assert len(automaton) == 2
+
+
+def test_empty_phrase_is_ignored():
+    automaton = AhoCorasick()
+    automaton.add((), 0)
+    assert len(automaton) == 0
+    assert automaton.search(['anything']) == []
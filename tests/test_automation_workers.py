@@ -0,0 +1,112 @@
+import os
+import signal
+import time
+
+import pytest
+
+from app.models.automation import AutomationRule
+from app.models.automation_workers import AutomationWorkerPool, shard_for
+
+
+def rule(rule_id, trigger_type, pattern, actions=None):
+    return AutomationRule(rule_id, rule_id, trigger_type, pattern, actions or [{'type': 'reply', 'text': rule_id}])
+
+
+def message(n, chat_id, text):
+    return {'id': str(n), 'chat_id': chat_id, 'text': text, 'is_group': False}
+
+
+class Recorder:
+    """on_matches/annotate for a pool, with conversation states kept in a dict"""
+
+    def __init__(self):
+        self.matches = []
+        self.states = {}
+
+    def annotate(self, message):
+        return dict(message, conversation_state=self.states.get(message['chat_id']))
+
+    def on_matches(self, matches):
+        for message, rule_actions in matches:
+            for rule_id, actions in rule_actions:
+                self.matches.append((message['id'], rule_id, [action for _, action in actions]))
+                for _, action in actions:
+                    if action.get('type') == 'set_state':
+                        self.states[message['chat_id']] = action.get('state')
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(workers, rules, **kwargs):
+        recorder = Recorder()
+        pool = AutomationWorkerPool(workers, rules, recorder.on_matches, annotate=recorder.annotate, **kwargs)
+        pools.append(pool)
+        return pool, recorder
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def settle(pool, timeout=10):
+    deadline = time.monotonic() + timeout
+    while pool.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.pending() == 0
+
+
+def test_shards_are_stable_and_spread():
+    chats = [f'{n}@s.whatsapp.net' for n in range(1000)]
+    shards = [shard_for(chat_id, 4) for chat_id in chats]
+    assert shards == [shard_for(chat_id, 4) for chat_id in chats]
+    assert all(shards.count(index) > 150 for index in range(4))
+
+
+def test_matches_come_back_rendered_and_in_chat_order(make_pool):
+    pool, recorder = make_pool(2, [rule('order', 'message_text', r'order (\d+)', [
+        {'type': 'reply', 'text': 'got {{ match.1 }}'}, {'type': 'log'},
+    ])])
+    pool.submit([message(n, f'{n % 3}@s.whatsapp.net', f'order {n}') for n in range(30)])
+    settle(pool)
+    assert len(recorder.matches) == 30
+    for chat in range(3):
+        ids = [int(message_id) for message_id, _, _ in recorder.matches if int(message_id) % 3 == chat]
+        assert ids == sorted(ids)
+    message_id, rule_id, actions = recorder.matches[0]
+    assert actions == [{'type': 'reply', 'text': 'got {{ match.1 }}', 'rendered_text': f'got {message_id}'}, {'type': 'log'}]
+
+
+def test_rule_changes_reach_every_worker(make_pool):
+    pool, recorder = make_pool(3, [rule('old', 'keywords', 'hello')])
+    pool.update_rules([rule('new', 'keywords', 'hello')])
+    pool.submit([message(n, f'{n}@s.whatsapp.net', 'hello') for n in range(20)])
+    settle(pool)
+    assert {rule_id for _, rule_id, _ in recorder.matches} == {'new'}
+    assert len(recorder.matches) == 20
+
+
+def test_transitions_apply_to_later_messages_in_the_same_batch(make_pool):
+    pool, recorder = make_pool(2, [
+        rule('start', 'keywords', 'menu', [{'type': 'set_state', 'state': 'menu'}]),
+        rule('in_menu', 'conversation_state', 'menu'),
+    ])
+    pool.submit([message(1, 'a@s.whatsapp.net', 'menu'), message(2, 'a@s.whatsapp.net', 'one')])
+    pool.submit([message(3, 'a@s.whatsapp.net', 'two'), message(4, 'b@s.whatsapp.net', 'one')])
+    settle(pool)
+    assert sorted((message_id, rule_id) for message_id, rule_id, _ in recorder.matches) == [
+        ('1', 'start'), ('2', 'in_menu'), ('3', 'in_menu'),
+    ]
+
+
+def test_dead_worker_is_restarted_and_its_messages_resent(make_pool):
+    pool, recorder = make_pool(1, [rule('hi', 'keywords', 'hi')], health_interval=0.1)
+    settle(pool)
+    os.kill(pool._processes[0].pid, signal.SIGKILL)
+    pool._processes[0].join()
+    # Submitted to the dead worker's inbox: only the restart can answer them
+    pool.submit([message(n, 'a@s.whatsapp.net', 'hi') for n in range(5)])
+    settle(pool)
+    assert pool._processes[0].is_alive()
+    assert sorted(message_id for message_id, _, _ in recorder.matches) == ['0', '1', '2', '3', '4']
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from app.models.conversation import ConversationStore, check_state
+
+
+def test_state_expires_after_ttl(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.sqlite3'), ttl=60)
+    store.set('a', 'menu')
+    store.set('b', 'menu', ttl=1)
+    assert store.get('a') == 'menu'
+    assert store.get('b', now=time.time() + 2) is None
+    assert store.get('a', now=time.time() + 61) is None
+
+
+def test_clear_and_none(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.sqlite3'))
+    store.set('a', 'menu')
+    store.set('a', None)
+    assert store.get('a') is None
+    store.set('b', 'menu')
+    store.clear('b')
+    assert store.describe('b') is None
+
+
+def test_lru_is_bounded_and_misses_read_sqlite(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.sqlite3'), cache_size=2)
+    for chat_id in ('a', 'b', 'c'):
+        store.set(chat_id, f'state-{chat_id}')
+    assert len(store._cache) == 2
+    assert 'a' not in store._cache
+    assert store.get('a') == 'state-a'
+    assert list(store._cache) == ['c', 'a']
+
+
+def test_state_survives_reopening(tmp_path):
+    path = str(tmp_path / 'conversations.sqlite3')
+    store = ConversationStore(path)
+    store.set('a', 'ask_email', ttl=60)
+    store.close()
+    reopened = ConversationStore(path)
+    assert reopened.get('a') == 'ask_email'
+    assert reopened.describe('a')['state'] == 'ask_email'
+
+
+def test_expired_rows_are_purged(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.sqlite3'), purge_every=3)
+    store.set('a', 'menu', ttl=0.01)
+    time.sleep(0.02)
+    store.set('b', 'menu')
+    store.set('c', 'menu')
+    assert store._conn.execute('SELECT chat_id FROM conversations ORDER BY chat_id').fetchall() == [('b',), ('c',)]
+
+
+@pytest.mark.parametrize('state, ttl', [
+    ('none', None), ('', None), (5, None), ('menu', 0), ('menu', -1), ('menu', 'x'), ('menu', [1]),
+    ('menu', 'nan'), ('menu', 'inf'),
+])
+def test_check_state_rejects(state, ttl):
+    with pytest.raises(ValueError):
+        check_state(state, ttl)
+
+
+def test_check_state_accepts():
+    check_state('menu', '60')
+    check_state(None)
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from app.models.message_template import MAX_RENDERED_LENGTH, MessageTemplate
+from app.utils.metrics import metrics
+
+MESSAGE = {
+    'sender': 'ana silva', 'sender_id': '5511@s.whatsapp.net', 'chat_id': '1@g.us', 'group_name': 'Team',
+    'text': 'order 42 please', 'timestamp': 1700000000,
+}
+
+
+def test_variables_and_filters():
+    template = MessageTemplate('Hi {{ sender | title }} in {{chat}}: {{ text | upper }}')
+    assert template.render(MESSAGE) == 'Hi Ana Silva in Team: ORDER 42 PLEASE'
+
+
+def test_match_groups():
+    regex = re.compile(r'order (?P<number>\d+)')
+    template = MessageTemplate('#{{ match.1 }} / {{ match.number }} / {{ match }}', regex=regex)
+    assert template.uses_match
+    assert template.render(MESSAGE, regex.search(MESSAGE['text'])) == '#42 / 42 / order 42'
+    assert template.render(MESSAGE, None) == '# /  / '
+
+
+def test_millisecond_timestamps_render_the_same_time():
+    template = MessageTemplate('{{ date }} {{ time }}')
+    assert template.render(MESSAGE) == template.render(dict(MESSAGE, timestamp=MESSAGE['timestamp'] * 1000))
+
+
+def test_user_text_is_not_expanded():
+    template = MessageTemplate('You said: {{ text }}')
+    assert template.render(dict(MESSAGE, text='{{ sender }}')) == 'You said: {{ sender }}'
+
+
+@pytest.mark.parametrize('source, regex', [
+    ('{{ password }}', None),
+    ('{{ sender.name }}', None),
+    ('{{ text | eval }}', None),
+    ('{{ match.1 }}', None),
+    ('{{ match.2 }}', re.compile(r'(a)')),
+    ('{{ match.nope }}', re.compile(r'(?P<yes>a)')),
+])
+def test_invalid_templates_are_rejected(source, regex):
+    with pytest.raises(ValueError):
+        MessageTemplate(source, regex=regex)
+
+
+def test_output_is_capped_and_timed():
+    template = MessageTemplate('{{ text }}{{ text }}', name='test.cap')
+    assert len(template.render(dict(MESSAGE, text='x' * MAX_RENDERED_LENGTH))) == MAX_RENDERED_LENGTH
+    MessageTemplate('static', name='test.static').render(MESSAGE)
+    timings = metrics.snapshot()['timings']
+    assert timings['automation.template_render_seconds.test.cap']['count'] == 1
+    assert timings['automation.template_render_seconds.test.static']['count'] == 1
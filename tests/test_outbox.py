@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.neonize_wrapper.outbox import AMBIGUOUS, FAILED, PENDING, ActionOutbox, AmbiguousAction, DeferAction
+
+
+def entry(key, action_type='log'):
+    return key, 'rule', {'type': action_type}, {'id': key}
+
+
+def no_op(key, rule_id, action, message):
+    pass
+
+
+def crash_after_lease(path, entries):
+    """Outbox whose process 'died' with entries started but never finished"""
+    outbox = ActionOutbox(path, no_op)
+    outbox.start = lambda: None  # no drain thread: nothing runs before the 'crash'
+    outbox.add(entries)
+    outbox._finish_and_lease([])
+    assert outbox.counts()['started'] == len(entries)
+    outbox._conn.close()
+
+
+def test_duplicate_keys_are_ignored(tmp_path):
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), no_op)
+    outbox.start = lambda: None
+    assert outbox.add([entry('m1:r:0'), entry('m1:r:1')]) == 2
+    assert outbox.add([entry('m1:r:0')]) == 0
+
+
+def test_crash_recovery_resumes_idempotent_and_parks_sends(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    crash_after_lease(path, [entry('a', 'webhook'), entry('b', 'reply'), entry('c', 'log')])
+
+    ran = []
+    done = threading.Event()
+
+    def execute(key, rule_id, action, message):
+        ran.append(key)
+        if len(ran) == 2:
+            done.set()
+
+    outbox = ActionOutbox(path, execute)
+    assert outbox.counts()['ambiguous'] == 1
+    assert outbox.counts()['pending'] == 2
+    outbox.start()
+    assert done.wait(5)
+    assert sorted(ran) == ['a', 'c']
+    assert [parked['key'] for parked in outbox.entries('ambiguous')] == ['b']
+
+
+def test_retry_requeues_an_ambiguous_entry(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    crash_after_lease(path, [entry('b', 'reply')])
+    done = threading.Event()
+    outbox = ActionOutbox(path, lambda *args: done.set())
+    assert outbox.retry('b')
+    assert done.wait(5)
+    assert not outbox.retry('missing')
+
+
+def test_failures_and_deferrals(tmp_path):
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), no_op, max_attempts=2)
+
+    def fail(*args):
+        raise RuntimeError('boom')
+
+    def defer(*args):
+        raise DeferAction('offline')
+
+    outbox.execute = fail
+    state, attempts, _, error, _ = outbox._execute_entry(1, 'k', 'r', '{}', '{}', 0)
+    assert (state, attempts, error) == (PENDING, 1, 'boom')
+    state, attempts, _, _, _ = outbox._execute_entry(1, 'k', 'r', '{}', '{}', 1)
+    assert (state, attempts) == (FAILED, 2)
+
+    outbox.execute = defer
+    state, attempts, _, _, _ = outbox._execute_entry(1, 'k', 'r', '{}', '{}', 1)
+    assert (state, attempts) == (PENDING, 1)
+
+
+def test_sends_with_unknown_outcome_are_parked(tmp_path):
+    def timed_out(*args):
+        raise AmbiguousAction('no answer')
+
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), timed_out)
+    state, attempts, _, error, _ = outbox._execute_entry(1, 'k', 'r', '{}', '{}', 0)
+    assert (state, attempts, error) == (AMBIGUOUS, 1, 'no answer')
+
+
+def test_apply_once(tmp_path):
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), no_op)
+    applied = []
+    assert outbox.apply_once('m1:r:0', 'r', {'type': 'set_state'}, {}, lambda: applied.append(1))
+    assert not outbox.apply_once('m1:r:0', 'r', {'type': 'set_state'}, {}, lambda: applied.append(2))
+    assert applied == [1]
+    assert outbox.counts()['done'] == 1
+
+
+def test_apply_once_records_nothing_if_apply_fails(tmp_path):
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), no_op)
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        outbox.apply_once('m1:r:0', 'r', {'type': 'set_state'}, {}, fail)
+    assert outbox.apply_once('m1:r:0', 'r', {'type': 'set_state'}, {}, lambda: None)
+
+
+def test_results_are_kept_until_they_are_recorded(tmp_path):
+    outbox = ActionOutbox(str(tmp_path / 'outbox.sqlite3'), no_op)
+    outbox.poll_interval = 0.01
+    outbox.start = lambda: None
+    outbox.add([entry('a')])
+    (row,) = outbox._finish_and_lease([])
+    result = outbox._execute_entry(*row)
+
+    finish = outbox._finish_and_lease
+    failures = []
+
+    def flaky(results):
+        if len(failures) < 2:
+            failures.append(results)
+            raise sqlite3.OperationalError('database is locked')
+        return finish(results)
+
+    outbox._finish_and_lease = flaky
+    assert outbox._record([result]) == []
+    assert failures == [[result], [result]]
+    assert outbox.counts()['done'] == 1
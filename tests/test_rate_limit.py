@@ -0,0 +1,51 @@
+from app.utils.rate_limit import SlidingWindowCounter
+
+
+def test_limit_within_window():
+    counter = SlidingWindowCounter()
+    checks = [('rule', 3, 60)]
+    assert [counter.try_acquire(checks, now=0) for _ in range(3)] == [None, None, None]
+    assert counter.try_acquire(checks, now=1) == ('rule', 3, 60)
+
+
+def test_previous_window_is_weighted_by_overlap():
+    counter = SlidingWindowCounter()
+    checks = [('rule', 4, 10)]
+    for _ in range(4):
+        counter.try_acquire(checks, now=0)
+    # Halfway into the next window, half of the previous 4 events still count
+    assert counter.try_acquire(checks, now=15) is None
+    assert counter.try_acquire(checks, now=15) is None
+    assert counter.try_acquire(checks, now=15) == ('rule', 4, 10)
+
+
+def test_limit_of_one_is_an_exact_cooldown():
+    counter = SlidingWindowCounter()
+    checks = [('chat', 1, 30)]
+    assert counter.try_acquire(checks, now=0) is None
+    assert counter.try_acquire(checks, now=29.9) == ('chat', 1, 30)
+    assert counter.try_acquire(checks, now=30) is None
+
+
+def test_checks_are_all_or_nothing():
+    counter = SlidingWindowCounter()
+    counter.try_acquire([('b', 1, 60)], now=0)
+    assert counter.try_acquire([('a', 1, 60), ('b', 1, 60)], now=1) == ('b', 1, 60)
+    # 'a' wasn't counted when 'b' refused the event
+    assert counter.try_acquire([('a', 1, 60)], now=1) is None
+
+
+def test_memory_is_bounded():
+    counter = SlidingWindowCounter(max_keys=10)
+    for n in range(100):
+        counter.try_acquire([(f'chat{n}', 5, 60)], now=n * 0.01)
+    assert len(counter) == 10
+    assert counter.evictions == 90
+
+
+def test_idle_keys_expire():
+    counter = SlidingWindowCounter(max_keys=10)
+    counter.try_acquire([('old', 5, 1)], now=0)
+    counter.try_acquire([('new', 5, 1)], now=5)
+    assert len(counter) == 1
+    assert counter.evictions == 0
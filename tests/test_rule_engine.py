@@ -0,0 +1,55 @@
+from app.models.automation import AutomationRule
+from app.models.rule_engine import RuleEngine
+
+
+def rule(rule_id, trigger_type, pattern, conditions=None, is_active=True):
+    return AutomationRule(rule_id, rule_id, trigger_type, pattern, [{'type': 'log'}], is_active, conditions)
+
+
+def message(text='', **fields):
+    return dict({'id': '1', 'chat_id': '1@s.whatsapp.net', 'text': text, 'is_group': False}, **fields)
+
+
+def ids(rules):
+    return [rule.id for rule in rules]
+
+
+def test_keyword_rules_are_candidates_only_when_a_phrase_occurs():
+    engine = RuleEngine([rule('price', 'keywords', 'price, how much'), rule('hours', 'keywords', 'opening hours')])
+    assert ids(engine.match(message('How much is it?'))) == ['price']
+    assert ids(engine.match(message('what are the opening hours'))) == ['hours']
+    assert engine.match(message('hello')) == []
+
+
+def test_keyword_rules_check_their_other_conditions():
+    engine = RuleEngine([rule('groups', 'keywords', 'menu', [{'type': 'chat_type', 'pattern': 'group'}])])
+    assert engine.match(message('menu')) == []
+    assert ids(engine.match(message('menu', is_group=True, chat_id='1@g.us'))) == ['groups']
+
+
+def test_sender_and_group_indexes():
+    engine = RuleEngine([rule('boss', 'sender', '9@s.whatsapp.net'), rule('team', 'group', 'Team')])
+    assert ids(engine.match(message(sender_id='9@s.whatsapp.net'))) == ['boss']
+    assert ids(engine.match(message(is_group=True, chat_id='2@g.us', group_name='Team'))) == ['team']
+    # Group rules don't match direct chats, even with the same name
+    assert engine.match(message(group_name='Team')) == []
+
+
+def test_state_index():
+    engine = RuleEngine([
+        rule('menu', 'conversation_state', 'menu, ask_name'),
+        rule('fresh', 'conversation_state', 'none'),
+    ])
+    assert ids(engine.match(message(conversation_state='ask_name'))) == ['menu']
+    assert ids(engine.match(message(conversation_state=None))) == ['fresh']
+
+
+def test_unanchored_rules_are_always_checked_and_order_is_kept():
+    engine = RuleEngine([
+        rule('regex', 'message_text', r'order \d+'),
+        rule('keyword', 'keywords', 'order'),
+        rule('inactive', 'message_text', 'order', is_active=False),
+    ])
+    assert ids(engine.match(message('order 42'))) == ['regex', 'keyword']
+    assert ids(engine.match(message('order now'))) == ['keyword']
+    assert len(engine) == 2
@@ -0,0 +1,48 @@
+import os
+
+from app.neonize_wrapper.events import SegmentLog
+
+
+def offsets(events):
+    return [event['offset'] for event in events]
+
+
+def test_offsets_are_sequential_and_readable(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    log.append([{'n': n} for n in range(5)])
+    log.append([{'n': 5}])
+    assert offsets(log.read(0)) == [0, 1, 2, 3, 4, 5]
+    assert [event['n'] for event in log.read(3, limit=2)] == [3, 4]
+    assert log.read(6) == []
+
+
+def test_reads_span_segments(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=100)
+    for n in range(30):
+        log.append([{'n': n}])
+    assert len(os.listdir(tmp_path)) > 1
+    assert offsets(log.read(0, limit=100)) == list(range(30))
+    assert offsets(log.read(17, limit=5)) == [17, 18, 19, 20, 21]
+
+
+def test_retention_drops_oldest_segments(tmp_path):
+    log = SegmentLog(str(tmp_path), segment_bytes=100, max_segments=2)
+    for n in range(50):
+        log.append([{'n': n}])
+    assert len(os.listdir(tmp_path)) == 2
+    events = log.read(0, limit=100)
+    # Reads from before the oldest segment start at the oldest retained offset
+    assert events[0]['offset'] > 0
+    assert offsets(events) == list(range(events[0]['offset'], 50))
+
+
+def test_offsets_continue_after_reopening_and_torn_writes_are_dropped(tmp_path):
+    log = SegmentLog(str(tmp_path))
+    log.append([{'n': n} for n in range(3)])
+    log.close()
+    with open(os.path.join(tmp_path, f'{0:020d}.jsonl'), 'ab') as f:
+        f.write(b'{"n": 3, "off')
+    reopened = SegmentLog(str(tmp_path))
+    assert reopened.next_offset == 3
+    assert offsets(reopened.append([{'n': 3}])) == [3]
+    assert offsets(reopened.read(0)) == [0, 1, 2, 3]
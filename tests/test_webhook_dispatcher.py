@@ -0,0 +1,59 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+from app.neonize_wrapper.automation import WebhookDispatcher
+
+
+@pytest.fixture
+def endpoint():
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/', received
+    server.shutdown()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_deliveries_are_removed_from_sqlite_once_sent(tmp_path, endpoint):
+    url, received = endpoint
+    dispatcher = WebhookDispatcher(str(tmp_path / 'webhooks.sqlite3'), concurrency=2)
+    dispatcher.enqueue(url, {'n': 1})
+    assert wait_for(lambda: received == [{'n': 1}])
+    assert wait_for(lambda: dispatcher._conn.execute('SELECT COUNT(*) FROM webhook_retries').fetchone()[0] == 0)
+    dispatcher.stop()
+
+
+def test_queued_payloads_survive_a_crash(tmp_path, endpoint):
+    url, received = endpoint
+    path = str(tmp_path / 'webhooks.sqlite3')
+    crashed = WebhookDispatcher(path, concurrency=1)
+    crashed.enqueue(url, {'n': 1}, batch_size=10, batch_interval=3600)
+    crashed.enqueue(url, {'n': 2}, batch_size=10, batch_interval=3600)
+    # The process 'dies' with the batch still open in memory
+
+    restarted = WebhookDispatcher(path, concurrency=1)
+    restarted.retry_poll_interval = 0.05
+    assert restarted.pending_retries() == 1
+    restarted.start()
+    assert wait_for(lambda: received == [[{'n': 1}, {'n': 2}]])
+    restarted.stop()